@@ -1,9 +1,23 @@
+import io
 import os
+import sys
+import logging
+import argparse
+import itertools
 import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import numpy as np
-from PIL import Image
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from PIL import Image, ImageOps
+from tqdm import tqdm
+
+import encoder_options
+import image_daemon
+import image_scanner
+import instrumentation
+import io_pipeline
+import job_manifest
+import result_cache
 
 # --- INTEGRAL IMPORT FIX ---
 # We define these as None first so the editor knows they exist even if import fails
@@ -19,101 +33,636 @@ try:
 except ImportError:
     pass
 
-class HighPrecisionRemover:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Teacher's High-Precision Image Tool")
-        self.root.geometry("700x550")
-        self.session = None
-        self.setup_ui()
-
-    def setup_ui(self):
-        # Folder Selection
-        folder_frame = ttk.LabelFrame(self.root, text=" 1. Folder Selection ", padding=10)
-        folder_frame.pack(fill="x", padx=20, pady=10)
-        self.path_var = tk.StringVar()
-        ttk.Entry(folder_frame, textvariable=self.path_var).pack(side="left", fill="x", expand=True, padx=5)
-        ttk.Button(folder_frame, text="Browse", command=self.browse).pack(side="right")
-
-        # Engine Settings
-        engine_frame = ttk.LabelFrame(self.root, text=" 2. Engine Settings ", padding=10)
-        engine_frame.pack(fill="x", padx=20, pady=10)
-        
-        ttk.Label(engine_frame, text="Model:").grid(row=0, column=0, padx=5)
-        self.model_var = tk.StringVar(value="isnet-general-use")
-        model_chooser = ttk.Combobox(engine_frame, textvariable=self.model_var, state="readonly")
-        model_chooser['values'] = ("isnet-general-use", "u2net", "u2net_human_seg")
-        model_chooser.grid(row=0, column=1, padx=5)
-
-        # Progress and Status
-        self.status_var = tk.StringVar(value="System Ready")
-        ttk.Label(self.root, textvariable=self.status_var).pack(pady=5)
-        self.progress_var = tk.DoubleVar()
-        ttk.Progressbar(self.root, variable=self.progress_var, maximum=100).pack(fill="x", padx=20, pady=10)
-
-        self.btn = ttk.Button(self.root, text="Start Processing", command=self.start_thread)
-        self.btn.pack(pady=20)
-
-    def browse(self):
-        directory = filedialog.askdirectory()
-        if directory: self.path_var.set(directory)
-
-    def start_thread(self):
-        # Error fix: Check if callable before starting
-        if not IMPORT_READY or remove_fn is None or session_fn is None:
-            messagebox.showerror("Error", "AI Engine not found. Run the terminal fix!")
-            return
-        threading.Thread(target=self.run_process, daemon=True).start()
-
-    def run_process(self):
-        # We use local references to satisfy the editor's "None" check
-        rem_func = remove_fn
-        sess_func = session_fn
-        
-        if rem_func is None or sess_func is None: return
-
-        self.btn.state(['disabled'])
-        folder = self.path_var.get()
-        files = [f for f in os.listdir(folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+MODELS = ("isnet-general-use", "u2net", "u2net_human_seg")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Outputs are named <prefix><name>.png: cut-outs, and masks with --mask_only
+OUTPUT_PREFIXES = ("clean_", "mask_")
+
+# rembg's alpha matting defaults for the parts of the trimap we do not expose
+BACKGROUND_THRESHOLD = 10
+ERODE_SIZE = 10
+
+# Adaptive matting runs pymatting only when more than this fraction of the image is
+# in the trimap's unknown band; cleaner masks use the trimap directly as alpha
+UNKNOWN_THRESHOLD = 0.01
+# Extra pixels kept around the unknown band so the matting solver sees both sides
+MATTING_MARGIN = 32
+
+log = logging.getLogger(__name__)
 
+# Loading a model is the slowest part of a short run, so sessions are kept for the
+# life of the process and shared by every run (and every worker thread) that uses
+# the same model and thread settings. ONNX Runtime sessions are safe to call from
+# several threads at once.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(model_name, intra_op_threads=0, inter_op_threads=0):
+    """
+    Returns a cached rembg session for the model, creating it on first use.
+    Thread counts of 0 leave the ONNX Runtime defaults in place.
+    """
+    key = (model_name, intra_op_threads, inter_op_threads)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = _create_session(model_name, intra_op_threads, inter_op_threads)
+        return _sessions[key]
+
+def _create_session(model_name, intra_op_threads, inter_op_threads):
+    if session_fn is None:
+        raise RuntimeError("rembg is not installed")
+    if intra_op_threads or inter_op_threads:
+        # new_session() only reads thread counts from OMP_NUM_THREADS, so build the
+        # session class directly when explicit intra/inter-op counts are requested
         try:
-            self.status_var.set("Loading AI Model...")
-            self.session = sess_func(self.model_var.get())
-            
-            for i, name in enumerate(files):
-                self.status_var.set(f"Processing: {name}")
-                input_p = os.path.join(folder, name)
-                output_p = os.path.join(folder, f"clean_{os.path.splitext(name)[0]}.png")
-
-                with Image.open(input_p) as img:
-                    # High precision removal
-                    result = rem_func(
-                        img, 
-                        session=self.session,
-                        alpha_matting=True,
-                        alpha_matting_foreground_threshold=240
-                    )
-                    
-                    # --- INTEGRAL SAVE FIX ---
-                    # Handles all 3 possible return types from rembg to fix "save" attribute errors
-                    if isinstance(result, Image.Image):
-                        result.save(output_p)
-                    elif isinstance(result, np.ndarray):
-                        Image.fromarray(result).save(output_p)
-                    elif isinstance(result, bytes):
-                        with open(output_p, "wb") as f:
-                            f.write(result)
-
-                self.progress_var.set(((i+1)/len(files))*100)
-
-            self.status_var.set("Successfully Completed!")
-            messagebox.showinfo("Success", "All images processed with high precision.")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-        finally:
-            self.btn.state(['!disabled'])
+            import onnxruntime as ort
+            from rembg.sessions import sessions_class
+        except ImportError:
+            sessions_class = ()
+        for session_class in sessions_class:
+            if session_class.name() == model_name:
+                sess_opts = ort.SessionOptions()
+                if intra_op_threads:
+                    sess_opts.intra_op_num_threads = intra_op_threads
+                if inter_op_threads:
+                    sess_opts.inter_op_num_threads = inter_op_threads
+                return session_class(model_name, sess_opts)
+    return session_fn(model_name)
+
+def save_result(result, output_p, encoder=None):
+    """
+    Saves a rembg result, which may be an Image, an ndarray or encoded bytes,
+    with the given encoder_options.EncoderOptions (Pillow's defaults when None).
+    """
+    # --- INTEGRAL SAVE FIX ---
+    # Handles all 3 possible return types from rembg to fix "save" attribute errors
+    if isinstance(result, Image.Image):
+        encoder_options.save_image(result, output_p, encoder)
+    elif isinstance(result, np.ndarray):
+        encoder_options.save_image(Image.fromarray(result), output_p, encoder)
+    elif isinstance(result, bytes):
+        if encoder is None or encoder.is_default():
+            with job_manifest.atomic_output(output_p) as tmp_path, open(tmp_path, "wb") as f:
+                f.write(result)
+        else:
+            with Image.open(io.BytesIO(result)) as img:
+                encoder.save(img, output_p)
+
+def open_image(input_p):
+    """
+    Opens and decodes an image, ready for cut_out().
+    """
+    img = Image.open(input_p)
+    with instrumentation.stage("decode"):
+        img.load()
+    return img
+
+def predict_masks(img, session, cache=None, key=None):
+    """
+    Runs the model on an upright image and returns its masks as a uint8 array of
+    shape (masks, height, width).
+
+    With cache, a result_cache.ResultCache, and key from mask_key(), masks predicted
+    earlier are memory-mapped from the cache instead, and new ones are stored there.
+    """
+    if cache is not None and key is not None:
+        with instrumentation.stage("cache"):
+            masks = load_masks(cache, key)
+        if masks is not None:
+            return masks
+    with instrumentation.stage("inference"):
+        predicted = session.predict(img)
+    masks = np.array([np.asarray(mask.convert("L")) for mask in predicted], dtype=np.uint8)
+    masks = masks.reshape(len(predicted), img.height, img.width)
+    if cache is not None and key is not None:
+        with instrumentation.stage("cache"):
+            cache.store_with(key, lambda tmp_path: save_masks(masks, tmp_path))
+    return masks
+
+def mask_key(cache, input_p, model):
+    """
+    Returns the cache key of the masks a model predicts for an image. The masks
+    only depend on the image and the model, so every threshold and matting
+    setting shares them.
+    """
+    return cache.key(input_p, "mask", {"model": model})
+
+def save_masks(masks, path):
+    # np.save would add ".npy" to a path; a file object keeps the name as given
+    with open(path, "wb") as f:
+        np.save(f, masks)
+
+def load_masks(cache, key):
+    """
+    Returns the cached masks for key, memory-mapped read-only, or None on a miss.
+    """
+    entry = cache.entry(key)
+    if entry is None:
+        return None
+    try:
+        return np.load(entry, mmap_mode="r")
+    except (OSError, ValueError):
+        # Evicted in the meantime, or unreadable; predicting again replaces it
+        return None
+
+def check_mask_size(masks, img):
+    """
+    Raises ValueError unless the masks fit the (upright) image.
+    """
+    if masks.shape[1:] != (img.height, img.width):
+        raise ValueError(f"the mask is {masks.shape[2]}x{masks.shape[1]} but the image is {img.width}x{img.height}")
+
+def mask_image(masks):
+    """
+    Returns the masks as one greyscale image, stacked vertically when there are several.
+    """
+    return Image.fromarray(np.ascontiguousarray(masks.reshape(-1, masks.shape[-1])))
+
+def cut_out(img, session, alpha_matting=True, foreground_threshold=240,
+            adaptive=False, unknown_threshold=UNKNOWN_THRESHOLD, masks=None):
+    """
+    Removes the background of a decoded image. Returns (result, path), where result
+    is whatever rembg produced (see save_result) and path the matting path taken:
+    "off", "full" (rembg's own matting), or with adaptive=True one of "skipped",
+    "cropped" or "full" (see adaptive_cutout).
+
+    masks, from predict_masks() on the upright image, skips inference; img may
+    then be another version of the same picture, such as an enhanced copy.
+    """
+    if remove_fn is None:
+        raise RuntimeError("rembg is not installed")
+    if alpha_matting and adaptive:
+        return adaptive_cutout(img, session, foreground_threshold, unknown_threshold, masks)
+    if masks is not None:
+        return masked_cutout(img, masks, alpha_matting, foreground_threshold)
+    # High precision removal; rembg runs inference and matting in one call
+    with instrumentation.stage("remove"):
+        result = remove_fn(
+            img,
+            session=session,
+            alpha_matting=alpha_matting,
+            alpha_matting_foreground_threshold=foreground_threshold
+        )
+    return result, "full" if alpha_matting else "off"
+
+def write_result(result, output_p, encoder=None):
+    """
+    Saves a cut_out() result and counts the bytes written.
+    """
+    with instrumentation.stage("encode"):
+        save_result(result, output_p, encoder)
+    instrumentation.count_written(output_p)
+
+def remove_background(input_p, output_p, session, alpha_matting=True, foreground_threshold=240,
+                      adaptive=False, unknown_threshold=UNKNOWN_THRESHOLD, encoder=None):
+    """
+    Removes the background of one image and saves the cut-out (as PNG unless
+    encoder, an encoder_options.EncoderOptions, says otherwise).
+
+    Returns which matting path was taken (see cut_out).
+    """
+    if remove_fn is None:
+        raise RuntimeError("rembg is not installed")
+    with open_image(input_p) as img:
+        result, path = cut_out(img, session, alpha_matting, foreground_threshold, adaptive, unknown_threshold)
+        write_result(result, output_p, encoder)
+    return path
+
+def masked_cutout(img, masks, alpha_matting=True, foreground_threshold=240):
+    """
+    Cuts out the foreground with masks predicted earlier, the way rembg.remove()
+    does after its inference. Returns (cutout, path) like cut_out().
+    """
+    from rembg.bg import alpha_matting_cutout, naive_cutout, get_concat_v_multi
+
+    img = ImageOps.exif_transpose(img)
+    check_mask_size(masks, img)
+    cutouts = []
+    with instrumentation.stage("matting" if alpha_matting else "remove"):
+        for mask in masks:
+            mask = Image.fromarray(np.asarray(mask))
+            if alpha_matting:
+                try:
+                    cutouts.append(alpha_matting_cutout(img, mask, foreground_threshold, BACKGROUND_THRESHOLD, ERODE_SIZE))
+                    continue
+                except ValueError:
+                    # rembg falls back to the plain mask when matting fails
+                    pass
+            cutouts.append(naive_cutout(img, mask))
+    path = "full" if alpha_matting else "off"
+    if not cutouts:
+        return img, path
+    return get_concat_v_multi(cutouts), path
+
+def build_trimap(mask, foreground_threshold, background_threshold=BACKGROUND_THRESHOLD, erode_size=ERODE_SIZE):
+    """
+    Builds the same 0/128/255 trimap rembg's alpha matting feeds to pymatting.
+    """
+    from scipy.ndimage import binary_erosion
+
+    mask_array = np.asarray(mask)
+    structure = np.ones((erode_size, erode_size), dtype=np.uint8) if erode_size > 0 else None
+    is_foreground = binary_erosion(mask_array > foreground_threshold, structure=structure)
+    is_background = binary_erosion(mask_array < background_threshold, structure=structure, border_value=1)
+    trimap = np.full(mask_array.shape, 128, dtype=np.uint8)
+    trimap[is_foreground] = 255
+    trimap[is_background] = 0
+    return trimap
+
+def adaptive_cutout(img, session, foreground_threshold=240, unknown_threshold=UNKNOWN_THRESHOLD, masks=None):
+    """
+    Cuts out the foreground, running pymatting only where the mask is uncertain.
+
+    The trimap is built first. Known pixels take their alpha straight from it.
+    If the unknown band covers less than unknown_threshold of the image, its
+    pixels keep the predicted mask value and matting is skipped ("skipped");
+    otherwise matting runs on the bounding box of the band plus MATTING_MARGIN
+    ("cropped"), or on the whole image when the box covers most of it ("full").
+    If the matting solver fails, the band keeps the predicted mask ("skipped").
+    masks, from predict_masks(), skips inference. Returns (cutout, path).
+    """
+    from pymatting.alpha.estimate_alpha_cf import estimate_alpha_cf
+    from pymatting.foreground.estimate_foreground_ml import estimate_foreground_ml
+
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    if masks is None:
+        masks = predict_masks(img, session)
+    check_mask_size(masks, img)
+    cutouts = []
+    paths = []
+    for mask_array in masks:
+        with instrumentation.stage("trimap"):
+            trimap = build_trimap(mask_array, foreground_threshold)
+            unknown = trimap == 128
+            alpha = np.where(unknown, mask_array, trimap).astype(np.uint8)
+            cutout = img.copy()
+            cutout.putalpha(Image.fromarray(alpha))
+
+        # A mask without an unknown band has nothing to mat, whatever the threshold
+        if not unknown.any() or unknown.mean() < unknown_threshold:
+            paths.append("skipped")
+            cutouts.append(cutout)
+            continue
+
+        rows = np.flatnonzero(unknown.any(axis=1))
+        cols = np.flatnonzero(unknown.any(axis=0))
+        top = max(0, rows[0] - MATTING_MARGIN)
+        bottom = min(unknown.shape[0], rows[-1] + 1 + MATTING_MARGIN)
+        left = max(0, cols[0] - MATTING_MARGIN)
+        right = min(unknown.shape[1], cols[-1] + 1 + MATTING_MARGIN)
+        box_area = (bottom - top) * (right - left)
+        path = "cropped" if box_area < 0.9 * unknown.size else "full"
+
+        with instrumentation.stage("matting"):
+            region = np.asarray(img.crop((left, top, right, bottom))) / 255.0
+            try:
+                region_alpha = estimate_alpha_cf(region, trimap[top:bottom, left:right] / 255.0)
+                region_foreground = estimate_foreground_ml(region, region_alpha)
+            except ValueError:
+                # Like masked_cutout(), keep the trimap's alpha when matting fails
+                path = "skipped"
+            else:
+                matted = np.dstack((region_foreground, region_alpha))
+                matted = np.clip(matted * 255, 0, 255).astype(np.uint8)
+                cutout.paste(Image.fromarray(matted, "RGBA"), (left, top))
+        paths.append(path)
+        cutouts.append(cutout)
+
+    if not cutouts:
+        return img, "skipped"
+    if len(cutouts) == 1:
+        return cutouts[0], paths[0]
+    from rembg.bg import get_concat_v_multi
+    # Several masks are stacked vertically, as rembg.remove() does
+    path = "full" if "full" in paths else "cropped" if "cropped" in paths else "skipped"
+    return get_concat_v_multi(cutouts), path
+
+def list_images(folder, recursive=False):
+    """
+    Returns the paths, relative to folder, of the images that background removal accepts.
+    """
+    return list(image_scanner.scan_images(folder, IMAGE_EXTENSIONS, recursive=recursive))
+
+def output_path_for(output_folder, name, encoder=None, prefix="clean_"):
+    """
+    Returns the clean_<name>.png path a source image is written to, keeping any subfolder.
+    The extension follows the encoder's format if one was chosen.
+    """
+    sub_folder, base = os.path.split(name)
+    output_p = os.path.join(output_folder, sub_folder, f"{prefix}{os.path.splitext(base)[0]}.png")
+    return encoder.output_path(output_p) if encoder is not None else output_p
+
+def colors_path(folder, name):
+    """
+    Returns the file in folder holding another version of the source image name:
+    the same name, or enhanced_<name> as enhancer.py writes it.
+    """
+    sub_folder, base = os.path.split(name)
+    for candidate in (base, f"enhanced_{base}"):
+        path = os.path.join(folder, sub_folder, candidate)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"no {base} or enhanced_{base} in {os.path.join(folder, sub_folder)}")
+
+def cutout_params(model, alpha_matting, foreground_threshold, adaptive, unknown_threshold, encoder=None,
+                  mask_only=False, apply_to=None):
+    """
+    Returns the settings that decide what remove_backgrounds() writes, for cache keys and job manifests.
+    """
+    if mask_only:
+        # The raw mask only depends on the model
+        params = {"model": model, "mask_only": True}
+    else:
+        params = {
+            "model": model, "alpha_matting": alpha_matting, "foreground_threshold": foreground_threshold,
+            "adaptive": adaptive, "unknown_threshold": unknown_threshold if adaptive else None,
+        }
+    if apply_to is not None:
+        params["apply_to"] = os.path.abspath(apply_to)
+    if encoder is not None and not encoder.is_default():
+        params.update(encoder.cache_params())
+    return params
+
+def remove_backgrounds(folder, output_folder=None, model="isnet-general-use", alpha_matting=True,
+                       foreground_threshold=240, workers=2, intra_op_threads=0, inter_op_threads=0,
+                       progress=None, adaptive=False, unknown_threshold=UNKNOWN_THRESHOLD, cache=None,
+                       recursive=False, include=None, exclude=None, encoder=None, io_depth=io_pipeline.DEFAULT_DEPTH,
+                       manifest=None, mask_only=False, apply_to=None):
+    """
+    Removes the background of every image in a folder.
+
+    Images are processed by a pool of worker threads sharing one cached session.
+    While they run inference, a prefetch thread reads and decodes the next io_depth
+    images and a write-behind thread saves finished cut-outs (see io_pipeline).
+    When intra_op_threads is 0 the cores are split evenly between the workers.
+    With adaptive=True alpha matting is only run where needed (see adaptive_cutout);
+    the path taken for each image is logged at INFO level. cache, a
+    result_cache.ResultCache, lets unchanged images reuse an earlier cut-out, and
+    also keeps the masks the model predicts, so runs with other thresholds or
+    matting settings skip inference. mask_only=True saves the raw mask of each
+    image (mask_<name>.png) instead of a cut-out. apply_to, a folder, cuts out
+    the other version of each image found there (see colors_path), such as an
+    enhanced copy, using the mask predicted for the original.
+    encoder, an encoder_options.EncoderOptions, sets the output format and compression.
+    recursive, include and exclude select the files as in image_scanner.scan_images;
+    the folder is read while images are processed, so work starts right away.
+    manifest, a job_manifest.JobManifest, records every file's state; when it is
+    resuming, files it reports as finished (or failed too often) are skipped.
+    Outputs are written atomically, so an interrupted run leaves no truncated files.
+    progress, if given, is called as progress(done, total, name, error) after each
+    image, with error set to the exception message for failed images and total
+    None until the whole folder has been read.
+    Returns a list of (name, error) pairs for the images that failed.
+    """
+    output_folder = output_folder or folder
+    # The folder is still being read while outputs are written, possibly into it
+    scan = image_scanner.Scan(folder, IMAGE_EXTENSIONS, recursive=recursive, include=include,
+                              exclude=exclude, skip_dirs=[output_folder] + ([apply_to] if apply_to else []),
+                              skip_prefixes=image_scanner.own_output_prefixes(folder, output_folder, OUTPUT_PREFIXES))
+    files = iter(scan)
+    first = next(files, None)
+    if first is None:
+        return []
+    os.makedirs(output_folder, exist_ok=True)
+
+    workers = max(1, workers)
+    if intra_op_threads == 0:
+        # Split the cores between the workers instead of letting each one claim all of them
+        intra_op_threads = max(1, (os.cpu_count() or 1) // workers)
+    session = get_session(model, intra_op_threads, inter_op_threads)
+    params = cutout_params(model, alpha_matting, foreground_threshold, adaptive, unknown_threshold, encoder,
+                           mask_only, apply_to)
+    prefix = "mask_" if mask_only else "clean_"
+
+    failed = []
+    paths = Counter()
+    done_count = 0
+    lock = threading.Lock()
+
+    def finished(name, path, error):
+        nonlocal done_count
+        with lock:
+            if error is None:
+                paths[path] += 1
+                log.info("%s: %s", name, path)
+            else:
+                failed.append((name, str(error)))
+            if manifest is not None and path != "resumed":
+                if error is None:
+                    manifest.done(name)
+                else:
+                    manifest.failed(name, error)
+            done_count += 1
+            if progress is not None:
+                progress(done_count, scan.total, name, str(error) if error else None)
+
+    def load(name):
+        # Runs on the prefetch thread, ahead of inference
+        input_p = os.path.join(folder, name)
+        output_p = output_path_for(output_folder, name, encoder, prefix)
+        if manifest is not None:
+            if manifest.skip(name, input_p, output_p):
+                return "resumed"
+            manifest.start(name, input_p)
+        os.makedirs(os.path.dirname(output_p), exist_ok=True)
+        with instrumentation.file(name, input_p):
+            key = masks_key = None
+            if cache is not None:
+                with instrumentation.stage("cache"):
+                    # A cut-out of an apply_to image also depends on that file, which the key does not cover
+                    if apply_to is None:
+                        key = cache.key(input_p, "remove_background", params)
+                        if cache.fetch(key, output_p):
+                            return "cached"
+                    masks_key = mask_key(cache, input_p, model)
+            colors = open_image(colors_path(apply_to, name)) if apply_to is not None else None
+            try:
+                img = open_image(input_p)
+            except Exception:
+                if colors is not None:
+                    colors.close()
+                raise
+            return img, colors, output_p, key, masks_key, instrumentation.handoff()
+
+    def write(result, output_p, key, path, trace):
+        # Runs on the write-behind thread
+        with instrumentation.resume(trace):
+            write_result(result, output_p, encoder)
+            if key is not None:
+                cache.store(key, output_p)
+        return path
+
+    def process(name, img, colors, output_p, key, masks_key, trace):
+        with instrumentation.resume(trace):
+            try:
+                masks = None
+                if mask_only or colors is not None or masks_key is not None:
+                    masks = predict_masks(ImageOps.exif_transpose(img), session, cache, masks_key)
+                if mask_only:
+                    result, path = mask_image(masks), "mask"
+                else:
+                    result, path = cut_out(img if colors is None else colors, session, alpha_matting,
+                                           foreground_threshold, adaptive, unknown_threshold, masks)
+            finally:
+                img.close()
+                if colors is not None:
+                    colors.close()
+            writer.submit(name, write, result, output_p, key, path, instrumentation.handoff())
+
+    # Decoding the next images and saving finished ones overlap with inference; the
+    # prefetch depth, the in-flight limit and the write queue bound the images in memory
+    with io_pipeline.WriteBehind(io_depth, done=finished) as writer, ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+
+        def collect(done):
+            for future in done:
+                name = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    finished(name, None, e)
+
+        for name, loaded, error in io_pipeline.prefetch(itertools.chain([first], files), load, io_depth):
+            if error is not None:
+                finished(name, None, error)
+                continue
+            if isinstance(loaded, str):
+                # Served from the cache, or finished by an earlier run
+                finished(name, loaded, None)
+                continue
+            in_flight[executor.submit(process, name, *loaded)] = name
+            if len(in_flight) >= workers:
+                collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+        collect(list(in_flight))
+    if adaptive or cache is not None or manifest is not None:
+        log.info("Paths taken: %s", ", ".join(f"{count} {path}" for path, count in sorted(paths.items())))
+    return failed
+
+def main():
+    """
+    Command-line entry point. Without arguments the Tk window is opened instead.
+    """
+    if len(sys.argv) == 1:
+        import background_remover_gui
+        background_remover_gui.main()
+        return
+
+    parser = argparse.ArgumentParser(description="Remove the background of every image in a folder.")
+    parser.add_argument("input_folder", help="Path to the folder containing images.")
+    parser.add_argument("--output_folder", help="Folder for the clean_*.png cut-outs. Defaults to the input folder.")
+    parser.add_argument("--model", choices=MODELS, default="isnet-general-use", help="Segmentation model to use.")
+    parser.add_argument("--no_alpha_matting", action="store_true", help="Disable alpha matting (faster, harder edges).")
+    parser.add_argument("--foreground_threshold", type=int, default=240, help="Alpha matting foreground threshold (0-255).")
+    parser.add_argument("--adaptive_matting", action="store_true", help="Only run alpha matting where the mask is uncertain, and only on that region.")
+    parser.add_argument("--unknown_threshold", type=float, default=UNKNOWN_THRESHOLD, help="With --adaptive_matting, the fraction of uncertain pixels above which matting runs.")
+    parser.add_argument("--mask_only", action="store_true", help="Save the mask the model predicts (mask_<name>.png) instead of a cut-out.")
+    parser.add_argument("--apply_to", metavar="FOLDER", help="Cut out the version of each image in this folder (same name, or enhanced_<name> as enhancer.py writes it) using the mask predicted for the original.")
+    parser.add_argument("--verbose", action="store_true", help="Log the matting path taken for each image.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of images processed at the same time.")
+    parser.add_argument("--intra_op_threads", type=int, default=0, help="ONNX Runtime intra-op threads per inference. 0 splits the cores between the workers.")
+    parser.add_argument("--inter_op_threads", type=int, default=0, help="ONNX Runtime inter-op threads. 0 keeps the ONNX Runtime default.")
+    result_cache.add_cache_arguments(parser)
+    image_scanner.add_scan_arguments(parser)
+    instrumentation.add_instrumentation_arguments(parser)
+    encoder_options.add_encoder_arguments(parser)
+    io_pipeline.add_io_arguments(parser)
+    job_manifest.add_manifest_arguments(parser)
+    image_daemon.add_daemon_arguments(parser)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    if args.daemon and (args.record or args.resume or args.manifest or args.mask_only or args.apply_to):
+        parser.error("--record, --resume, --manifest, --mask_only and --apply_to cannot be combined with --daemon")
+
+    if not IMPORT_READY and not args.daemon:
+        print("Error: rembg is not installed. Install the packages in Requirements.txt.")
+        sys.exit(1)
+
+    if not os.path.isdir(args.input_folder):
+        print(f"Error: Input folder not found at {args.input_folder}")
+        sys.exit(1)
+    if args.apply_to and not os.path.isdir(args.apply_to):
+        print(f"Error: Folder not found at {args.apply_to}")
+        sys.exit(1)
+
+    instrumentation.enable_from_args(args)
+    encoder = encoder_options.encoder_from_args(args)
+    output_folder = args.output_folder or args.input_folder
+    os.makedirs(output_folder, exist_ok=True)
+
+    if args.daemon:
+        # The daemon keeps the model loaded between jobs and shares its workers between users
+        options = {"model": args.model, "alpha_matting": not args.no_alpha_matting,
+                   "foreground_threshold": args.foreground_threshold, "adaptive": args.adaptive_matting,
+                   "unknown_threshold": args.unknown_threshold}
+        spec = image_daemon.job_spec("remove_background", args.input_folder, output_folder, options, encoder,
+                                     result_cache.cache_from_args(args), args.recursive, args.include, args.exclude)
+        try:
+            failed = image_daemon.run_from_args(args, spec, "Removing backgrounds")
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if failed:
+            print(f"{len(failed)} images failed:")
+            for name, error in sorted(failed):
+                print(f"  {name}: {error}")
+            sys.exit(1)
+        print(f"Cut-outs saved to '{output_folder}'.")
+        return
+
+    params = cutout_params(args.model, not args.no_alpha_matting, args.foreground_threshold,
+                           args.adaptive_matting, args.unknown_threshold, encoder, args.mask_only, args.apply_to)
+    manifest = job_manifest.manifest_from_args(args, output_folder, "remove_background", params)
+    print(f"Loading model {args.model}...")
+    # The total is only known once the folder has been read; until then the bar counts up
+    pbar = tqdm(desc="Removing backgrounds", unit="img")
+
+    def report(done, total, name, error):
+        if error:
+            tqdm.write(f"Error processing {name}: {error}")
+        if total is not None and pbar.total != total:
+            pbar.total = total
+        pbar.update(1)
+
+    failed = remove_backgrounds(
+        args.input_folder,
+        output_folder=args.output_folder,
+        model=args.model,
+        alpha_matting=not args.no_alpha_matting,
+        foreground_threshold=args.foreground_threshold,
+        workers=args.workers,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        progress=report,
+        adaptive=args.adaptive_matting,
+        unknown_threshold=args.unknown_threshold,
+        cache=result_cache.cache_from_args(args),
+        recursive=args.recursive,
+        include=args.include,
+        exclude=args.exclude,
+        encoder=encoder,
+        io_depth=args.io_depth,
+        manifest=manifest,
+        mask_only=args.mask_only,
+        apply_to=args.apply_to,
+    )
+    pbar.close()
+    instrumentation.finish()
+    if manifest is not None:
+        if manifest.resume:
+            print(manifest.resume_summary())
+        manifest.close()
+
+    if pbar.n == 0:
+        print(f"No images found in {args.input_folder}")
+        return
+
+    if failed:
+        print(f"{len(failed)} images failed:")
+        for name, error in sorted(failed):
+            print(f"  {name}: {error}")
+        sys.exit(1)
+    print(f"{'Masks' if args.mask_only else 'Cut-outs'} saved to '{args.output_folder or args.input_folder}'.")
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = HighPrecisionRemover(root)
-    root.mainloop()
\ No newline at end of file
+    main()
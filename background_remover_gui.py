@@ -0,0 +1,138 @@
+import os
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+import background_remover
+import encoder_options
+import image_daemon
+import result_cache
+from background_remover import MODELS
+
+class HighPrecisionRemover:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Teacher's High-Precision Image Tool")
+        self.root.geometry("700x550")
+        self.setup_ui()
+
+    def setup_ui(self):
+        # Folder Selection
+        folder_frame = ttk.LabelFrame(self.root, text=" 1. Folder Selection ", padding=10)
+        folder_frame.pack(fill="x", padx=20, pady=10)
+        self.path_var = tk.StringVar()
+        ttk.Entry(folder_frame, textvariable=self.path_var).pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Button(folder_frame, text="Browse", command=self.browse).pack(side="right")
+        self.recursive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(folder_frame, text="Include subfolders", variable=self.recursive_var).pack(side="right", padx=5)
+
+        # Engine Settings
+        engine_frame = ttk.LabelFrame(self.root, text=" 2. Engine Settings ", padding=10)
+        engine_frame.pack(fill="x", padx=20, pady=10)
+        
+        ttk.Label(engine_frame, text="Model:").grid(row=0, column=0, padx=5)
+        self.model_var = tk.StringVar(value="isnet-general-use")
+        model_chooser = ttk.Combobox(engine_frame, textvariable=self.model_var, state="readonly")
+        model_chooser['values'] = MODELS
+        model_chooser.grid(row=0, column=1, padx=5)
+
+        # Parallel inference: several images in flight, each using a share of the cores
+        cpus = os.cpu_count() or 1
+        ttk.Label(engine_frame, text="Workers:").grid(row=0, column=2, padx=5)
+        self.workers_var = tk.IntVar(value=min(2, cpus))
+        ttk.Spinbox(engine_frame, from_=1, to=cpus, textvariable=self.workers_var, width=5).grid(row=0, column=3, padx=5)
+
+        ttk.Label(engine_frame, text="Intra-op threads:").grid(row=1, column=0, padx=5, pady=(5, 0))
+        self.intra_var = tk.IntVar(value=0)
+        ttk.Spinbox(engine_frame, from_=0, to=cpus, textvariable=self.intra_var, width=5).grid(row=1, column=1, padx=5, pady=(5, 0), sticky="w")
+        ttk.Label(engine_frame, text="Inter-op threads:").grid(row=1, column=2, padx=5, pady=(5, 0))
+        self.inter_var = tk.IntVar(value=0)
+        ttk.Spinbox(engine_frame, from_=0, to=cpus, textvariable=self.inter_var, width=5).grid(row=1, column=3, padx=5, pady=(5, 0))
+        ttk.Label(engine_frame, text="(0 = automatic)").grid(row=1, column=4, padx=5, pady=(5, 0))
+
+        self.cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(engine_frame, text="Reuse results for unchanged images", variable=self.cache_var).grid(row=2, column=0, columnspan=2, padx=5, pady=(5, 0), sticky="w")
+        # A shared daemon keeps the model loaded and splits its workers between everyone's jobs
+        self.daemon_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(engine_frame, text="Run on the image daemon", variable=self.daemon_var).grid(row=2, column=2, columnspan=3, padx=5, pady=(5, 0), sticky="w")
+
+        # Cut-outs keep their transparency, so only formats with an alpha channel are offered
+        ttk.Label(engine_frame, text="Save as:").grid(row=3, column=0, padx=5, pady=(5, 0))
+        self.format_var = tk.StringVar(value="png")
+        ttk.Combobox(engine_frame, textvariable=self.format_var, values=("png", "webp"), state="readonly", width=8).grid(row=3, column=1, padx=5, pady=(5, 0), sticky="w")
+        ttk.Label(engine_frame, text="Preset:").grid(row=3, column=2, padx=5, pady=(5, 0))
+        self.preset_var = tk.StringVar(value="default")
+        ttk.Combobox(engine_frame, textvariable=self.preset_var, values=tuple(encoder_options.PRESETS), state="readonly", width=8).grid(row=3, column=3, padx=5, pady=(5, 0))
+
+        # Progress and Status
+        self.status_var = tk.StringVar(value="System Ready")
+        ttk.Label(self.root, textvariable=self.status_var).pack(pady=5)
+        self.progress_var = tk.DoubleVar()
+        ttk.Progressbar(self.root, variable=self.progress_var, maximum=100).pack(fill="x", padx=20, pady=10)
+
+        self.btn = ttk.Button(self.root, text="Start Processing", command=self.start_thread)
+        self.btn.pack(pady=20)
+
+    def browse(self):
+        directory = filedialog.askdirectory()
+        if directory: self.path_var.set(directory)
+
+    def start_thread(self):
+        # Error fix: Check if callable before starting
+        if not background_remover.IMPORT_READY and not self.daemon_var.get():
+            messagebox.showerror("Error", "AI Engine not found. Run the terminal fix!")
+            return
+        threading.Thread(target=self.run_process, daemon=True).start()
+
+    def run_process(self):
+        self.btn.state(['disabled'])
+        folder = self.path_var.get()
+
+        def report(done, total, name, error):
+            self.status_var.set(f"Failed: {name}" if error else f"Processed: {name}")
+            # total is None while the folder is still being read
+            if total:
+                self.progress_var.set((done/total)*100)
+            else:
+                self.status_var.set(f"{'Failed' if error else 'Processed'}: {name} ({done} so far)")
+
+        try:
+            encoder = encoder_options.EncoderOptions(format=self.format_var.get(), preset=self.preset_var.get())
+            cache = result_cache.open_cache() if self.cache_var.get() else None
+            if self.daemon_var.get():
+                self.status_var.set("Waiting for the image daemon...")
+                spec = image_daemon.job_spec("remove_background", folder, folder, {"model": self.model_var.get()},
+                                             encoder, cache, self.recursive_var.get())
+                failed = image_daemon.submit(spec, report)
+            else:
+                self.status_var.set("Loading AI Model...")
+                failed = background_remover.remove_backgrounds(
+                    folder,
+                    model=self.model_var.get(),
+                    workers=self.workers_var.get(),
+                    intra_op_threads=self.intra_var.get(),
+                    inter_op_threads=self.inter_var.get(),
+                    progress=report,
+                    cache=cache,
+                    recursive=self.recursive_var.get(),
+                    encoder=encoder,
+                )
+
+            if failed:
+                self.status_var.set(f"Completed with {len(failed)} error(s)")
+                messagebox.showwarning("Finished with errors", "\n".join(f"{name}: {error}" for name, error in failed[:20]))
+            else:
+                self.status_var.set("Successfully Completed!")
+                messagebox.showinfo("Success", "All images processed with high precision.")
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            self.btn.state(['!disabled'])
+
+def main():
+    root = tk.Tk()
+    app = HighPrecisionRemover(root)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import numpy as np
+from PIL import Image
+
+# Modes that stack directly into uint8 arrays; other modes are converted per image first
+STACK_MODES = ("L", "LA", "RGB", "RGBA")
+
+DEFAULT_BATCH_SIZE = 64
+
+# A batch is also cut short once it holds this many pixels, so large images make
+# small batches (64 icons of 256x256, but only one 12-megapixel photo)
+BATCH_PIXELS = 1 << 22
+
+def batch_limit(size, batch_size=DEFAULT_BATCH_SIZE, max_pixels=BATCH_PIXELS):
+    """
+    Returns how many images of the given (width, height) go in one batch.
+    """
+    return max(1, min(batch_size, max_pixels // max(1, size[0] * size[1])))
+
+def group_by_shape(items, batch_size=DEFAULT_BATCH_SIZE, max_pixels=BATCH_PIXELS):
+    """
+    Groups (tag, image) pairs into lists of pairs whose images share mode and size.
+
+    A group is yielded as soon as it is full (see batch_limit). Images of other
+    shapes wait in their own groups; when more than batch_size images are waiting,
+    the largest group is yielded early, so a folder of mixed sizes never holds more
+    than about one batch in memory. The remaining groups are yielded at the end.
+    """
+    groups = {}
+    waiting = 0
+    for tag, img in items:
+        key = (img.mode, img.size)
+        group = groups.setdefault(key, [])
+        group.append((tag, img))
+        waiting += 1
+        if len(group) >= batch_limit(img.size, batch_size, max_pixels):
+            waiting -= len(group)
+            yield groups.pop(key)
+        elif waiting > batch_size:
+            largest = max(groups, key=lambda k: len(groups[k]))
+            waiting -= len(groups[largest])
+            yield groups.pop(largest)
+    yield from groups.values()
+
+def chunked(items, size):
+    """
+    Yields lists of up to size consecutive items.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stack(images):
+    """
+    Stacks same-sized images into one uint8 array: (N, H, W) for L, (N, H, W, C) otherwise.
+    """
+    return np.stack([np.asarray(img) for img in images])
+
+def unstack(array):
+    """
+    Splits a stack back into Pillow images; the mode follows from the channel count.
+    """
+    return [Image.fromarray(np.ascontiguousarray(item)) for item in array]
@@ -0,0 +1,124 @@
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_ops
+import enhance_kernel
+from bench_enhance import make_image
+
+FACTORS = (1.2, 1.5, 2.0, 1.5)
+
+
+def enhance_loop(images):
+    return [enhance_kernel.enhance(img, *FACTORS) for img in images]
+
+
+def enhance_batched(images):
+    out = []
+    for group in batch_ops.group_by_shape(enumerate(images)):
+        stack = batch_ops.stack([img for _, img in group])
+        out.extend(batch_ops.unstack(enhance_kernel.enhance_stack(stack, group[0][1].mode, *FACTORS)))
+    return out
+
+
+# Stacked versions of what icons_loop does. They stay here rather than in batch_ops:
+# for Pillow images, stacking and unstacking cost more than Pillow's own per-image calls
+def to_rgb(array, mode):
+    """
+    Converts a stack to RGB the way Image.convert("RGB") does: alpha is dropped
+    (not composited) and grey levels are copied to all three channels.
+    """
+    if mode == "RGB":
+        return array
+    if mode == "RGBA":
+        return array[..., :3]
+    grey = array if mode == "L" else array[..., 0]
+    return np.repeat(grey[..., np.newaxis], 3, axis=-1)
+
+
+def rotate90(array, degrees):
+    """
+    Rotates every image of a stack by a multiple of 90 degrees counter-clockwise,
+    like Image.transpose (and Image.rotate on square images).
+    """
+    if degrees % 90:
+        raise ValueError("rotate90 only handles multiples of 90 degrees")
+    return np.rot90(array, int(degrees // 90) % 4, axes=(1, 2))
+
+
+def icons_loop(images):
+    # What image_converter.py does to each icon after resizing
+    return [img.rotate(-90).convert("RGB") for img in images]
+
+
+def icons_batched(images):
+    out = []
+    for group in batch_ops.group_by_shape(enumerate(images)):
+        stack = batch_ops.stack([img for _, img in group])
+        out.extend(batch_ops.unstack(rotate90(to_rgb(stack, group[0][1].mode), -90)))
+    return out
+
+
+CASES = {
+    "enhance": (enhance_loop, enhance_batched),
+    "rotate+convert": (icons_loop, icons_batched),
+}
+
+
+def best_time(function, images, repeat):
+    """
+    Returns (fastest seconds, result) over repeat runs.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(images)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def max_difference(a, b):
+    return max(int(np.abs(np.asarray(x, dtype=np.int16) - np.asarray(y, dtype=np.int16)).max()) for x, y in zip(a, b))
+
+
+def main():
+    """
+    Compares the per-image loop with batched NumPy stacks for same-sized images.
+    """
+    parser = argparse.ArgumentParser(description="Compare per-image processing with batched NumPy stacks.")
+    parser.add_argument("--count", type=int, default=256, help="Number of images.")
+    parser.add_argument("--size", type=int, default=128, help="Width and height of each image.")
+    parser.add_argument("--modes", nargs="+", default=["RGB", "RGBA"], choices=batch_ops.STACK_MODES, help="Image modes to test.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes:
+        base = make_image(args.size * 4, args.size * 4, "RGB")
+        images = [base.rotate(i * 7).resize((args.size, args.size)).convert(mode) for i in range(args.count)]
+        print(f"{args.count} images, {args.size}x{args.size} {mode}")
+        for case, (loop, batched) in CASES.items():
+            loop_seconds, expected = best_time(loop, images, args.repeat)
+            batch_seconds, actual = best_time(batched, images, args.repeat)
+            difference = max_difference(expected, actual)
+            results.append({"case": case, "mode": mode, "loop_seconds": loop_seconds,
+                            "batch_seconds": batch_seconds, "max_difference": difference})
+            print(f"  {case:15s} loop {loop_seconds * 1000:8.1f} ms  batched {batch_seconds * 1000:8.1f} ms  "
+                  f"x{loop_seconds / batch_seconds:5.2f}  max difference {difference}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"count": args.count, "size": args.size, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+
+import encoder_options
+from bench_enhance import make_image
+
+
+def make_cutout(width, height):
+    """
+    Builds an RGBA image shaped like a background removal result: a soft-edged subject on transparency.
+    """
+    img = make_image(width, height, "RGB")
+    alpha = Image.radial_gradient("L").resize((width, height)).point(lambda v: 255 if v < 96 else (0 if v > 128 else (128 - v) * 8))
+    img.putalpha(alpha)
+    return img
+
+
+def encode(img, fmt, preset, repeat):
+    """
+    Encodes img in memory and returns (fastest seconds, size in bytes).
+    """
+    options = encoder_options.EncoderOptions(format=fmt, preset=preset)
+    img_format = encoder_options.FORMATS[fmt][0]
+    timings = []
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        options.save(img, buffer, img_format)
+        timings.append(time.perf_counter() - start)
+    return min(timings), buffer.tell()
+
+
+def main():
+    """
+    Reports encode time and output size for every preset and format.
+    """
+    parser = argparse.ArgumentParser(description="Compare encode time and file size of the encoder presets.")
+    parser.add_argument("--width", type=int, default=3000, help="Image width.")
+    parser.add_argument("--height", type=int, default=2000, help="Image height.")
+    parser.add_argument("--repeat", type=int, default=3, help="Encodes per combination; the fastest is reported.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    images = {
+        "photo (RGB)": (make_image(args.width, args.height, "RGB"), ("jpeg", "png", "webp", "avif")),
+        "cut-out (RGBA)": (make_cutout(args.width, args.height), ("png", "webp", "avif")),
+    }
+    results = []
+    for label, (img, formats) in images.items():
+        print(f"{label}, {args.width}x{args.height}")
+        for fmt in formats:
+            if fmt not in encoder_options.FORMATS:
+                continue
+            for preset in encoder_options.PRESETS:
+                seconds, size = encode(img, fmt, preset, args.repeat)
+                results.append({"image": label, "format": fmt, "preset": preset, "seconds": seconds, "bytes": size})
+                print(f"  {fmt:5s} {preset:9s} {seconds * 1000:8.0f} ms  {size / 1e6:7.2f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"width": args.width, "height": args.height, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
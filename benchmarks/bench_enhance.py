@@ -0,0 +1,139 @@
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import enhance_kernel
+
+ENGINES = ("pil", "fused")
+
+
+def _proc_status_mb(field):
+    """
+    Reads a memory field such as VmRSS from /proc/self/status, in MB, or None off Linux.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS counter so earlier allocations do not hide the measured step.
+
+    Returns the current RSS in MB to use as the baseline.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return peak_rss_mb()
+    return _proc_status_mb("VmRSS")
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of this process in MB.
+    """
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_image(width, height, mode):
+    """
+    Builds a synthetic photo-like test image (gradients plus noise) without large temporaries.
+    """
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    bands = [gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)]
+    img = Image.merge("RGB", bands)
+    if mode == "RGBA":
+        img.putalpha(gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM))
+    elif mode != "RGB":
+        img = img.convert(mode)
+    return img
+
+
+def run_child(args):
+    """
+    Runs one engine in this process and prints a JSON result line.
+    """
+    img = make_image(args.width, args.height, args.mode)
+    baseline = reset_peak_rss()
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = enhance_kernel.enhance(img, args.brightness, args.contrast, args.sharpness, args.color, engine=args.engine)
+        result.load()
+        timings.append(time.perf_counter() - start)
+        del result
+    print(json.dumps({
+        "engine": args.engine,
+        "seconds": min(timings),
+        "peak_extra_mb": peak_rss_mb() - baseline,
+    }))
+
+
+def main():
+    """
+    Compares the ImageEnhance chain with the fused engine on a large synthetic image.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the fused enhancement engine against the ImageEnhance chain.")
+    parser.add_argument("--width", type=int, default=6000, help="Image width. The default 6000x4000 is a 24MP frame.")
+    parser.add_argument("--height", type=int, default=4000, help="Image height.")
+    parser.add_argument("--mode", default="RGB", choices=enhance_kernel.FUSED_MODES, help="Image mode to benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine; the fastest is reported.")
+    parser.add_argument("--brightness", type=float, default=1.2)
+    parser.add_argument("--contrast", type=float, default=1.5)
+    parser.add_argument("--sharpness", type=float, default=2.0)
+    parser.add_argument("--color", type=float, default=1.5)
+    parser.add_argument("--engine", choices=ENGINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        run_child(args)
+        return
+
+    # Check the tolerance on a smaller frame before timing anything
+    sample = make_image(min(args.width, 1200), min(args.height, 800), args.mode)
+    factors = (args.brightness, args.contrast, args.sharpness, args.color)
+    fused = np.asarray(enhance_kernel.enhance(sample, *factors), dtype=np.int16)
+    chain = np.asarray(enhance_kernel.enhance_chain(sample, *factors), dtype=np.int16)
+    max_diff = int(np.abs(fused - chain).max())
+    print(f"Max difference vs ImageEnhance chain: {max_diff} (tolerance {enhance_kernel.TOLERANCE})")
+
+    # Each engine runs in a fresh process so peak memory is measured independently
+    results = {}
+    for engine in ENGINES:
+        cmd = [sys.executable, os.path.abspath(__file__), "--engine", engine] + sys.argv[1:]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results[engine] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{args.width}x{args.height} {args.mode}, factors {factors}")
+    for engine in ENGINES:
+        r = results[engine]
+        print(f"  {engine:6s} {r['seconds']:.3f}s  peak +{r['peak_extra_mb']:.0f} MB")
+    pil, fused = results["pil"], results["fused"]
+    print(f"Speedup: {pil['seconds'] / fused['seconds']:.2f}x, "
+          f"peak memory: {fused['peak_extra_mb']:.0f} MB vs {pil['peak_extra_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import PIL
+from PIL import Image
+from bench_enhance import make_image, reset_peak_rss, peak_rss_mb
+
+SIZES = {"small": (640, 480), "medium": (1920, 1080), "large": (4000, 3000)}
+
+# (mode, format) pairs in the corpus; each format only gets the modes it can store
+VARIANTS = (
+    ("RGB", "jpg"), ("L", "jpg"),
+    ("RGB", "png"), ("RGBA", "png"), ("P", "png"), ("L", "png"),
+    ("RGB", "bmp"), ("P", "gif"),
+)
+
+BENCHMARKS = ("enhance", "resize", "crop", "rotate", "remove_background")
+
+# Change in p50 latency or throughput above which compare flags a result
+THRESHOLD = 0.10
+
+def corpus_dir(root, size_name, images):
+    """
+    Returns the folder holding the synthetic corpus for one size, generating it if needed.
+    """
+    folder = os.path.join(root, f"{size_name}-{images}")
+    if os.path.isdir(folder):
+        return folder
+    width, height = SIZES[size_name]
+    partial = folder + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    for mode, fmt in VARIANTS:
+        for i in range(images):
+            img = make_image(width, height, "RGB").rotate(i * 7)
+            if mode == "P":
+                img = img.convert("P", palette=Image.Palette.ADAPTIVE)
+            elif mode == "RGBA":
+                img = make_image(width, height, "RGBA")
+            elif mode != "RGB":
+                img = img.convert(mode)
+            img.save(os.path.join(partial, f"{mode}_{i}.{fmt}"))
+    # Renamed into place only when complete, so an interrupted run is regenerated
+    os.rename(partial, folder)
+    return folder
+
+def load_benchmark(name):
+    """
+    Returns a function f(input_path, output_dir) running one tool's core function on one image,
+    or None when the tool's dependencies are missing.
+    """
+    if name == "enhance":
+        import enhancer
+
+        def run(path, out_dir):
+            output = os.path.join(out_dir, "enhanced_" + os.path.basename(path))
+            if not enhancer.enhance_image(path, output, 1.2, 1.5, 2.0, 1.5):
+                raise RuntimeError("enhance_image failed")
+        return run
+    if name == "resize":
+        import image_resizer
+
+        def run(path, out_dir):
+            image_resizer.resize_image(path, os.path.join(out_dir, os.path.basename(path)), (800, 600))
+        return run
+    if name == "crop":
+        import image_cropper
+
+        def run(path, out_dir):
+            image_cropper.crop_image(path, os.path.join(out_dir, os.path.basename(path)), 32, 32, 32, 32)
+        return run
+    if name == "rotate":
+        import image_rotate
+
+        def run(path, out_dir):
+            base = os.path.splitext(os.path.basename(path))[0]
+            image_rotate.process_image(path, os.path.join(out_dir, base + ".png"), "PNG", 90)
+        return run
+    if name == "remove_background":
+        import background_remover
+        if not background_remover.IMPORT_READY:
+            return None
+        session = background_remover.get_session("isnet-general-use")
+
+        def run(path, out_dir):
+            background_remover.remove_background(path, background_remover.output_path_for(out_dir, os.path.basename(path)),
+                                                 session, alpha_matting=False)
+        return run
+    raise ValueError(f"unknown benchmark '{name}'")
+
+def percentile(values, fraction):
+    """
+    Returns the given percentile (0-1) of values, interpolating between samples.
+    """
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def summarize(latencies, pixels):
+    """
+    Turns per-image latencies (seconds) into throughput and latency figures.
+    """
+    total = sum(latencies)
+    return {
+        "images": len(latencies),
+        "seconds": total,
+        "images_per_second": len(latencies) / total if total else None,
+        "megapixels_per_second": pixels / 1e6 / total if total else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+    }
+
+def run_child(args):
+    """
+    Times one benchmark over one corpus in this process and prints a JSON result line.
+    """
+    run = load_benchmark(args.child)
+    if run is None:
+        print(json.dumps({"skipped": "dependencies not installed"}))
+        return
+    files = sorted(os.listdir(args.corpus))
+    out_dir = tempfile.mkdtemp(prefix="bench-out-")
+    try:
+        # One untimed pass loads modules, models and caches
+        try:
+            run(os.path.join(args.corpus, files[0]), out_dir)
+        except Exception:
+            pass
+        baseline = reset_peak_rss()
+        latencies = []
+        by_variant = {}
+        errors = {}
+        pixels = 0
+        width, height = SIZES[args.size]
+        for _ in range(args.repeat):
+            for name in files:
+                start = time.perf_counter()
+                try:
+                    run(os.path.join(args.corpus, name), out_dir)
+                except Exception as e:
+                    # Unsupported inputs are reported, not timed
+                    errors[name] = str(e)
+                    continue
+                elapsed = time.perf_counter() - start
+                latencies.append(elapsed)
+                variant = name.split("_")[0] + "." + os.path.splitext(name)[1][1:]
+                by_variant.setdefault(variant, []).append(elapsed)
+                pixels += width * height
+        if not latencies:
+            print(json.dumps({"skipped": "every image failed", "errors": errors}))
+            return
+        result = summarize(latencies, pixels)
+        result["errors"] = errors
+        result["peak_rss_mb"] = peak_rss_mb()
+        result["peak_extra_mb"] = result["peak_rss_mb"] - baseline
+        result["p50_ms_by_variant"] = {v: percentile(t, 0.50) * 1000 for v, t in sorted(by_variant.items())}
+        print(json.dumps(result))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+def run_all(args):
+    """
+    Runs every selected benchmark on every selected corpus size and writes the JSON report.
+    """
+    root = args.corpus_dir or os.path.join(tempfile.gettempdir(), "images_bench_corpus")
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "images_per_variant": args.images,
+        "repeat": args.repeat,
+        "results": {},
+    }
+    for size_name in args.sizes:
+        corpus = corpus_dir(root, size_name, args.images)
+        for bench in args.bench:
+            case = f"{bench}/{size_name}"
+            # Each case runs in a fresh process so its peak memory is measured on its own
+            cmd = [sys.executable, os.path.abspath(__file__), "run", "--child", bench,
+                   "--corpus", corpus, "--size", size_name, "--repeat", str(args.repeat)]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{case}: failed\n{proc.stderr.strip()}")
+                report["results"][case] = {"error": proc.stderr.strip().splitlines()[-1:]}
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            report["results"][case] = result
+            if "skipped" in result:
+                print(f"{case:28s} skipped ({result['skipped']})")
+                continue
+            print(f"{case:28s} {result['images_per_second']:8.1f} img/s  p50 {result['p50_ms']:8.1f} ms  "
+                  f"p95 {result['p95_ms']:8.1f} ms  peak {result['peak_rss_mb']:7.0f} MB")
+            if result["errors"]:
+                print(f"{'':28s} {len(result['errors'])} image(s) failed, e.g. {next(iter(result['errors']))}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+def compare(args):
+    """
+    Prints the change between two reports and exits with 1 if anything got slower than the threshold.
+    """
+    with open(args.baseline) as f:
+        old = json.load(f)["results"]
+    with open(args.current) as f:
+        new = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'case':28s} {'p50 ms':>18s} {'img/s':>18s} {'peak MB':>16s}")
+    for case in sorted(set(old) & set(new)):
+        a, b = old[case], new[case]
+        if "p50_ms" not in a or "p50_ms" not in b:
+            continue
+        p50_change = b["p50_ms"] / a["p50_ms"] - 1
+        rate_change = b["images_per_second"] / a["images_per_second"] - 1
+        flag = ""
+        if p50_change > args.threshold or rate_change < -args.threshold:
+            flag = "  SLOWER"
+            regressions += 1
+        elif p50_change < -args.threshold:
+            flag = "  faster"
+        print(f"{case:28s} {a['p50_ms']:7.1f} -> {b['p50_ms']:7.1f} "
+              f"{a['images_per_second']:7.1f} -> {b['images_per_second']:7.1f} "
+              f"{a['peak_rss_mb']:6.0f} -> {b['peak_rss_mb']:6.0f}{flag}")
+    for case in sorted(set(old) ^ set(new)):
+        print(f"{case:28s} only in {'baseline' if case in old else 'current'}")
+
+    if regressions:
+        print(f"{regressions} case(s) slower by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+def main():
+    """
+    Benchmarks the core function of every tool on synthetic images, or compares two runs.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark each tool's core function on synthetic images.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmarks and write a JSON report.")
+    run.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON report.")
+    run.add_argument("--bench", action="append", choices=BENCHMARKS, help="Benchmark to run. Can be repeated; defaults to all.")
+    run.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=["small", "medium"], help="Corpus image sizes to use.")
+    run.add_argument("--images", type=int, default=3, help="Images generated per mode/format combination.")
+    run.add_argument("--repeat", type=int, default=1, help="Passes over the corpus per benchmark.")
+    run.add_argument("--corpus_dir", help="Where to keep the generated corpora. Defaults to a folder in the system temp directory.")
+    run.add_argument("--child", choices=BENCHMARKS, help=argparse.SUPPRESS)
+    run.add_argument("--corpus", help=argparse.SUPPRESS)
+    run.add_argument("--size", choices=sorted(SIZES), help=argparse.SUPPRESS)
+
+    cmp = commands.add_parser("compare", help="Compare two JSON reports.")
+    cmp.add_argument("baseline", help="Report from before the change.")
+    cmp.add_argument("current", help="Report from after the change.")
+    cmp.add_argument("--threshold", type=float, default=THRESHOLD, help="Relative change treated as a regression (0.10 = 10%%).")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+    elif args.child:
+        run_child(args)
+    else:
+        args.bench = args.bench or list(BENCHMARKS)
+        run_all(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+from PIL import Image, features
+
+import job_manifest
+
+# Output format name (as typed on the command line) -> Pillow format and file extension
+FORMATS = {
+    'jpeg': ('JPEG', '.jpg'), 'jpg': ('JPEG', '.jpg'), 'png': ('PNG', '.png'),
+    'webp': ('WEBP', '.webp'), 'avif': ('AVIF', '.avif'), 'tiff': ('TIFF', '.tiff'),
+    'bmp': ('BMP', '.bmp'), 'gif': ('GIF', '.gif'),
+}
+if not features.check('avif'):
+    del FORMATS['avif']
+
+# Pillow format for each extension the tools write, used when no format is chosen
+EXTENSION_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP', '.avif': 'AVIF',
+                     '.tif': 'TIFF', '.tiff': 'TIFF', '.bmp': 'BMP', '.gif': 'GIF'}
+
+# Speed-versus-size presets. "default" leaves every setting to Pillow, which is how
+# the tools have always saved (JPEG quality 75, PNG compress_level 6). "fast" keeps
+# Pillow's quality and only changes settings that cost encoding time.
+# "method" is the WebP effort (0 fastest to 6 smallest), "speed" the AVIF one (10 fastest to 0).
+PRESETS = {
+    "default": {},
+    "fast": {"compress_level": 1, "optimize": False, "progressive": False, "method": 0, "speed": 10},
+    "balanced": {"quality": 85, "compress_level": 6, "optimize": False, "progressive": False, "method": 4, "speed": 8},
+    "small": {"quality": 80, "compress_level": 9, "optimize": True, "progressive": True, "method": 6, "speed": 6},
+}
+
+# Modes each format can store; anything else is converted to the first entry
+FORMAT_MODES = {'JPEG': ("RGB", "L", "CMYK"), 'BMP': ("RGB", "L", "P", "1")}
+
+class EncoderOptions:
+    """
+    How the tools encode their output: format, quality and compression settings.
+
+    format is a key of FORMATS, or None to keep the format implied by the output
+    file name. Any setting left as None falls back to the preset. With
+    lossless_alpha, WebP images that have an alpha channel (such as background
+    removal cut-outs) are saved losslessly so their edges are not smeared.
+    """
+
+    def __init__(self, format=None, preset="default", quality=None, compress_level=None,
+                 optimize=None, progressive=None, lossless_alpha=True):
+        settings = dict(PRESETS[preset])
+        for name, value in (("quality", quality), ("compress_level", compress_level),
+                            ("optimize", optimize), ("progressive", progressive)):
+            if value is not None:
+                settings[name] = value
+        self.format = format
+        self.preset = preset
+        self.settings = settings
+        self.lossless_alpha = lossless_alpha
+
+    def output_path(self, path):
+        """
+        Returns path with its extension changed to the chosen format, if one was chosen.
+        """
+        if self.format is None:
+            return path
+        return os.path.splitext(path)[0] + FORMATS[self.format][1]
+
+    def save_arguments(self, img, img_format):
+        """
+        Returns the Image.save() keyword arguments for img in the given Pillow format.
+        """
+        settings = self.settings
+        kwargs = {}
+        if img_format == 'JPEG':
+            for name in ("quality", "optimize", "progressive"):
+                if name in settings:
+                    kwargs[name] = settings[name]
+        elif img_format == 'PNG':
+            # Pillow's PNG optimize only forces level 9 with extra filter passes, which is
+            # slower and often larger than the level alone, so only compress_level is used
+            if "compress_level" in settings:
+                kwargs["compress_level"] = settings["compress_level"]
+        elif img_format == 'WEBP':
+            if self.lossless_alpha and img.mode in ("RGBA", "LA", "PA"):
+                kwargs["lossless"] = True
+            for name in ("quality", "method"):
+                if name in settings:
+                    kwargs[name] = settings[name]
+        elif img_format == 'AVIF':
+            for name in ("quality", "speed"):
+                if name in settings:
+                    kwargs[name] = settings[name]
+        elif img_format == 'TIFF':
+            if settings.get("compress_level", 0) > 1:
+                kwargs["compression"] = "tiff_adobe_deflate"
+        return kwargs
+
+    def save(self, img, path, img_format=None):
+        """
+        Saves img to path using these options. img_format overrides the chosen format;
+        otherwise it comes from the options or from the file extension. Paths (not
+        file objects) are written atomically.
+        """
+        if img_format is None:
+            if self.format is not None:
+                img_format = FORMATS[self.format][0]
+            else:
+                ext = os.path.splitext(path)[1].lower()
+                img_format = EXTENSION_FORMATS.get(ext) or Image.registered_extensions().get(ext)
+        modes = FORMAT_MODES.get(img_format)
+        if modes and img.mode not in modes:
+            img = img.convert(modes[0])
+        if not isinstance(path, str):
+            img.save(path, img_format, **self.save_arguments(img, img_format))
+            return
+        with job_manifest.atomic_output(path) as tmp_path:
+            img.save(tmp_path, img_format, **self.save_arguments(img, img_format))
+
+    def cache_params(self):
+        """
+        The settings that change the output, for result cache keys.
+        """
+        return {"format": self.format, "encoder": self.settings, "lossless_alpha": self.lossless_alpha}
+
+    def is_default(self):
+        return self.format is None and not self.settings
+
+def save_image(img, path, options=None, img_format=None):
+    """
+    Saves img with the given EncoderOptions, or with Pillow's defaults when options is None.
+    The file only appears under its name once it is complete.
+    """
+    if options is None:
+        if img_format is None:
+            img_format = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+        with job_manifest.atomic_output(path) as tmp_path:
+            img.save(tmp_path, img_format)
+    else:
+        options.save(img, path, img_format)
+
+def add_encoder_arguments(parser, include_format=True):
+    """
+    Adds the output encoding options shared by the command-line tools.
+    """
+    group = parser.add_argument_group("output encoding")
+    if include_format:
+        group.add_argument("--format", choices=sorted(FORMATS), help="Output format. Defaults to the tool's usual format.")
+    group.add_argument("--preset", choices=sorted(PRESETS), default="default", help="Speed versus size: 'fast' writes quickly with light compression, 'small' compresses hardest, 'balanced' is in between. 'default' keeps Pillow's settings.")
+    group.add_argument("--quality", type=int, help="JPEG/WebP/AVIF quality (1-100). Overrides the preset.")
+    group.add_argument("--compress_level", type=int, choices=range(10), metavar="0-9", help="PNG compression level; 1 is fastest, 9 smallest. Overrides the preset.")
+    group.add_argument("--optimize", action="store_true", default=None, help="Extra pass for smaller JPEG files.")
+    group.add_argument("--progressive", action="store_true", default=None, help="Write progressive JPEGs.")
+    group.add_argument("--lossy_alpha", action="store_true", help="Allow lossy WebP for images with transparency (they are saved losslessly by default).")
+
+def encoder_from_params(params):
+    """
+    Rebuilds the EncoderOptions described by EncoderOptions.cache_params(), for
+    example after it was sent to image_daemon.py. None gives the default options.
+    """
+    encoder = EncoderOptions()
+    if params is not None:
+        encoder.format = params["format"]
+        encoder.settings = dict(params["encoder"])
+        encoder.lossless_alpha = params["lossless_alpha"]
+    return encoder
+
+def encoder_from_args(args):
+    """
+    Returns the EncoderOptions configured by add_encoder_arguments() options.
+    """
+    return EncoderOptions(format=getattr(args, "format", None), preset=args.preset, quality=args.quality,
+                          compress_level=args.compress_level, optimize=args.optimize,
+                          progressive=args.progressive, lossless_alpha=not args.lossy_alpha)
@@ -0,0 +1,257 @@
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+# Modes handled by the fused engine; anything else goes through the PIL chain
+FUSED_MODES = ("L", "LA", "RGB", "RGBA")
+
+# Rows per strip are chosen so that one float32 working strip stays around this many pixels
+STRIP_PIXELS = 1 << 18
+
+# Upper bound on the temporary bytes the fused engine needs per strip pixel (RGBA:
+# the cropped and table-mapped strips, the float32 buffer, the smoothed copy, the
+# box-sum rows, luma and the uint8 result), used to size strips for a memory budget
+WORKING_BYTES_PER_PIXEL = 64
+
+# Largest per-channel difference between the fused engine and the ImageEnhance chain
+# (8-bit levels). The fused engine reproduces the chain's clipping and truncation at
+# every stage, so in practice the outputs are identical; a difference can only come
+# from float32 rounding landing on the other side of an integer step.
+TOLERANCE = 1
+
+
+def enhance_chain(img, brightness, contrast, sharpness, color):
+    """
+    Applies the enhancements with chained ImageEnhance calls (the reference implementation).
+    """
+    if brightness != 1.0:
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+    if contrast != 1.0:
+        img = ImageEnhance.Contrast(img).enhance(contrast)
+    if sharpness != 1.0:
+        img = ImageEnhance.Sharpness(img).enhance(sharpness)
+    if color != 1.0:
+        img = ImageEnhance.Color(img).enhance(color)
+    return img
+
+
+def strip_rows(width, memory_budget=None):
+    """
+    Returns the number of rows per strip, sized to memory_budget bytes of working memory if given.
+    """
+    if memory_budget is None:
+        return max(1, STRIP_PIXELS // max(1, width))
+    return max(1, memory_budget // (max(1, width) * WORKING_BYTES_PER_PIXEL))
+
+
+def enhance(img, brightness, contrast, sharpness, color, engine="fused", memory_budget=None, in_place=False):
+    """
+    Applies brightness, contrast, sharpness and color enhancement to an image.
+
+    The fused engine works through the image in horizontal strips. Brightness and
+    contrast are folded into a single lookup table, and sharpness and color run on
+    one float32 working buffer per strip, so only the source and the output image
+    are ever held at full size. Its output matches enhance_chain() within
+    TOLERANCE levels per channel. Modes other than FUSED_MODES, and engine="pil",
+    use the ImageEnhance chain.
+
+    memory_budget caps the strip working memory in bytes. With in_place=True the
+    result is written back into img (which is returned), so the decoded image is
+    the only full-size buffer; the original pixels of the row above each strip
+    are kept aside so sharpening has no seams.
+    """
+    if engine == "pil" or img.mode not in FUSED_MODES:
+        return enhance_chain(img, brightness, contrast, sharpness, color)
+    if brightness == 1.0 and contrast == 1.0 and sharpness == 1.0 and color == 1.0:
+        return img
+
+    width, height = img.size
+    colors = len(img.getbands()) - (1 if img.mode.endswith("A") else 0)
+    sharpen = sharpness != 1.0 and width > 2 and height > 2
+    saturate = color != 1.0 and img.mode.startswith("RGB")
+    lut = _tone_lut(img, brightness, contrast, memory_budget)
+
+    out = img if in_place else Image.new(img.mode, img.size)
+    rows = strip_rows(width, memory_budget)
+    halo = None
+    for y0 in range(0, height, rows):
+        y1 = min(height, y0 + rows)
+        # Sharpening looks one row above and below the strip
+        top = max(0, y0 - 1) if sharpen else y0
+        bottom = min(height, y1 + 1) if sharpen else y1
+
+        strip = img.crop((0, top, width, bottom))
+        if in_place and sharpen:
+            # The row above has already been overwritten; restore its original pixels
+            if halo is not None:
+                strip.paste(halo, (0, 0))
+            halo = img.crop((0, y1 - 1, width, y1))
+        if lut is not None:
+            strip = strip.point(lut)
+        if sharpen or saturate:
+            buf = np.asarray(strip, dtype=np.float32)
+            if buf.ndim == 2:
+                buf = buf[..., np.newaxis]
+            bands = buf[..., :colors]
+            if sharpen:
+                _blend(bands, _smooth(bands), sharpness, truncate=saturate)
+            if saturate:
+                _blend(bands, _luminance(bands)[..., np.newaxis], color, truncate=False)
+            buf = buf[y0 - top:y1 - top].astype(np.uint8)
+            strip = Image.fromarray(buf[..., 0] if buf.shape[-1] == 1 else buf, img.mode)
+        out.paste(strip, (0, y0))
+    return out
+
+
+def enhance_stack(stack, mode, brightness, contrast, sharpness, color):
+    """
+    Enhances a stack of same-sized images at once, like enhance() on each of them.
+
+    stack is a uint8 array (N, H, W) or (N, H, W, C) in one of FUSED_MODES. The
+    stages run over groups of images of about STRIP_PIXELS pixels together, so
+    small images share each NumPy call while the working buffers stay as small as
+    enhance()'s strips. Only the contrast mean, which depends on each image, is
+    computed per image. Returns a new uint8 array, identical to the fused engine's
+    output for each image.
+    """
+    if mode not in FUSED_MODES:
+        raise ValueError(f"enhance_stack does not handle mode {mode}")
+    if brightness == 1.0 and contrast == 1.0 and sharpness == 1.0 and color == 1.0:
+        return stack
+    images = stack if stack.ndim == 4 else stack[..., np.newaxis]
+    count, height, width = images.shape[:3]
+    colors = len(mode) - (1 if mode.endswith("A") else 0)
+    sharpen = sharpness != 1.0 and width > 2 and height > 2
+    saturate = color != 1.0 and mode.startswith("RGB")
+
+    levels = np.arange(256, dtype=np.float32)
+    if brightness != 1.0:
+        _blend(levels, 0.0, brightness)
+    brightness_lut = levels.astype(np.uint8)
+
+    out = np.empty_like(images)
+    group = max(1, STRIP_PIXELS // (width * height))
+    for n0 in range(0, count, group):
+        part = images[n0:n0 + group]
+        if brightness != 1.0:
+            bands = np.take(brightness_lut, part[..., :colors])
+        else:
+            # Copied when the contrast stage is going to write into it
+            bands = part[..., :colors].copy() if contrast != 1.0 else part[..., :colors]
+        if contrast != 1.0:
+            # The chain takes each image's mean grey level after the brightness stage
+            grey = _luminance(bands.astype(np.float32)) if colors == 3 else bands[..., 0]
+            means = np.floor(grey.sum(axis=(1, 2), dtype=np.float64) / (width * height) + 0.5)
+            for i, mean in enumerate(means):
+                lut = levels.copy()
+                _blend(lut, np.float32(mean), contrast)
+                np.take(lut.astype(np.uint8), part[i, ..., :colors], out=bands[i])
+        if sharpen or saturate:
+            buf = bands.astype(np.float32)
+            if sharpen:
+                _blend(buf, _smooth(buf), sharpness, truncate=saturate)
+            if saturate:
+                _blend(buf, _luminance(buf)[..., np.newaxis], color, truncate=False)
+            bands = buf
+        out[n0:n0 + group, ..., :colors] = bands
+        if colors < images.shape[-1]:
+            out[n0:n0 + group, ..., colors:] = part[..., colors:]
+    return out if stack.ndim == 4 else out[..., 0]
+
+
+def _tone_lut(img, brightness, contrast, memory_budget=None):
+    """
+    Builds the Image.point() table that applies the brightness and contrast stages.
+
+    Both stages are per-channel and pointwise, so the chain's two blends (including
+    their clipping and truncation) collapse into one table lookup per band. Alpha
+    bands map to themselves. Returns None when neither stage is active.
+    """
+    if brightness == 1.0 and contrast == 1.0:
+        return None
+    levels = np.arange(256, dtype=np.float32)
+    if brightness != 1.0:
+        _blend(levels, 0.0, brightness)
+    if contrast != 1.0:
+        _blend(levels, float(_contrast_mean(img, _band_table(img, levels), memory_budget)), contrast)
+    return _band_table(img, levels)
+
+
+def _band_table(img, levels):
+    """
+    Expands a 256-entry level table to every band of the image, leaving alpha alone.
+    """
+    table = np.tile(levels.astype(np.uint8), len(img.getbands()))
+    if img.mode.endswith("A"):
+        table[-256:] = np.arange(256)
+    return table.tolist()
+
+
+def _contrast_mean(img, table, memory_budget=None):
+    """
+    Mean grey level ImageEnhance.Contrast would use after the brightness stage.
+
+    table is the brightness point table; the grey histogram is accumulated strip
+    by strip so the full-size brightened image is never materialised.
+    """
+    width, height = img.size
+    rows = strip_rows(width, memory_budget)
+    histogram = np.zeros(256, dtype=np.float64)
+    for y0 in range(0, height, rows):
+        strip = img.crop((0, y0, width, min(height, y0 + rows))).point(table)
+        histogram += strip.convert("L").histogram()
+    return int(float(np.dot(histogram, np.arange(256))) / (width * height) + 0.5)
+
+
+def _blend(bands, degenerate, factor, truncate=True):
+    """
+    In-place equivalent of Image.blend(degenerate, bands, factor) for 8-bit data.
+
+    Image.blend truncates towards zero when writing 8-bit output; pass
+    truncate=False for the last stage, where the uint8 cast does the same.
+    """
+    bands -= degenerate
+    bands *= factor
+    bands += degenerate
+    np.clip(bands, 0, 255, out=bands)
+    if truncate:
+        np.floor(bands, out=bands)
+
+
+def _luminance(bands):
+    """
+    ITU-R 601-2 luma as computed by Image.convert("L"), including its rounding.
+    """
+    luma = bands[..., 0] * np.float32(19595.0)
+    luma += bands[..., 1] * 38470.0
+    luma += bands[..., 2] * 7471.0
+    luma += 0x8000
+    luma /= 65536.0
+    np.floor(luma, out=luma)
+    return luma
+
+
+def _smooth(bands):
+    """
+    ImageFilter.SMOOTH over a strip (H, W, C) that carries one halo row on each inner
+    edge, or over every image of a stack (N, H, W, C).
+
+    Like PIL, the outermost rows and columns are left unfiltered. For the image
+    border that is the PIL behaviour; for halo rows it does not matter because
+    they are dropped after the strip is processed.
+    """
+    smoothed = bands.copy()
+    # 3x3 box sum as a horizontal then a vertical pass, plus four more of the centre.
+    # Axes count from the end, so a stack of images (N, H, W, C) works the same way.
+    rows = bands[..., :-2, :] + bands[..., 1:-1, :]
+    rows += bands[..., 2:, :]
+    inner = smoothed[..., 1:-1, 1:-1, :]
+    inner *= 4.0
+    inner += rows[..., :-2, :, :]
+    inner += rows[..., 1:-1, :, :]
+    inner += rows[..., 2:, :, :]
+    inner /= 13.0
+    # A weighted mean of 8-bit values cannot leave [0, 255], so only rounding is needed
+    inner += 0.5
+    np.floor(inner, out=inner)
+    return smoothed
@@ -2,38 +2,134 @@
 import os
 import sys
 import argparse
-from PIL import Image, ImageEnhance
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
 from tqdm import tqdm
 
-def enhance_image(image_path, output_path, brightness, contrast, sharpness, color):
+import batch_ops
+import enhance_kernel
+import encoder_options
+import fast_load
+import image_daemon
+import image_scanner
+import instrumentation
+import io_pipeline
+import job_manifest
+import result_cache
+
+def load_image(image_path, max_pixels=None):
+    """
+    Opens and decodes an image for enhance_loaded(). max_pixels raises Pillow's
+    size limit for this image (see fast_load.open_image).
+    """
+    img = fast_load.open_image(image_path, max_pixels)
+    with instrumentation.stage("decode"):
+        img.load()
+    return img
+
+def enhance_loaded(img, brightness, contrast, sharpness, color, engine="fused", memory_budget=None):
+    """
+    Enhances a decoded image. With memory_budget (bytes) the image is enhanced in
+    place, strip by strip, so apart from the image itself no more than that is used.
+    """
+    with instrumentation.stage("enhance"):
+        return enhance_kernel.enhance(img, brightness, contrast, sharpness, color, engine=engine,
+                                      memory_budget=memory_budget, in_place=memory_budget is not None)
+
+def save_enhanced(img, output_path, encoder=None):
+    """
+    Saves an enhanced image and counts the bytes written.
+    """
+    with instrumentation.stage("encode"):
+        encoder_options.save_image(img, output_path, encoder)
+    instrumentation.count_written(output_path)
+
+def enhance_image(image_path, output_path, brightness, contrast, sharpness, color, engine="fused", memory_budget=None, encoder=None, max_pixels=None):
     """
-    Enhances a single image and saves it to the output path.
+    Enhances a single image and saves it to the output path, encoded with the
+    given encoder_options.EncoderOptions (Pillow's defaults when None).
+
+    With memory_budget (bytes) the image is enhanced in place, strip by strip, so
+    apart from the decoded image itself no more than that is used. max_pixels
+    allows images larger than Pillow's limit.
     """
     try:
-        with Image.open(image_path) as img:
-            # Enhance brightness
-            if brightness != 1.0:
-                enhancer = ImageEnhance.Brightness(img)
-                img = enhancer.enhance(brightness)
-
-            # Enhance contrast
-            if contrast != 1.0:
-                enhancer = ImageEnhance.Contrast(img)
-                img = enhancer.enhance(contrast)
-
-            # Enhance sharpness
-            if sharpness != 1.0:
-                enhancer = ImageEnhance.Sharpness(img)
-                img = enhancer.enhance(sharpness)
-
-            # Enhance color saturation
-            if color != 1.0:
-                enhancer = ImageEnhance.Color(img)
-                img = enhancer.enhance(color)
-
-            img.save(output_path)
+        with load_image(image_path, max_pixels) as img:
+            img = enhance_loaded(img, brightness, contrast, sharpness, color, engine, memory_budget)
+            save_enhanced(img, output_path, encoder)
+            return True
     except Exception as e:
         print(f"Error processing {image_path}: {e}")
+        instrumentation.mark_failed(e)
+        return False
+
+def enhance_batch(jobs, brightness, contrast, sharpness, color, engine="fused", encoder=None, max_pixels=None):
+    """
+    Enhances a list of (image_path, output_path) pairs and returns one True/False per pair.
+
+    Images of the same mode and size are stacked and enhanced together with
+    enhance_kernel.enhance_stack, so the NumPy work runs once per group rather than
+    once per image (see batch_ops for how groups are formed). The output is
+    identical to enhance_image(). All images of the list are held in memory at once.
+    """
+    results = [False] * len(jobs)
+    loaded = []
+    for i, (image_path, output_path) in enumerate(jobs):
+        instrumentation.count_read(image_path)
+        try:
+            loaded.append((i, load_image(image_path, max_pixels)))
+        except Exception as e:
+            print(f"Error processing {image_path}: {e}")
+            instrumentation.mark_failed(e)
+
+    try:
+        for group in batch_ops.group_by_shape(loaded, len(jobs)):
+            mode = group[0][1].mode
+            try:
+                if engine == "fused" and mode in enhance_kernel.FUSED_MODES:
+                    with instrumentation.stage("enhance"):
+                        stack = batch_ops.stack([img for _, img in group])
+                        images = batch_ops.unstack(enhance_kernel.enhance_stack(stack, mode, brightness, contrast, sharpness, color))
+                else:
+                    images = [enhance_loaded(img, brightness, contrast, sharpness, color, engine) for _, img in group]
+            except Exception as e:
+                for i, _ in group:
+                    print(f"Error processing {jobs[i][0]}: {e}")
+                instrumentation.mark_failed(e)
+                continue
+            for (i, _), img in zip(group, images):
+                try:
+                    save_enhanced(img, jobs[i][1], encoder)
+                    results[i] = True
+                except Exception as e:
+                    print(f"Error processing {jobs[i][0]}: {e}")
+                    instrumentation.mark_failed(e)
+                finally:
+                    img.close()
+    finally:
+        # Multi-frame files (GIF, TIFF) keep their file open until closed
+        for _, img in loaded:
+            img.close()
+    return results
+
+def output_path_for(output_folder, filename, encoder):
+    """
+    Returns the enhanced_<name> path a source image is written to, keeping any subfolder.
+    """
+    sub_folder, name = os.path.split(filename)
+    return encoder.output_path(os.path.join(output_folder, sub_folder, f"enhanced_{name}"))
+
+def cache_params(brightness, contrast, sharpness, color, engine, encoder):
+    """
+    Returns the settings that decide what gets written, for cache keys and job manifests.
+    """
+    params = {
+        "brightness": brightness, "contrast": contrast,
+        "sharpness": sharpness, "color": color, "engine": engine,
+    }
+    if not encoder.is_default():
+        params.update(encoder.cache_params())
+    return params
 
 def main():
     """
@@ -46,8 +142,25 @@ def main():
     parser.add_argument("--contrast", type=float, default=1.5, help="Contrast enhancement factor. 1.0 is original, >1.0 is more contrast.")
     parser.add_argument("--sharpness", type=float, default=2.0, help="Sharpness enhancement factor. 1.0 is original, >1.0 is sharper.")
     parser.add_argument("--color", type=float, default=1.5, help="Color saturation enhancement factor. 1.0 is original, >1.0 is more saturated.")
+    parser.add_argument("--engine", choices=("fused", "pil"), default="fused", help="Enhancement engine. 'fused' runs all four adjustments in one NumPy pass with lower memory use; 'pil' uses the chained ImageEnhance calls.")
+    parser.add_argument("--memory_mb", type=float, help="Working memory per worker in MB for the fused engine. Images are then enhanced in place in strips, so each worker needs about one decoded image plus this much. Use it for very large scans.")
+    parser.add_argument("--max_megapixels", type=float, help="Open images of up to this many megapixels. Pillow refuses images over about 178 megapixels to guard against decompression bombs; raise the limit for big scans from a source you trust.")
+    parser.add_argument("--batch", type=int, default=0, metavar="N", help="Enhance files in chunks of N, stacking images of the same size into one NumPy array so the enhancement runs once per stack. Speeds up folders of many small, equally sized images; each worker holds a whole chunk in memory.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes. Defaults to the number of CPUs; 1 processes images in this process.")
+    result_cache.add_cache_arguments(parser)
+    image_scanner.add_scan_arguments(parser)
+    instrumentation.add_instrumentation_arguments(parser)
+    encoder_options.add_encoder_arguments(parser)
+    io_pipeline.add_io_arguments(parser)
+    job_manifest.add_manifest_arguments(parser)
+    image_daemon.add_daemon_arguments(parser)
 
     args = parser.parse_args()
+    if args.batch > 1 and args.memory_mb:
+        parser.error("--batch cannot be combined with --memory_mb")
+    if args.daemon and (args.record or args.resume or args.manifest):
+        parser.error("--record, --resume and --manifest cannot be combined with --daemon")
+    instrumentation.enable_from_args(args)
 
     if not os.path.isdir(args.input_folder):
         print(f"Error: Input folder not found at {args.input_folder}")
@@ -56,20 +169,206 @@ def main():
     output_folder = args.output_folder or os.path.join(args.input_folder, 'enhanced_images')
     os.makedirs(output_folder, exist_ok=True)
 
-    image_files = [f for f in os.listdir(args.input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
+    max_pixels = int(args.max_megapixels * 1000000) if args.max_megapixels else None
 
-    if not image_files:
-        print(f"No images found in {args.input_folder}")
+    if args.daemon:
+        # The daemon's shared workers do the work; this process only shows the progress
+        options = {"brightness": args.brightness, "contrast": args.contrast,
+                   "sharpness": args.sharpness, "color": args.color, "engine": args.engine,
+                   "max_pixels": max_pixels}
+        spec = image_daemon.job_spec("enhance", args.input_folder, output_folder, options,
+                                     encoder_options.encoder_from_args(args), result_cache.cache_from_args(args),
+                                     args.recursive, args.include, args.exclude)
+        try:
+            failed = image_daemon.run_from_args(args, spec, "Enhancing images")
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if failed:
+            print(f"{len(failed)} images failed:")
+            for filename, error in sorted(failed):
+                print(f"  {filename}: {error}")
+        print(f"All images have been enhanced and saved to the '{output_folder}' folder.")
         return
 
-    print(f"Found {len(image_files)} images to enhance.")
+    # The folder is scanned lazily, so enhancement starts with the first file found
+    # With --output_folder set to the input folder, the enhanced_* files written meanwhile are left out
+    scan = image_scanner.scan_from_args(args, args.input_folder, ('.png', '.jpg', '.jpeg', '.bmp', '.gif'), skip_dirs=[output_folder],
+                                        skip_prefixes=image_scanner.own_output_prefixes(args.input_folder, output_folder, ("enhanced_",)))
+
+    workers = max(1, args.workers)
+    memory_budget = int(args.memory_mb * 1024 * 1024) if args.memory_mb else None
+    encoder = encoder_options.encoder_from_args(args)
+    cache = result_cache.cache_from_args(args)
+    params = cache_params(args.brightness, args.contrast, args.sharpness, args.color, args.engine, encoder)
+    manifest = job_manifest.manifest_from_args(args, output_folder, "enhance", params)
+    failed = []
+    keys = {}
+    lock = threading.Lock()
 
-    with tqdm(total=len(image_files), desc="Enhancing images") as pbar:
-        for filename in image_files:
+    def pending_files(pbar):
+        """
+        Yields (filename, image_path, output_path) for the files not served from the cache
+        or, when resuming, finished by an earlier run.
+        """
+        for filename in scan:
             image_path = os.path.join(args.input_folder, filename)
-            output_path = os.path.join(output_folder, f"enhanced_{filename}")
-            enhance_image(image_path, output_path, args.brightness, args.contrast, args.sharpness, args.color)
-            pbar.update(1)
+            output_path = output_path_for(output_folder, filename, encoder)
+            if manifest is not None:
+                if manifest.skip(filename, image_path, output_path):
+                    with lock:
+                        pbar.update(1)
+                    continue
+                manifest.start(filename, image_path)
+            if os.path.dirname(filename):
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            if cache is not None:
+                try:
+                    keys[filename] = cache.key(image_path, "enhance", {**params, "ext": os.path.splitext(filename)[1].lower()})
+                except OSError:
+                    pass
+                else:
+                    if cache.fetch(keys[filename], output_path):
+                        if manifest is not None:
+                            manifest.done(filename)
+                        with lock:
+                            pbar.update(1)
+                        continue
+            yield filename, image_path, output_path
+        image_scanner.track_total(pbar, scan)
+
+    def finished(filename, output_path, ok, error=None):
+        if not ok:
+            failed.append(filename)
+            if manifest is not None:
+                manifest.failed(filename, error)
+            return
+        if filename in keys:
+            cache.store(keys.pop(filename), output_path)
+        if manifest is not None:
+            manifest.done(filename)
+
+    # The bar shows a running count while the scan is going and a total once it is done
+    batched = args.batch > 1
+
+    def batch_name(chunk):
+        """
+        Names a chunk of files in traces: the first file, and how many more there are.
+        """
+        return chunk[0][0] if len(chunk) == 1 else f"{chunk[0][0]} (+{len(chunk) - 1} more)"
+
+    with tqdm(desc="Enhancing images", unit="img") as pbar:
+        if batched and workers == 1:
+            # Same-shaped files in each chunk are enhanced as one NumPy stack
+            for chunk in batch_ops.chunked(pending_files(pbar), args.batch):
+                with instrumentation.file(batch_name(chunk)):
+                    oks = enhance_batch([(image_path, output_path) for _, image_path, output_path in chunk],
+                                        args.brightness, args.contrast, args.sharpness, args.color, args.engine, encoder, max_pixels)
+                for (filename, _, output_path), ok in zip(chunk, oks):
+                    finished(filename, output_path, ok)
+                    pbar.update(1)
+        elif workers == 1:
+            # Decoding the next files and saving finished ones run on background
+            # threads, overlapping with the enhancement of the current file
+            def load(job):
+                filename, image_path, output_path = job
+                with instrumentation.file(filename, image_path):
+                    return load_image(image_path, max_pixels), instrumentation.handoff()
+
+            def save(source, img, output_path, trace):
+                try:
+                    with instrumentation.resume(trace):
+                        save_enhanced(img, output_path, encoder)
+                finally:
+                    # Multi-frame files (GIF, TIFF) keep their file open until closed
+                    img.close()
+                    source.close()
+
+            def saved(job, result, error):
+                filename, image_path, output_path = job
+                if error is not None:
+                    tqdm.write(f"Error processing {image_path}: {error}")
+                # Runs on the writer thread
+                with lock:
+                    finished(filename, output_path, error is None, error)
+                    pbar.update(1)
+
+            with io_pipeline.WriteBehind(args.io_depth, done=saved) as writer:
+                for job, loaded, error in io_pipeline.prefetch(pending_files(pbar), load, args.io_depth):
+                    filename, image_path, output_path = job
+                    if error is None:
+                        source, trace = loaded
+                        try:
+                            with instrumentation.resume(trace):
+                                img = enhance_loaded(source, args.brightness, args.contrast, args.sharpness, args.color, args.engine, memory_budget)
+                                writer.submit(job, save, source, img, output_path, instrumentation.handoff())
+                            continue
+                        except Exception as e:
+                            source.close()
+                            error = e
+                    tqdm.write(f"Error processing {image_path}: {error}")
+                    with lock:
+                        finished(filename, output_path, False, error)
+                        pbar.update(1)
+        else:
+            # Results come back in completion order, so the bar advances per finished file.
+            # With --batch each job is a chunk of files, enhanced as NumPy stacks.
+            with io_pipeline.ProcessPool(workers) as executor:
+                in_flight = {}
+                # Workers time their own stages and send the trace back with the result
+                traced = instrumentation.enabled()
+
+                def collect(done):
+                    for future in done:
+                        chunk = in_flight.pop(future)
+                        error = None
+                        try:
+                            oks = future.result()
+                            if traced:
+                                oks, trace = oks
+                                instrumentation.record(trace)
+                        except Exception as e:
+                            # A worker process died (e.g. killed by the OS); keep going with the rest
+                            tqdm.write(f"Error processing {', '.join(filename for filename, _, _ in chunk)}: {e}")
+                            oks, error = [False] * len(chunk), e
+                        if not batched:
+                            oks = [oks]
+                        for (filename, _, output_path), ok in zip(chunk, oks):
+                            finished(filename, output_path, ok, error)
+                            pbar.update(1)
+
+                for chunk in batch_ops.chunked(pending_files(pbar), args.batch if batched else 1):
+                    if batched:
+                        job = (enhance_batch, [(image_path, output_path) for _, image_path, output_path in chunk], args.brightness, args.contrast, args.sharpness, args.color, args.engine, encoder, max_pixels)
+                    else:
+                        filename, image_path, output_path = chunk[0]
+                        job = (enhance_image, image_path, output_path, args.brightness, args.contrast, args.sharpness, args.color, args.engine, memory_budget, encoder, max_pixels)
+                    if traced:
+                        job = (instrumentation.traced_call, batch_name(chunk), None if batched else chunk[0][1]) + job
+                    future = executor.submit(*job)
+                    in_flight[future] = chunk
+                    # Keep a bounded number of files queued so huge folders do not pile up futures
+                    if len(in_flight) >= 4 * workers:
+                        collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+                collect(list(in_flight))
+
+    instrumentation.finish()
+    if manifest is not None:
+        if manifest.resume:
+            print(manifest.resume_summary())
+        manifest.close()
+
+    if scan.count == 0:
+        print(f"No images found in {args.input_folder}")
+        return
+
+    if cache is not None:
+        print(f"Result cache: {cache.hits} reused, {cache.misses} processed.")
+
+    if failed:
+        print(f"{len(failed)} of {scan.count} images failed:")
+        for filename in sorted(failed):
+            print(f"  {filename}")
 
     print(f"All images have been enhanced and saved to the '{output_folder}' folder.")
 
@@ -2,38 +2,82 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import os
+import itertools
 import threading
-from PIL import Image, ImageEnhance
+from collections import OrderedDict
+from PIL import Image, ImageTk
 
-def enhance_image(image_path, output_path, brightness, contrast, sharpness, color):
+import encoder_options
+import enhance_kernel
+import fast_load
+import image_daemon
+import image_scanner
+import io_pipeline
+import result_cache
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# Each preview panel shows a proxy no larger than this
+PREVIEW_SIZE = (220, 165)
+# Proxies kept in memory; switching back to a recently viewed image costs no decoding
+PREVIEW_CACHE_SIZE = 32
+# Factor changes within this many milliseconds are rendered once
+PREVIEW_DELAY_MS = 50
+# Images offered in the preview list
+PREVIEW_LIST_LIMIT = 200
+
+class PreviewCache:
     """
-    Enhances a single image and saves it to the output path.
+    Least-recently-used cache of downscaled proxies of source images.
+
+    Proxies are decoded at reduced scale where the format allows it, so even large
+    photos load quickly, and are keyed by path and modification time.
     """
-    try:
-        with Image.open(image_path) as img:
-            if brightness != 1.0:
-                enhancer = ImageEnhance.Brightness(img)
-                img = enhancer.enhance(brightness)
-            if contrast != 1.0:
-                enhancer = ImageEnhance.Contrast(img)
-                img = enhancer.enhance(contrast)
-            if sharpness != 1.0:
-                enhancer = ImageEnhance.Sharpness(img)
-                img = enhancer.enhance(sharpness)
-            if color != 1.0:
-                enhancer = ImageEnhance.Color(img)
-                img = enhancer.enhance(color)
-            img.save(output_path)
-            return True
-    except Exception as e:
-        print(f"Error processing {image_path}: {e}")
-        return False
+
+    def __init__(self, size=PREVIEW_SIZE, capacity=PREVIEW_CACHE_SIZE):
+        self.size = size
+        self.capacity = capacity
+        self.proxies = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _key(self, path):
+        return path, os.path.getmtime(path)
+
+    def get(self, path):
+        """
+        Returns the cached proxy for path, or None if it has not been loaded.
+        """
+        try:
+            key = self._key(path)
+        except OSError:
+            return None
+        with self.lock:
+            proxy = self.proxies.get(key)
+            if proxy is not None:
+                self.proxies.move_to_end(key)
+            return proxy
+
+    def load(self, path):
+        """
+        Decodes a proxy of path, adds it to the cache and returns it.
+        """
+        key = self._key(path)
+        with Image.open(path) as img:
+            fast_load.draft_for_size(img, self.size, fast_load.SPEED)
+            img.load()
+            img.thumbnail(self.size, Image.Resampling.LANCZOS)
+            proxy = img
+        with self.lock:
+            self.proxies[key] = proxy
+            while len(self.proxies) > self.capacity:
+                self.proxies.popitem(last=False)
+        return proxy
 
 class EnhancerGUI:
     def __init__(self, master):
         self.master = master
         master.title("Image Enhancer")
-        master.geometry("500x400")
+        master.geometry("560x760")
 
         # --- Input Folder ---
         self.input_frame = tk.LabelFrame(master, text="Input Folder", padx=10, pady=10)
@@ -63,6 +107,42 @@ class EnhancerGUI:
             label.pack(side=tk.LEFT)
             entry = tk.Entry(row, textvariable=var, width=10)
             entry.pack(side=tk.LEFT, padx=5)
+            scale = ttk.Scale(row, variable=var, from_=0.0, to=3.0)
+            scale.pack(side=tk.LEFT, expand=True, fill="x", padx=5)
+            var.trace_add("write", self.schedule_preview)
+
+        # --- Preview ---
+        self.preview_frame = tk.LabelFrame(master, text="Preview", padx=10, pady=10)
+        self.preview_frame.pack(padx=10, pady=(0, 10), fill="x")
+
+        self.preview_var = tk.StringVar()
+        self.preview_choice = ttk.Combobox(self.preview_frame, textvariable=self.preview_var, state="readonly")
+        self.preview_choice.pack(fill="x")
+        self.preview_choice.bind("<<ComboboxSelected>>", self.schedule_preview)
+
+        panels = tk.Frame(self.preview_frame)
+        panels.pack(pady=(5, 0))
+        self.before_label = tk.Label(panels, text="Original", compound="top")
+        self.before_label.pack(side=tk.LEFT, padx=5)
+        self.after_label = tk.Label(panels, text="Enhanced", compound="top")
+        self.after_label.pack(side=tk.LEFT, padx=5)
+
+        self.previews = PreviewCache()
+        self.preview_images = None
+        self.preview_job = None
+        self.loading = set()
+        self.input_path.trace_add("write", self.schedule_preview_list)
+
+        # --- Output Encoding ---
+        self.output_frame = tk.LabelFrame(master, text="Output", padx=10, pady=10)
+        self.output_frame.pack(padx=10, pady=(0, 10), fill="x")
+
+        tk.Label(self.output_frame, text="Save as:").pack(side=tk.LEFT)
+        self.format_var = tk.StringVar(value="original")
+        ttk.Combobox(self.output_frame, textvariable=self.format_var, values=("original",) + tuple(sorted(encoder_options.FORMATS)), state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+        tk.Label(self.output_frame, text="Preset:").pack(side=tk.LEFT, padx=(10, 0))
+        self.preset_var = tk.StringVar(value="default")
+        ttk.Combobox(self.output_frame, textvariable=self.preset_var, values=tuple(encoder_options.PRESETS), state="readonly", width=8).pack(side=tk.LEFT, padx=5)
 
         # --- Action Buttons ---
         self.action_frame = tk.Frame(master, padx=10, pady=10)
@@ -71,6 +151,14 @@ class EnhancerGUI:
         self.start_button = tk.Button(self.action_frame, text="Start Enhancement", command=self.start_enhancement, bg="#4CAF50", fg="white")
         self.start_button.pack(side=tk.RIGHT)
 
+        self.use_cache = tk.BooleanVar(value=False)
+        self.cache_check = tk.Checkbutton(self.action_frame, text="Reuse results for unchanged images", variable=self.use_cache)
+        self.cache_check.pack(side=tk.LEFT)
+
+        self.use_daemon = tk.BooleanVar(value=False)
+        self.daemon_check = tk.Checkbutton(self.action_frame, text="Run on the image daemon", variable=self.use_daemon)
+        self.daemon_check.pack(side=tk.LEFT)
+
         # --- Progress Bar & Status ---
         self.progress_frame = tk.LabelFrame(master, text="Progress", padx=10, pady=10)
         self.progress_frame.pack(padx=10, pady=10, fill="x")
@@ -87,6 +175,74 @@ class EnhancerGUI:
             self.input_path.set(folder_selected)
             self.status_label.config(text=f"Folder selected: {os.path.basename(folder_selected)}")
 
+    def schedule_preview_list(self, *_):
+        # Typing a path changes it on every key; list the folder once typing pauses
+        if getattr(self, "preview_list_job", None) is not None:
+            self.master.after_cancel(self.preview_list_job)
+        self.preview_list_job = self.master.after(300, self.refresh_preview_list)
+
+    def refresh_preview_list(self):
+        self.preview_list_job = None
+        folder = self.input_path.get()
+        names = []
+        if os.path.isdir(folder):
+            scan = image_scanner.Scan(folder, IMAGE_EXTENSIONS, skip_dirs=[os.path.join(folder, "enhanced_images_gui")])
+            names = sorted(itertools.islice(scan, PREVIEW_LIST_LIMIT))
+        self.preview_choice.config(values=names)
+        self.preview_var.set(names[0] if names else "")
+        self.schedule_preview()
+
+    def schedule_preview(self, *_):
+        """
+        Renders the preview once the factors stop changing for PREVIEW_DELAY_MS.
+        """
+        if self.preview_job is not None:
+            self.master.after_cancel(self.preview_job)
+        self.preview_job = self.master.after(PREVIEW_DELAY_MS, self.render_preview)
+
+    def render_preview(self):
+        self.preview_job = None
+        name = self.preview_var.get()
+        if not name:
+            self.before_label.config(image="")
+            self.after_label.config(image="")
+            self.preview_images = None
+            return
+        path = os.path.join(self.input_path.get(), name)
+        proxy = self.previews.get(path)
+        if proxy is None:
+            # Decoding the proxy may take a moment; render again once it is cached
+            if path not in self.loading:
+                self.loading.add(path)
+                threading.Thread(target=self.load_preview, args=(path,), daemon=True).start()
+            return
+        try:
+            factors = [var.get() for var in self.factors.values()]
+        except (tk.TclError, ValueError):
+            # A factor is being typed and is not a number yet
+            return
+        try:
+            enhanced = enhance_kernel.enhance(proxy, *factors)
+        except Exception as e:
+            self.status_label.config(text=f"Preview failed: {e}")
+            return
+        # Tk only keeps a reference to the images while these do
+        self.preview_images = (ImageTk.PhotoImage(proxy), ImageTk.PhotoImage(enhanced))
+        self.before_label.config(image=self.preview_images[0])
+        self.after_label.config(image=self.preview_images[1])
+
+    def load_preview(self, path):
+        try:
+            self.previews.load(path)
+        except Exception as e:
+            # e is cleared when the except block ends, before Tk runs the callback
+            message = f"Preview failed: {e}"
+            self.master.after(0, lambda: self.status_label.config(text=message))
+        else:
+            self.master.after(0, self.schedule_preview)
+        finally:
+            self.loading.discard(path)
+
     def start_enhancement(self):
         input_folder = self.input_path.get()
         if not input_folder or not os.path.isdir(input_folder):
@@ -104,28 +260,128 @@ class EnhancerGUI:
         output_folder = os.path.join(input_folder, "enhanced_images_gui")
         os.makedirs(output_folder, exist_ok=True)
 
-        image_files = [f for f in os.listdir(input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
-        total_files = len(image_files)
+        # The folder is read while images are enhanced; the total is known once the scan finishes
+        scan = image_scanner.Scan(input_folder, IMAGE_EXTENSIONS, skip_dirs=[output_folder])
+
+        self.master.after(0, lambda: self.status_label.config(text="Enhancing images..."))
+        self.master.after(0, lambda: self.progress.config(mode="indeterminate"))
+
+        brightness = self.factors["Brightness"].get()
+        contrast = self.factors["Contrast"].get()
+        sharpness = self.factors["Sharpness"].get()
+        color = self.factors["Color"].get()
+        cache = result_cache.open_cache() if self.use_cache.get() else None
+        output_format = self.format_var.get()
+        encoder = encoder_options.EncoderOptions(format=None if output_format == "original" else output_format,
+                                                 preset=self.preset_var.get())
+
+        def jobs():
+            """
+            Yields (filename, image_path, output_path, cache key) for the files not served from the cache.
+            """
+            for filename in scan:
+                image_path = os.path.join(input_folder, filename)
+                output_path = encoder.output_path(os.path.join(output_folder, f"enhanced_{filename}"))
+
+                key = None
+                if cache is not None:
+                    params = {
+                        "brightness": brightness, "contrast": contrast,
+                        "sharpness": sharpness, "color": color, "engine": "fused",
+                        "ext": os.path.splitext(filename)[1].lower(),
+                    }
+                    if not encoder.is_default():
+                        params.update(encoder.cache_params())
+                    try:
+                        key = cache.key(image_path, "enhance", params)
+                    except OSError:
+                        pass
 
-        if total_files == 0:
+                if key is not None and cache.fetch(key, output_path):
+                    report()
+                    continue
+                yield filename, image_path, output_path, key
+
+        done = 0
+        lock = threading.Lock()
+
+        def report(total=None):
+            nonlocal done
+            with lock:
+                done += 1
+                n = done
+            # The bar is indeterminate until the scan (or the daemon) knows the total
+            total = total if total is not None else scan.total
+            if total:
+                self.master.after(0, lambda: self.status_label.config(text=f"Enhanced {n} of {total} images..."))
+                self.master.after(0, lambda: self.progress.config(mode="determinate", value=min(100, n / total * 100)))
+            else:
+                self.master.after(0, lambda: self.status_label.config(text=f"Enhanced {n} images..."))
+                self.master.after(0, lambda: self.progress.step(5))
+
+        def load(job):
+            img = Image.open(job[1])
+            img.load()
+            return img
+
+        def save(source, img, output_path, key):
+            try:
+                encoder_options.save_image(img, output_path, encoder)
+                if key is not None:
+                    cache.store(key, output_path)
+            finally:
+                # Multi-frame files (GIF, TIFF) keep their file open until closed
+                img.close()
+                source.close()
+
+        def saved(job, result, error):
+            if error is not None:
+                print(f"Error processing {job[1]}: {error}")
+            report()
+
+        def processed(done_count, total, filename, error):
+            if error:
+                print(f"Error processing {filename}: {error}")
+            report(total)
+
+        if self.use_daemon.get():
+            # The shared daemon does the work; the window only follows its progress
+            options = {"brightness": brightness, "contrast": contrast, "sharpness": sharpness, "color": color}
+            spec = image_daemon.job_spec("enhance", input_folder, output_folder, options, encoder, cache)
+            try:
+                image_daemon.submit(spec, processed)
+            except RuntimeError as e:
+                message = str(e)
+                self.master.after(0, lambda: self.progress.config(mode="determinate", value=0))
+                self.master.after(0, lambda: self.status_label.config(text="The image daemon is not available."))
+                self.master.after(0, lambda: messagebox.showerror("Error", message))
+                self.master.after(0, lambda: self.start_button.config(state=tk.NORMAL))
+                return
+            found = done
+        else:
+            # The next images are decoded and finished ones saved in the background while one is enhanced
+            with io_pipeline.WriteBehind(done=saved) as writer:
+                for job, img, error in io_pipeline.prefetch(jobs(), load):
+                    filename, image_path, output_path, key = job
+                    if error is None:
+                        try:
+                            enhanced = enhance_kernel.enhance(img, brightness, contrast, sharpness, color)
+                        except Exception as e:
+                            img.close()
+                            error = e
+                        else:
+                            writer.submit(job, save, img, enhanced, output_path, key)
+                            continue
+                    print(f"Error processing {image_path}: {error}")
+                    report()
+            found = scan.count
+
+        self.master.after(0, lambda: self.progress.config(mode="determinate", value=0))
+        if found == 0:
             self.master.after(0, lambda: self.status_label.config(text="No images found in the selected folder."))
             self.master.after(0, lambda: self.start_button.config(state=tk.NORMAL))
             return
-
-        self.master.after(0, lambda: self.status_label.config(text=f"Enhancing {total_files} images..."))
-
-        for i, filename in enumerate(image_files):
-            image_path = os.path.join(input_folder, filename)
-            output_path = os.path.join(output_folder, f"enhanced_{filename}")
-            
-            success = enhance_image(image_path, output_path, 
-                                    self.factors["Brightness"].get(),
-                                    self.factors["Contrast"].get(),
-                                    self.factors["Sharpness"].get(),
-                                    self.factors["Color"].get())
-            
-            progress_value = int(((i + 1) / total_files) * 100)
-            self.master.after(0, lambda p=progress_value: self.progress.config(value=p))
+        self.master.after(0, lambda: self.progress.config(value=100))
 
         self.master.after(0, lambda: self.status_label.config(text=f"Enhancement complete! Images saved in '{os.path.basename(output_folder)}'."))
         self.master.after(0, lambda: messagebox.showinfo("Success", f"Enhancement complete!\n\nSaved to: {output_folder}"))
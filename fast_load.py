@@ -0,0 +1,114 @@
+import threading
+from PIL import Image
+
+QUALITY = "quality"
+SPEED = "speed"
+LOAD_MODES = (QUALITY, SPEED)
+
+# In quality mode the decoder is asked for at least this multiple of the target
+# size, so the final Lanczos resample still has real detail to average over
+QUALITY_OVERSAMPLE = 2
+
+def draft_for_size(img, size, prefer=QUALITY):
+    """
+    Lets the JPEG decoder produce a reduced-scale image when size is much smaller.
+
+    libjpeg can scale by 1/2, 1/4 or 1/8 while decoding (DCT scaling), which skips
+    most of the decoding work. Must be called on a freshly opened image, before
+    any pixel access. Other formats are left alone. Returns the scale factor that
+    was applied (1 when the image is decoded at full resolution).
+    """
+    if img.format != "JPEG" or size[0] <= 0 or size[1] <= 0:
+        return 1
+    factor = QUALITY_OVERSAMPLE if prefer == QUALITY else 1
+    requested = (size[0] * factor, size[1] * factor)
+    if requested[0] * 2 > img.size[0] or requested[1] * 2 > img.size[1]:
+        return 1
+    original_width = img.size[0]
+    img.draft(None, requested)
+    return original_width // img.size[0]
+
+# In speed mode the image is first shrunk by whole factors with a cheap box reduce,
+# until it is at most this many times the target size (Pillow's reducing_gap)
+REDUCING_GAP = 2.0
+
+def resize(img, size, prefer=QUALITY):
+    """
+    Resizes to size with a high-quality filter, or a fast one when prefer is SPEED.
+    """
+    if prefer == SPEED:
+        return img.resize(size, Image.Resampling.BILINEAR, reducing_gap=REDUCING_GAP)
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+# Bytes per pixel of Pillow's intermediate resampling buffers (every mode is stored in 32-bit cells)
+RESAMPLE_BYTES_PER_PIXEL = 4
+
+def resize_tiled(img, size, prefer=QUALITY, memory_budget=None):
+    """
+    Resizes in horizontal bands of the output so the resampling buffers stay within memory_budget bytes.
+
+    Each band is resized from its exact (fractional) source box, and Pillow takes the
+    filter support from the pixels around the box, so the bands line up without
+    seams and the result matches resize() to within one level (bands start at
+    fractional source rows, which round slightly differently). In speed mode the
+    whole image first gets the same box reduce that resize() applies. Falls back to
+    resize() when the whole image fits the budget.
+    """
+    if memory_budget is None:
+        return resize(img, size, prefer)
+    width, height = size
+    src_width, src_height = img.size
+    if prefer == SPEED:
+        # As Image.resize() does with reducing_gap: the source box keeps its
+        # fractional size in the reduced image's coordinates
+        factor_x = int(src_width / width / REDUCING_GAP) or 1
+        factor_y = int(src_height / height / REDUCING_GAP) or 1
+        if factor_x > 1 or factor_y > 1:
+            img = img.reduce((factor_x, factor_y))
+            src_width, src_height = src_width / factor_x, src_height / factor_y
+    scale = src_height / height
+    # One output row needs about scale source rows of horizontally resampled data,
+    # plus its own row in the output band
+    row_bytes = width * RESAMPLE_BYTES_PER_PIXEL * (scale + 1)
+    rows = max(1, int(memory_budget // row_bytes))
+    if rows >= height:
+        return resize(img, size, prefer)
+    resample = Image.Resampling.BILINEAR if prefer == SPEED else Image.Resampling.LANCZOS
+    out = Image.new(img.mode, size)
+    for y0 in range(0, height, rows):
+        y1 = min(height, y0 + rows)
+        box = (0, y0 * scale, src_width, y1 * scale)
+        out.paste(img.resize((width, y1 - y0), resample, box=box), (0, y0))
+    return out
+
+# Held while Image.MAX_IMAGE_PIXELS is changed for one open_image() call
+_pixel_limit_lock = threading.Lock()
+
+def open_image(path, max_pixels=None):
+    """
+    Opens an image like Image.open(). With max_pixels, images up to that many pixels
+    are accepted instead of stopping at Pillow's decompression bomb limit (about 178
+    megapixels). The limit is only raised for the duration of this call.
+    """
+    if max_pixels is None:
+        return Image.open(path)
+    with _pixel_limit_lock:
+        default = Image.MAX_IMAGE_PIXELS
+        # Pillow only warns up to twice its limit; anything over max_pixels is refused below
+        Image.MAX_IMAGE_PIXELS = max_pixels
+        try:
+            img = Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = default
+    if img.width * img.height > max_pixels:
+        img.close()
+        raise Image.DecompressionBombError(f"Image size ({img.width * img.height} pixels) exceeds the limit of {max_pixels} pixels")
+    return img
+
+def open_resized(path, size, prefer=QUALITY):
+    """
+    Opens an image, decoding it at reduced scale where possible, and resizes it to size.
+    """
+    with Image.open(path) as img:
+        draft_for_size(img, size, prefer)
+        return resize(img, size, prefer)
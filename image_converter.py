@@ -2,13 +2,170 @@
 
 
 import os
+import sys
+import argparse
+from concurrent.futures import FIRST_COMPLETED, wait
 from PIL import Image
+from tqdm import tqdm
+
+import encoder_options
+import fast_load
+import image_scanner
+import io_pipeline
 
 old_path = os.path.expanduser('~') + '/images/'
 new_path = '/opt/icons/'
-		
-for image in os.listdir(old_path):
-	if '.' not in image[0]:
-		img = Image.open(old_path + image)
-		img.rotate(-90).resize((128, 128)).convert("RGB").save(new_path + image.split('.')[0], 'jpeg')
-		img.close()
\ No newline at end of file
+
+def parse_size(text):
+	"""
+	Parses an icon size given as "128" (square) or "128x96".
+	"""
+	try:
+		width, _, height = text.lower().partition('x')
+		size = (int(width), int(height or width))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"'{text}' is not a size like 128 or 128x96")
+	if min(size) <= 0:
+		raise argparse.ArgumentTypeError(f"'{text}' is not a positive size")
+	return size
+
+def icon_paths(output_folder, image, sizes, encoder):
+	"""
+	Returns (size, output path) for every icon of one source image.
+
+	With one size the icon is written to the output folder under the image's name,
+	without an extension unless --format is given. With several sizes each one goes
+	to its own subfolder, such as 16x16/ and 32x32/.
+	"""
+	name = os.path.splitext(image)[0]
+	if len(sizes) == 1:
+		return [(sizes[0], encoder.output_path(os.path.join(output_folder, name)))]
+	return [(size, encoder.output_path(os.path.join(output_folder, f"{size[0]}x{size[1]}", name))) for size in sizes]
+
+def up_to_date(source, output):
+	"""
+	Returns True if output exists and is at least as new as source.
+	"""
+	try:
+		return os.path.getmtime(output) >= os.path.getmtime(source)
+	except OSError:
+		return False
+
+def convert_image(source, icons, rotate, prefer, encoder):
+	"""
+	Decodes source once and writes every (size, path) icon in icons from that decode.
+
+	The JPEG decoder is asked for the largest size, so smaller icons are resampled
+	from the same reduced-scale image instead of decoding the file again.
+	"""
+	with Image.open(source) as img:
+		largest = max((size for size, _ in icons), key=lambda size: size[0] * size[1])
+		# Decoding at reduced scale is fine: the icons are far smaller than any camera image
+		fast_load.draft_for_size(img, largest, prefer)
+		img.load()
+		if rotate:
+			img = img.rotate(rotate)
+		for size, path in icons:
+			os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+			icon = fast_load.resize(img, size, prefer)
+			if encoder.format is None:
+				# The original icon format: JPEG, whatever the file is called
+				encoder.save(icon.convert("RGB"), path, 'JPEG')
+			else:
+				encoder.save(icon, path)
+	return len(icons)
+
+def main():
+	parser = argparse.ArgumentParser(description="Convert a folder of images to icons, by default to 128x128 JPEGs rotated by -90 degrees.")
+	parser.add_argument("--input", default=old_path, help="Folder with the source images. Defaults to ~/images/.")
+	parser.add_argument("--output", default=new_path, help="Folder for the icons. Defaults to /opt/icons/.")
+	parser.add_argument("--sizes", type=parse_size, nargs='+', default=[(128, 128)], metavar="SIZE", help="Icon sizes, such as 128 or 128x96. Several sizes (e.g. 16 32 64 128 256) are all made from one decode of each image, each in its own subfolder.")
+	parser.add_argument("--rotate", type=float, default=-90, help="Degrees to rotate counter-clockwise (negative turns clockwise). 0 leaves the images upright.")
+	parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes. Defaults to the number of CPUs; 1 converts in this process.")
+	parser.add_argument("--force", action="store_true", help="Rewrite every icon, even those newer than their source image.")
+	parser.add_argument("--prefer", choices=fast_load.LOAD_MODES, default=fast_load.QUALITY, help="'quality' decodes large JPEGs at no less than twice the icon size and uses a Lanczos filter; 'speed' decodes at the smallest usable scale and uses a bilinear filter.")
+	image_scanner.add_scan_arguments(parser)
+	encoder_options.add_encoder_arguments(parser)
+	args = parser.parse_args()
+	encoder = encoder_options.encoder_from_args(args)
+
+	if not os.path.isdir(args.input):
+		print(f"Error: Input folder not found at {args.input}")
+		sys.exit(1)
+
+	# Hidden files are skipped; the folder is read as it is processed, unless the icons
+	# (named like their sources) are written into it, in which case it is listed first
+	scan = image_scanner.scan_from_args(args, args.input, None, skip_dirs=[args.output], skip_hidden=True,
+		read_first=image_scanner.same_folder(args.input, args.output))
+	workers = max(1, args.workers)
+	converted = 0
+	written = 0
+	skipped = 0
+	failed = []
+
+	def pending(pbar):
+		"""
+		Yields (image, source path, icons to write), leaving out images whose icons are all up to date.
+		"""
+		nonlocal skipped
+		for image in scan:
+			source = os.path.join(args.input, image)
+			icons = icon_paths(args.output, image, args.sizes, encoder)
+			if not args.force:
+				icons = [(size, path) for size, path in icons if not up_to_date(source, path)]
+			if not icons:
+				skipped += 1
+				pbar.update(1)
+				continue
+			yield image, source, icons
+		image_scanner.track_total(pbar, scan)
+
+	def finished(image, count, error):
+		nonlocal converted, written
+		if error is not None:
+			tqdm.write(f"Error processing {image}: {error}")
+			failed.append(image)
+		else:
+			converted += 1
+			written += count
+
+	with tqdm(desc="Converting images", unit="img") as pbar:
+		if workers == 1:
+			for image, source, icons in pending(pbar):
+				try:
+					finished(image, convert_image(source, icons, args.rotate, args.prefer, encoder), None)
+				except Exception as e:
+					finished(image, 0, e)
+				pbar.update(1)
+		else:
+			with io_pipeline.ProcessPool(workers) as executor:
+				in_flight = {}
+
+				def collect(done):
+					for future in done:
+						image = in_flight.pop(future)
+						try:
+							finished(image, future.result(), None)
+						except Exception as e:
+							finished(image, 0, e)
+						pbar.update(1)
+
+				for image, source, icons in pending(pbar):
+					in_flight[executor.submit(convert_image, source, icons, args.rotate, args.prefer, encoder)] = image
+					# Keep a bounded number of files queued so huge folders do not pile up futures
+					if len(in_flight) >= 4 * workers:
+						collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+				collect(list(in_flight))
+
+	if scan.count == 0:
+		print(f"No images found in {args.input}")
+		return
+	print(f"Converted {converted} images ({written} icons), {skipped} already up to date.")
+	if failed:
+		print(f"{len(failed)} images failed:")
+		for image in sorted(failed):
+			print(f"  {image}")
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
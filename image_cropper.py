@@ -1,41 +1,119 @@
 import os
+import argparse
 from PIL import Image
 
-# Prompt for the folder containing images
-folder = input('Enter the path to the folder containing images: ')
-
-# Prompt for crop margins
-try:
-    left = int(input('Enter left margin (pixels): '))
-    top = int(input('Enter top margin (pixels): '))
-    right = int(input('Enter right margin (pixels): '))
-    bottom = int(input('Enter bottom margin (pixels): '))
-except ValueError:
-    print('Invalid input. Using default margins (0, 0, 0, 0).')
-    left = top = right = bottom = 0
-
-# Output folder
-output_folder = os.path.join(folder, 'cropped')
-os.makedirs(output_folder, exist_ok=True)
+import encoder_options
+import image_scanner
+import instrumentation
+import lossless_jpeg
+import result_cache
 
 # Supported image extensions
 img_exts = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
 
-for filename in os.listdir(folder):
-    if filename.lower().endswith(img_exts):
+def crop_margins(img, left, top, right, bottom):
+    """
+    Returns the image with the given margins cropped off.
+    """
+    width, height = img.size
+    crop_box = (
+        left,
+        top,
+        width - right,
+        height - bottom
+    )
+    return img.crop(crop_box)
+
+def crop_image(img_path, out_path, left, top, right, bottom, lossless=True, encoder=None):
+    """
+    Crops the given margins off one image and saves it to out_path.
+
+    With lossless=True, JPEGs whose left/top margins fall on block boundaries are
+    cropped without re-encoding (see lossless_jpeg.crop), unless encoder (an
+    encoder_options.EncoderOptions) asks for specific settings. Returns the path taken.
+    """
+    if encoder is not None and not encoder.is_default():
+        lossless = False
+    if lossless and out_path.lower().endswith(('.jpg', '.jpeg')) and lossless_jpeg.is_jpeg(img_path):
+        with instrumentation.stage("jpegtran_crop"):
+            done = lossless_jpeg.crop(img_path, out_path, left, top, right, bottom)
+        if done:
+            instrumentation.count_written(out_path)
+            return lossless_jpeg.LOSSLESS
+    with Image.open(img_path) as img:
+        with instrumentation.stage("decode"):
+            img.load()
+        with instrumentation.stage("crop"):
+            cropped_img = crop_margins(img, left, top, right, bottom)
+        with instrumentation.stage("encode"):
+            encoder_options.save_image(cropped_img, out_path, encoder)
+    instrumentation.count_written(out_path)
+    return lossless_jpeg.FULL
+
+def prompt_margins():
+    """
+    Asks for the crop margins, falling back to no cropping on invalid input.
+    """
+    try:
+        left = int(input('Enter left margin (pixels): '))
+        top = int(input('Enter top margin (pixels): '))
+        right = int(input('Enter right margin (pixels): '))
+        bottom = int(input('Enter bottom margin (pixels): '))
+    except ValueError:
+        print('Invalid input. Using default margins (0, 0, 0, 0).')
+        left = top = right = bottom = 0
+    return left, top, right, bottom
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop margins off every image in a folder. Anything not given on the command line is asked for interactively.")
+    parser.add_argument("folder", nargs="?", help="Path to the folder containing images.")
+    parser.add_argument("--margins", type=int, nargs=4, metavar=("LEFT", "TOP", "RIGHT", "BOTTOM"), help="Crop margins in pixels.")
+    parser.add_argument("--no_lossless", action="store_true", help="Always decode and re-encode, even for JPEGs that could be cropped losslessly.")
+    result_cache.add_cache_arguments(parser)
+    image_scanner.add_scan_arguments(parser)
+    instrumentation.add_instrumentation_arguments(parser)
+    encoder_options.add_encoder_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    # Prompt for the folder containing images
+    folder = args.folder or input('Enter the path to the folder containing images: ')
+
+    # Prompt for crop margins
+    left, top, right, bottom = args.margins or prompt_margins()
+
+    # Output folder
+    output_folder = os.path.join(folder, 'cropped')
+    os.makedirs(output_folder, exist_ok=True)
+
+    cache = result_cache.cache_from_args(args)
+    lossless = not args.no_lossless
+    encoder = encoder_options.encoder_from_args(args)
+    params = {"margins": [left, top, right, bottom], "lossless": lossless}
+    if not encoder.is_default():
+        params.update(encoder.cache_params())
+    if lossless and lossless_jpeg.find_jpegtran() is None:
+        print("jpegtran not found; JPEGs will be re-encoded. Install libjpeg-turbo for lossless crops.")
+
+    for filename in image_scanner.scan_from_args(args, folder, img_exts, skip_dirs=[output_folder]):
         img_path = os.path.join(folder, filename)
+        out_path = encoder.output_path(os.path.join(output_folder, filename))
         try:
-            with Image.open(img_path) as img:
-                width, height = img.size
-                crop_box = (
-                    left,
-                    top,
-                    width - right,
-                    height - bottom
-                )
-                cropped_img = img.crop(crop_box)
-                out_path = os.path.join(output_folder, filename)
-                cropped_img.save(out_path)
-                print(f'Cropped: {filename} -> {out_path}')
+            # Recursive scans keep the subfolder layout in the output folder
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            key = cache.key(img_path, "crop", dict(params, ext=os.path.splitext(filename)[1].lower())) if cache is not None else None
+            if key is not None and cache.fetch(key, out_path):
+                print(f'Cached: {filename} -> {out_path}')
+                continue
+            with instrumentation.file(filename, img_path):
+                path = crop_image(img_path, out_path, left, top, right, bottom, lossless, encoder)
+            if key is not None:
+                cache.store(key, out_path)
+            print(f'Cropped ({path}): {filename} -> {out_path}')
         except Exception as e:
             print(f'Failed to crop {filename}: {e}')
+
+    instrumentation.finish()
+
+if __name__ == "__main__":
+    main()
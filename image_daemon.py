@@ -0,0 +1,731 @@
+import os
+import sys
+import json
+import queue
+import socket
+import stat
+import struct
+import argparse
+import tempfile
+import threading
+from tqdm import tqdm
+
+import encoder_options
+import fast_load
+import image_scanner
+import result_cache
+
+try:
+    import pwd
+except ImportError:
+    pwd = None
+
+DEFAULT_SOCKET = os.environ.get("IMAGES_DAEMON_SOCKET") or os.path.join(tempfile.gettempdir(), "images_daemon.sock")
+
+# Owner and group may connect. Where the daemon cannot tell who is connecting (no
+# SO_PEERCRED), only its own user may, since it then cannot check the client's paths
+SOCKET_MODE = 0o660
+PRIVATE_SOCKET_MODE = 0o600
+
+# How many file names each job's scan thread may find ahead of the workers
+SCAN_AHEAD = 32
+
+# Job priorities are clamped to -MAX_PRIORITY..MAX_PRIORITY
+MAX_PRIORITY = 10
+
+# How often a waiting client checks whether it was cancelled (seconds)
+POLL_INTERVAL = 0.2
+
+TOOLS = ("enhance", "remove_background", "resize")
+# Name prefixes of each tool's outputs, skipped when a job writes into its input folder
+OUTPUT_PREFIXES = {"enhance": ("enhanced_",), "remove_background": ("clean_", "mask_")}
+
+def send_message(conn, message):
+    """
+    Sends one JSON message as a line.
+    """
+    conn.sendall((json.dumps(message) + "\n").encode())
+
+class MessageReader:
+    """
+    Reads JSON messages, one per line, from a socket. A partly received line is
+    kept when a read times out.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = b""
+
+    def read(self):
+        """
+        Returns the next message, or None once the other side has closed the connection.
+        """
+        while True:
+            while b"\n" not in self.buffer:
+                data = self.conn.recv(65536)
+                if not data:
+                    return None
+                self.buffer += data
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            if line.strip():
+                return json.loads(line)
+
+# --- Tools ---
+# The tool modules are imported when a job for them arrives, so a client using
+# these helpers does not load rembg or Tk just to send a job.
+
+def open_job_cache(spec):
+    """
+    Opens the result cache a job asked for, or returns None.
+    """
+    return result_cache.open_cache(spec["cache"]) if spec.get("cache") else None
+
+def enhance_runner(spec):
+    """
+    Returns (extensions, run, output_path) for an enhance job, where run(name)
+    processes one file and output_path(name) is where it writes the result.
+    """
+    import enhancer
+
+    options = spec["options"]
+    factors = (options["brightness"], options["contrast"], options["sharpness"], options["color"])
+    engine = options.get("engine", "fused")
+    encoder = encoder_options.encoder_from_params(spec.get("encoder"))
+    cache = open_job_cache(spec)
+    params = enhancer.cache_params(*factors, engine, encoder)
+
+    def output_path_for(name):
+        return enhancer.output_path_for(spec["output_folder"], name, encoder)
+
+    def run(name):
+        image_path = os.path.join(spec["input_folder"], name)
+        output_path = output_path_for(name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        key = None
+        if cache is not None:
+            key = cache.key(image_path, "enhance", {**params, "ext": os.path.splitext(name)[1].lower()})
+            if cache.fetch(key, output_path):
+                return
+        with enhancer.load_image(image_path, options.get("max_pixels")) as img:
+            img = enhancer.enhance_loaded(img, *factors, engine)
+            enhancer.save_enhanced(img, output_path, encoder)
+        if key is not None:
+            cache.store(key, output_path)
+
+    return ('.png', '.jpg', '.jpeg', '.bmp', '.gif'), run, output_path_for
+
+def remove_background_runner(spec, intra_op_threads=0):
+    """
+    Returns (extensions, run, output_path) for a background removal job. The model's session is
+    shared with every other job using it and stays loaded between jobs.
+    """
+    import background_remover
+
+    options = spec["options"]
+    model = options.get("model", "isnet-general-use")
+    alpha_matting = options.get("alpha_matting", True)
+    foreground_threshold = options.get("foreground_threshold", 240)
+    adaptive = options.get("adaptive", False)
+    unknown_threshold = options.get("unknown_threshold", background_remover.UNKNOWN_THRESHOLD)
+    encoder = encoder_options.encoder_from_params(spec.get("encoder"))
+    cache = open_job_cache(spec)
+    params = background_remover.cutout_params(model, alpha_matting, foreground_threshold, adaptive, unknown_threshold, encoder)
+    session = background_remover.get_session(model, intra_op_threads)
+
+    def output_path_for(name):
+        return background_remover.output_path_for(spec["output_folder"], name, encoder)
+
+    def run(name):
+        input_p = os.path.join(spec["input_folder"], name)
+        output_p = output_path_for(name)
+        os.makedirs(os.path.dirname(output_p), exist_ok=True)
+        key = None
+        if cache is not None:
+            key = cache.key(input_p, "remove_background", params)
+            if cache.fetch(key, output_p):
+                return
+        background_remover.remove_background(input_p, output_p, session, alpha_matting, foreground_threshold,
+                                             adaptive, unknown_threshold, encoder)
+        if key is not None:
+            cache.store(key, output_p)
+
+    return background_remover.IMAGE_EXTENSIONS, run, output_path_for
+
+def resize_runner(spec):
+    """
+    Returns (extensions, run, output_path) for a resize job.
+    """
+    import image_resizer
+
+    options = spec["options"]
+    size = (options["width"], options["height"])
+    prefer = options.get("prefer", fast_load.QUALITY)
+    memory_budget = options.get("memory_budget")
+    max_pixels = options.get("max_pixels")
+    encoder = encoder_options.encoder_from_params(spec.get("encoder"))
+    cache = open_job_cache(spec)
+
+    def output_path_for(name):
+        return encoder.output_path(os.path.join(spec["output_folder"], name))
+
+    def run(name):
+        output_path = output_path_for(name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        image_resizer.resize_image(os.path.join(spec["input_folder"], name), output_path, size, prefer, cache, memory_budget, encoder, max_pixels)
+
+    return image_resizer.IMAGE_EXTENSIONS, run, output_path_for
+
+# --- Access checks ---
+
+class Peer:
+    """
+    The user on the other end of a connection, from the socket's peer credentials.
+
+    Jobs run with the daemon's permissions, so the paths in a job are checked
+    against this user's before it is accepted.
+    """
+
+    def __init__(self, uid, gid):
+        self.uid = uid
+        self.name = str(uid)
+        self.groups = {gid}
+        if pwd is not None:
+            try:
+                self.name = pwd.getpwuid(uid).pw_name
+                self.groups.update(os.getgrouplist(self.name, gid))
+            except (KeyError, OSError):
+                pass
+
+    def may_access(self, path, write=False):
+        """
+        Returns True if the permission bits let this user read path, and with
+        write=True also write it; every folder above it must be searchable. A path
+        that does not exist yet may be written if the user can create files in the
+        nearest folder that does. ACLs are not consulted.
+        """
+        if self.uid == 0:
+            return True
+        path = os.path.realpath(path)
+        need = stat.S_IROTH | (stat.S_IWOTH if write else 0)
+        if not os.path.exists(path):
+            if not write:
+                return False
+            while not os.path.exists(path):
+                path = os.path.dirname(path)
+            need = stat.S_IWOTH
+        try:
+            st = os.stat(path)
+            if stat.S_ISDIR(st.st_mode):
+                need |= stat.S_IXOTH
+            if not self._allows(st, need):
+                return False
+            parent = os.path.dirname(path)
+            while parent != path:
+                path, parent = parent, os.path.dirname(parent)
+                if not self._allows(os.stat(path), stat.S_IXOTH):
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def _allows(self, st, bits):
+        # The owner bits apply to the owner, the group bits to group members, the rest to everybody else
+        shift = 6 if st.st_uid == self.uid else 3 if st.st_gid in self.groups else 0
+        return (st.st_mode >> shift) & bits == bits
+
+def authorize(spec, peer):
+    """
+    Raises PermissionError unless peer may read the job's input folder and write its
+    output folder and cache folder. Only the daemon's own user may raise a job's
+    priority above the default, so nobody else can jump the queue.
+    """
+    if int(spec.get("priority", 0)) > 0 and peer.uid not in (0, os.getuid()):
+        raise PermissionError(f"{peer.name} may not raise a job's priority")
+    paths = [(spec["input_folder"], False), (spec["output_folder"], True)]
+    if spec.get("cache"):
+        paths.append((spec["cache"], True))
+    for path, write in paths:
+        if not peer.may_access(path, write):
+            raise PermissionError(f"{peer.name} may not {'write to' if write else 'read'} {path}")
+
+# --- Scheduling ---
+
+class Job:
+    """
+    One submitted folder. Its files are found lazily and handed out one at a time.
+    """
+
+    def __init__(self, job_id, spec, owner, extensions, run, send):
+        self.id = job_id
+        self.tool = spec["tool"]
+        self.priority = max(-MAX_PRIORITY, min(MAX_PRIORITY, int(spec.get("priority", 0))))
+        self.owner = owner
+        self.run = run
+        self.send = send
+        self.scan = image_scanner.Scan(spec["input_folder"], extensions, recursive=spec.get("recursive", False),
+                                       include=spec.get("include"), exclude=spec.get("exclude"),
+                                       skip_dirs=[spec["output_folder"]],
+                                       skip_prefixes=image_scanner.own_output_prefixes(
+                                           spec["input_folder"], spec["output_folder"], OUTPUT_PREFIXES.get(self.tool, ())),
+                                       # Resized files keep their names, so only a full listing keeps them out
+                                       read_first=self.tool not in OUTPUT_PREFIXES and image_scanner.same_folder(
+                                           spec["input_folder"], spec["output_folder"]))
+        self.pending = queue.Queue(SCAN_AHEAD)
+        self.next_name = None
+        self.scanned = False
+        self.cancelled = False
+        self.running = 0
+        self.done = 0
+        self.failed = []
+        self.last_served = 0
+        self.finished = threading.Event()
+
+    def has_work(self):
+        # Only takes what the scan thread already found, so it never waits on the disk
+        if self.cancelled:
+            return False
+        if self.next_name is None:
+            try:
+                self.next_name = self.pending.get_nowait()
+            except queue.Empty:
+                pass
+        return self.next_name is not None
+
+    def take(self):
+        name, self.next_name = self.next_name, None
+        self.running += 1
+        return name
+
+    def complete(self):
+        exhausted = self.scanned and self.next_name is None and self.pending.empty()
+        return (exhausted or self.cancelled) and self.running == 0
+
+class Scheduler:
+    """
+    Hands out files of all queued jobs to the worker threads.
+
+    Jobs with the highest priority go first. Between jobs of equal priority, the
+    owner (the user who submitted them) served least recently goes next, so
+    everybody's jobs advance at the same rate however many files or jobs each one
+    queued. An owner's own jobs take turns the same way.
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self.served = {}
+        self.turn = 0
+        self.stopping = False
+        self.cond = threading.Condition()
+
+    def add(self, job):
+        with self.cond:
+            self.jobs.append(job)
+        threading.Thread(target=self.feed, args=(job,), daemon=True).start()
+
+    def feed(self, job):
+        """
+        Reads a job's folder on its own thread, so a slow file system only holds up
+        that job rather than every worker waiting for the lock.
+        """
+        try:
+            for name in job.scan:
+                while not job.cancelled:
+                    try:
+                        job.pending.put(name, timeout=POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        pass
+                if job.cancelled:
+                    break
+                with self.cond:
+                    self.cond.notify_all()
+        except OSError as e:
+            # The folder went away or cannot be read; report it as a failure and stop
+            with self.cond:
+                job.failed.append((job.scan.folder, str(e)))
+        finally:
+            with self.cond:
+                job.scanned = True
+                self.cond.notify_all()
+
+    def cancel(self, job):
+        with self.cond:
+            job.cancelled = True
+            self._finish_if_complete(job)
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+
+    def next_task(self):
+        """
+        Blocks until a file is ready; returns (job, name), or None once stopped.
+        """
+        with self.cond:
+            while True:
+                if self.stopping:
+                    return None
+                runnable = [job for job in self.jobs if job.has_work()]
+                for job in [job for job in self.jobs if job.complete()]:
+                    self._finish_if_complete(job)
+                if runnable:
+                    break
+                self.cond.wait()
+            top = max(job.priority for job in runnable)
+            job = min((job for job in runnable if job.priority == top),
+                      key=lambda job: (self.served.get(job.owner, 0), job.last_served, job.id))
+            self.turn += 1
+            self.served[job.owner] = job.last_served = self.turn
+            return job, job.take()
+
+    def task_done(self, job, name, error):
+        with self.cond:
+            job.running -= 1
+            job.done += 1
+            if error is not None:
+                job.failed.append((name, str(error)))
+            event = {"event": "progress", "job": job.id, "done": job.done, "total": job.scan.total,
+                     "name": name, "error": None if error is None else str(error)}
+            job.send(event)
+            self._finish_if_complete(job)
+            self.cond.notify_all()
+
+    def _finish_if_complete(self, job):
+        # Called with the lock held
+        if job.complete() and job in self.jobs:
+            self.jobs.remove(job)
+            job.send({"event": "finished", "job": job.id, "done": job.done, "failed": job.failed,
+                      "cancelled": job.cancelled})
+            job.finished.set()
+
+    def status(self):
+        with self.cond:
+            return [{"job": job.id, "tool": job.tool, "owner": job.owner, "priority": job.priority,
+                     "done": job.done, "running": job.running, "total": job.scan.total} for job in self.jobs]
+
+class Daemon:
+    """
+    Serves image jobs from several clients over a Unix socket.
+
+    Each connection sends one JSON request line: {"op": "submit", "job": {...}}
+    (see job_spec) or {"op": "status"}. A submitted job is answered with a
+    "queued" event, a "progress" event per file and a "finished" event. A client
+    that disconnects early cancels its job; files already being processed finish.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, workers=None):
+        self.socket_path = socket_path
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        # Inference threads per worker, so the workers together use the cores once
+        self.intra_op_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.scheduler = Scheduler()
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def serve(self):
+        """
+        Listens until interrupted.
+        """
+        if os.path.exists(self.socket_path):
+            if daemon_running(self.socket_path):
+                raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+            # Left behind by a daemon that did not shut down cleanly
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, SOCKET_MODE if hasattr(socket, "SO_PEERCRED") else PRIVATE_SOCKET_MODE)
+        server.listen()
+        for _ in range(self.workers):
+            threading.Thread(target=self.work, daemon=True).start()
+        print(f"Image daemon listening on {self.socket_path} with {self.workers} workers.", flush=True)
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self.scheduler.stop()
+            server.close()
+            os.remove(self.socket_path)
+
+    def work(self):
+        while True:
+            task = self.scheduler.next_task()
+            if task is None:
+                return
+            job, name = task
+            try:
+                job.run(name)
+            except Exception as e:
+                self.scheduler.task_done(job, name, e)
+            else:
+                self.scheduler.task_done(job, name, None)
+
+    def peer(self, conn):
+        """
+        Returns the Peer on the other end of conn, or None where the platform cannot tell.
+        """
+        try:
+            _, uid, gid = struct.unpack("3i", conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+        except (AttributeError, OSError):
+            return None
+        return Peer(uid, gid)
+
+    def checked(self, run, output_path_for, input_folder, peer):
+        """
+        Wraps a job's run function so it refuses files the submitting user may not
+        read, or whose output they may not write, such as those in a subfolder closed
+        to them or behind a symlink.
+        """
+        def run_checked(name):
+            path = os.path.join(input_folder, name)
+            if not peer.may_access(path):
+                raise PermissionError(f"{peer.name} may not read {path}")
+            output_path = output_path_for(name)
+            if not peer.may_access(output_path, write=True):
+                raise PermissionError(f"{peer.name} may not write to {output_path}")
+            run(name)
+        return run_checked
+
+    def runner(self, spec):
+        if spec.get("tool") == "enhance":
+            return enhance_runner(spec)
+        if spec.get("tool") == "remove_background":
+            return remove_background_runner(spec, self.intra_op_threads)
+        if spec.get("tool") == "resize":
+            return resize_runner(spec)
+        raise ValueError(f"unknown tool '{spec.get('tool')}' (choose from {', '.join(TOOLS)})")
+
+    def handle(self, conn):
+        # Job events are queued and sent by their own thread, so a slow client never
+        # holds up the workers, and they still arrive in the order they happened
+        outbox = queue.Queue()
+
+        def send_events():
+            while True:
+                message = outbox.get()
+                if message is None:
+                    return
+                try:
+                    send_message(conn, message)
+                except OSError:
+                    return
+
+        job = None
+        sender = None
+        try:
+            reader = MessageReader(conn)
+            request = reader.read()
+            if request is None:
+                return
+            if request.get("op") == "status":
+                send_message(conn, {"event": "status", "jobs": self.scheduler.status()})
+                return
+            if request.get("op") != "submit":
+                send_message(conn, {"event": "error", "message": f"unknown request '{request.get('op')}'"})
+                return
+            spec = request["job"]
+            peer = self.peer(conn)
+            try:
+                if not os.path.isdir(spec["input_folder"]):
+                    raise ValueError(f"input folder not found at {spec['input_folder']}")
+                if peer is not None:
+                    authorize(spec, peer)
+                os.makedirs(spec["output_folder"], exist_ok=True)
+                extensions, run, output_path_for = self.runner(spec)
+                if peer is not None:
+                    run = self.checked(run, output_path_for, spec["input_folder"], peer)
+            except Exception as e:
+                send_message(conn, {"event": "error", "message": str(e)})
+                return
+            with self.lock:
+                job_id, self.next_id = self.next_id, self.next_id + 1
+            sender = threading.Thread(target=send_events, daemon=True)
+            sender.start()
+            # Fair queuing is per user; without peer credentials every connection counts as its own client
+            owner = peer.name if peer is not None else f"client-{id(conn)}"
+            job = Job(job_id, spec, owner, extensions, run, outbox.put)
+            outbox.put({"event": "queued", "job": job.id})
+            print(f"Job {job.id}: {job.tool} of {spec['input_folder']} for {job.owner}, priority {job.priority}", flush=True)
+            self.scheduler.add(job)
+            # The client sends nothing more; the connection closing early means it gave up
+            while reader.read() is not None:
+                pass
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            if job is not None:
+                if not job.finished.is_set():
+                    self.scheduler.cancel(job)
+                    job.finished.wait()
+                print(f"Job {job.id} {'cancelled' if job.cancelled else 'finished'}: "
+                      f"{job.done} files, {len(job.failed)} failed", flush=True)
+            if sender is not None:
+                outbox.put(None)
+                sender.join()
+            conn.close()
+
+# --- Client ---
+
+def daemon_running(socket_path=DEFAULT_SOCKET):
+    """
+    Returns True if a daemon accepts connections on socket_path.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+def _connect(socket_path):
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("The image daemon needs Unix sockets, which this system does not have")
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except OSError as e:
+        conn.close()
+        raise RuntimeError(f"No image daemon at {socket_path} ({e}). Start one with: python image_daemon.py serve")
+    return conn
+
+def job_spec(tool, input_folder, output_folder, options, encoder=None, cache=None, recursive=False,
+             include=None, exclude=None, priority=0):
+    """
+    Describes a job for submit(). options are the tool's settings (see the *_runner
+    functions), encoder an encoder_options.EncoderOptions and cache a
+    result_cache.ResultCache whose folder the daemon should use, or None.
+    """
+    return {
+        "tool": tool, "input_folder": os.path.abspath(input_folder), "output_folder": os.path.abspath(output_folder),
+        "options": options, "encoder": None if encoder is None else encoder.cache_params(),
+        "cache": None if cache is None else cache.root,
+        "recursive": recursive, "include": include, "exclude": exclude, "priority": priority,
+    }
+
+def submit(spec, progress=None, socket_path=DEFAULT_SOCKET, cancel=None):
+    """
+    Sends a job to the daemon and waits for it to finish.
+
+    progress, if given, is called as progress(done, total, name, error) after each
+    file, like remove_backgrounds()' callback; total is None until the daemon has
+    read the whole folder. Setting cancel, a threading.Event, withdraws the job.
+    Returns a list of (name, error) pairs for the files that failed.
+    """
+    conn = _connect(socket_path)
+    try:
+        send_message(conn, {"op": "submit", "job": spec})
+        conn.settimeout(POLL_INTERVAL)
+        reader = MessageReader(conn)
+        while True:
+            if cancel is not None and cancel.is_set():
+                # Closing the connection withdraws the job
+                return []
+            try:
+                message = reader.read()
+            except socket.timeout:
+                continue
+            if message is None:
+                raise RuntimeError("The image daemon closed the connection before the job finished")
+            event = message.get("event")
+            if event == "error":
+                raise RuntimeError(message["message"])
+            if event == "progress" and progress is not None:
+                progress(message["done"], message["total"], message["name"], message["error"])
+            elif event == "finished":
+                return [tuple(failure) for failure in message["failed"]]
+    finally:
+        conn.close()
+
+def status(socket_path=DEFAULT_SOCKET):
+    """
+    Returns the daemon's queued and running jobs.
+    """
+    conn = _connect(socket_path)
+    try:
+        send_message(conn, {"op": "status"})
+        message = MessageReader(conn).read()
+        return message["jobs"] if message is not None else []
+    finally:
+        conn.close()
+
+class JobProgress:
+    """
+    Follows a submitted job the way image_scanner.Scan follows a local scan: count
+    is the number of files reported so far and total becomes known once the
+    daemon has read the whole folder.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = None
+
+    def update(self, done, total):
+        self.count = done
+        self.total = total
+
+def add_daemon_arguments(parser):
+    """
+    Adds the --daemon, --daemon_socket and --priority options shared by the command-line tools.
+    """
+    parser.add_argument("--daemon", action="store_true", help="Send the job to the shared image daemon (see image_daemon.py) instead of processing it in this process.")
+    parser.add_argument("--daemon_socket", default=DEFAULT_SOCKET, help=f"Socket of the image daemon. Defaults to {DEFAULT_SOCKET} or $IMAGES_DAEMON_SOCKET.")
+    parser.add_argument("--priority", type=int, default=0, help=f"With --daemon, the job's priority from -{MAX_PRIORITY} to {MAX_PRIORITY}: jobs with a higher one run first. Only the daemon's own user may go above 0.")
+
+def run_from_args(args, spec, desc):
+    """
+    Submits a job selected by add_daemon_arguments() options with a progress bar.
+    Returns the failed (name, error) pairs.
+    """
+    spec = dict(spec, priority=args.priority)
+    with tqdm(desc=desc, unit="img") as pbar:
+        def report(done, total, name, error):
+            if error:
+                tqdm.write(f"Error processing {name}: {error}")
+            if total is not None and pbar.total != total:
+                pbar.total = total
+            pbar.update(1)
+
+        return submit(spec, report, args.daemon_socket)
+
+def main():
+    """
+    Runs the image daemon, or shows what it is working on.
+    """
+    parser = argparse.ArgumentParser(description="Shared worker daemon for the image tools.")
+    parser.add_argument("command", choices=("serve", "status"), help="'serve' runs the daemon, 'status' lists its jobs.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket to listen on or connect to. Defaults to {DEFAULT_SOCKET} or $IMAGES_DAEMON_SOCKET.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of files processed at the same time, across all jobs.")
+    parser.add_argument("--preload", nargs="+", default=[], metavar="MODEL", help="Background removal models to load at start-up, so the first job does not wait for them.")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "status":
+            jobs = status(args.socket)
+            if not jobs:
+                print("No jobs.")
+            for job in jobs:
+                total = job["total"] if job["total"] is not None else "?"
+                print(f"  job {job['job']}: {job['tool']} for {job['owner']}, priority {job['priority']}, "
+                      f"{job['done']}/{total} done, {job['running']} running")
+            return
+
+        daemon = Daemon(args.socket, args.workers)
+        if args.preload:
+            import background_remover
+            for model in args.preload:
+                if model not in background_remover.MODELS:
+                    parser.error(f"unknown model '{model}' (choose from {', '.join(background_remover.MODELS)})")
+                print(f"Loading model {model}...")
+                background_remover.get_session(model, daemon.intra_op_threads)
+        daemon.serve()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,56 @@
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+
+import encoder_options
+import fast_load
+import image_daemon
+import image_scanner
+import result_cache
+
+# Same formats the other tools accept
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# How often the window checks the worker queue for progress (milliseconds)
+POLL_INTERVAL = 100
+
+def resize_image(file_path, output_path, size, prefer=fast_load.QUALITY, cache=None, memory_budget=None, encoder=None, max_pixels=None):
+    """
+    Resizes one image to size and saves it to output_path, reusing a cached result if possible.
+    encoder, an encoder_options.EncoderOptions, sets the quality and compression.
+    With memory_budget (bytes) the resampling is done in bands that fit the budget
+    (see fast_load.resize_tiled). max_pixels allows images larger than Pillow's
+    limit (see fast_load.open_image). Returns True when the result came from the cache.
+    """
+    params = {"width": size[0], "height": size[1], "prefer": prefer,
+              "ext": os.path.splitext(output_path)[1].lower()}
+    if memory_budget is not None:
+        # Banded output can differ from a single resize by a rounding step
+        params["tiled"] = True
+    if encoder is not None and not encoder.is_default():
+        params.update(encoder.cache_params())
+    key = cache.key(file_path, "resize", params) if cache is not None else None
+    if key is not None and cache.fetch(key, output_path):
+        return True
+    with fast_load.open_image(file_path, max_pixels) as img:
+        fast_load.draft_for_size(img, size, prefer)
+        if memory_budget is None:
+            resized_img = fast_load.resize(img, size, prefer)
+        else:
+            resized_img = fast_load.resize_tiled(img, size, prefer, memory_budget)
+        encoder_options.save_image(resized_img, output_path, encoder)
+    if key is not None:
+        cache.store(key, output_path)
+    return False
 
 class ImageResizerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Image Resizer")
-        self.root.geometry("400x300")
+        self.root.geometry("420x440")
         
         # Create and set up the main frame
         main_frame = ttk.Frame(root, padding="10")
@@ -42,8 +85,63 @@ class ImageResizerApp:
         status_label = ttk.Label(main_frame, textvariable=self.status_var)
         status_label.grid(row=4, column=0, columnspan=3, pady=5)
         
-        # Resize button
-        ttk.Button(main_frame, text="Resize Images", command=self.resize_images).grid(row=5, column=0, columnspan=3, pady=10)
+        # Result cache
+        self.use_cache = tk.BooleanVar(value=False)
+        ttk.Checkbutton(main_frame, text="Reuse results for unchanged images", variable=self.use_cache).grid(row=5, column=0, columnspan=2, sticky=tk.W)
+        self.use_daemon = tk.BooleanVar(value=False)
+        ttk.Checkbutton(main_frame, text="Run on the image daemon", variable=self.use_daemon).grid(row=5, column=2, sticky=tk.W)
+
+        # Quality vs speed: how much JPEG decoding may be skipped and which filter is used
+        ttk.Label(main_frame, text="Prefer:").grid(row=6, column=0, sticky=tk.W, pady=5)
+        self.load_mode = tk.StringVar(value=fast_load.QUALITY)
+        ttk.Combobox(main_frame, textvariable=self.load_mode, values=fast_load.LOAD_MODES, state="readonly", width=10).grid(row=6, column=1, sticky=tk.W, padx=5, pady=5)
+
+        self.recursive = tk.BooleanVar(value=False)
+        ttk.Checkbutton(main_frame, text="Include subfolders", variable=self.recursive).grid(row=6, column=2, sticky=tk.W)
+
+        # Worker threads
+        ttk.Label(main_frame, text="Workers:").grid(row=7, column=0, sticky=tk.W, pady=5)
+        cpus = os.cpu_count() or 1
+        self.workers_var = tk.IntVar(value=min(4, cpus))
+        ttk.Spinbox(main_frame, from_=1, to=cpus * 2, textvariable=self.workers_var, width=5).grid(row=7, column=1, sticky=tk.W, padx=5, pady=5)
+
+        # Memory limit for very large images; empty means no limit
+        ttk.Label(main_frame, text="Memory limit (MB):").grid(row=8, column=0, sticky=tk.W, pady=5)
+        self.memory_var = tk.StringVar()
+        ttk.Entry(main_frame, textvariable=self.memory_var, width=10).grid(row=8, column=1, sticky=tk.W, padx=5, pady=5)
+        # Pillow refuses images over about 178 megapixels unless a higher limit is entered here
+        pixels_frame = ttk.Frame(main_frame)
+        pixels_frame.grid(row=8, column=2, sticky=tk.W)
+        ttk.Label(pixels_frame, text="Max megapixels:").pack(side=tk.LEFT)
+        self.megapixels_var = tk.StringVar()
+        ttk.Entry(pixels_frame, textvariable=self.megapixels_var, width=6).pack(side=tk.LEFT, padx=5)
+
+        # Output format and speed-versus-size preset
+        ttk.Label(main_frame, text="Save as:").grid(row=9, column=0, sticky=tk.W, pady=5)
+        output_frame = ttk.Frame(main_frame)
+        output_frame.grid(row=9, column=1, columnspan=2, sticky=tk.W, padx=5)
+        self.format_var = tk.StringVar(value="original")
+        ttk.Combobox(output_frame, textvariable=self.format_var, values=("original",) + tuple(sorted(encoder_options.FORMATS)), state="readonly", width=8).pack(side=tk.LEFT)
+        ttk.Label(output_frame, text="Preset:").pack(side=tk.LEFT, padx=(10, 5))
+        self.preset_var = tk.StringVar(value="default")
+        ttk.Combobox(output_frame, textvariable=self.preset_var, values=tuple(encoder_options.PRESETS), state="readonly", width=8).pack(side=tk.LEFT)
+
+        # Resize and Cancel buttons
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=10, column=0, columnspan=3, pady=10)
+        self.resize_button = ttk.Button(button_frame, text="Resize Images", command=self.resize_images)
+        self.resize_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        self.cancel_event = threading.Event()
+        self.results = queue.Queue()
+        # Closing the window stops queued work instead of waiting for the whole folder
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
+    def close(self):
+        self.cancel_event.set()
+        self.root.destroy()
 
     def browse_folder(self):
         folder_selected = filedialog.askdirectory()
@@ -72,35 +170,181 @@ class ImageResizerApp:
         output_folder = os.path.join(folder_path, "resized")
         os.makedirs(output_folder, exist_ok=True)
 
-        # Get list of PNG files
-        png_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.png')]
-        total_files = len(png_files)
+        memory_budget = None
+        if self.memory_var.get().strip():
+            try:
+                memory_budget = int(float(self.memory_var.get()) * 1024 * 1024)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter a number of MB for the memory limit, or leave it empty")
+                return
 
-        if total_files == 0:
-            messagebox.showinfo("Info", "No PNG files found in the selected folder")
+        max_pixels = None
+        if self.megapixels_var.get().strip():
+            try:
+                max_pixels = int(float(self.megapixels_var.get()) * 1000000)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter a number of megapixels, or leave it empty for Pillow's limit")
+                return
+
+        cache = result_cache.open_cache() if self.use_cache.get() else None
+        prefer = self.load_mode.get()
+        output_format = self.format_var.get()
+        encoder = encoder_options.EncoderOptions(format=None if output_format == "original" else output_format,
+                                                 preset=self.preset_var.get())
+        try:
+            workers = max(1, int(self.workers_var.get()))
+        except (ValueError, tk.TclError):
+            workers = 1
+
+        self.cancel_event = threading.Event()
+        self.results = queue.Queue()
+        # The folder is read by a feeder thread while images are resized, so the
+        # total is only known once the scan has finished
+        self.scan = image_scanner.Scan(folder_path, IMAGE_EXTENSIONS, recursive=self.recursive.get(),
+                                       skip_dirs=[output_folder])
+        self.submitted = 0
+        self.feeding = True
+        self.finished = 0
+        self.cancelled = 0
+        self.failed = []
+        self.resize_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.progress_var.set(0)
+        self.status_var.set("Scanning folder...")
+
+        if self.use_daemon.get():
+            # The shared daemon reads the folder and resizes; its progress arrives on the same queue
+            self.scan = image_daemon.JobProgress()
+            spec = image_daemon.job_spec("resize", folder_path, output_folder, {"width": new_width, "height": new_height, "prefer": prefer, "memory_budget": memory_budget, "max_pixels": max_pixels},
+                                         encoder, cache, self.recursive.get())
+            threading.Thread(target=self.feed_daemon, daemon=True, args=(spec,)).start()
+        else:
+            # Work runs on a pool of threads; the window only reads results from the
+            # queue in poll_results(), so it stays responsive
+            threading.Thread(target=self.feed_workers, daemon=True,
+                             args=(folder_path, output_folder, (new_width, new_height), prefer, cache, workers, memory_budget, encoder, max_pixels)).start()
+        self.root.after(POLL_INTERVAL, self.poll_results)
+
+    def feed_workers(self, folder_path, output_folder, size, prefer, cache, workers, memory_budget=None, encoder=None, max_pixels=None):
+        """
+        Runs on its own thread; submits images to the pool as the scan finds them.
+        """
+        # A few images per worker are queued at a time, so huge folders are never listed up front
+        slots = threading.BoundedSemaphore(4 * workers)
+        cancel_event = self.cancel_event
+        results = self.results
+
+        def release(_future):
+            slots.release()
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for filename in self.scan:
+                while not slots.acquire(timeout=POLL_INTERVAL / 1000):
+                    if cancel_event.is_set():
+                        break
+                if cancel_event.is_set():
+                    break
+                file_path = os.path.join(folder_path, filename)
+                output_path = os.path.join(output_folder, filename)
+                if encoder is not None:
+                    output_path = encoder.output_path(output_path)
+                future = executor.submit(self.resize_worker, filename, file_path, output_path,
+                                         size, prefer, cache, cancel_event, results, memory_budget, encoder, max_pixels)
+                future.add_done_callback(release)
+                self.submitted += 1
+        finally:
+            executor.shutdown(wait=False)
+            self.feeding = False
+
+    def feed_daemon(self, spec):
+        """
+        Runs on its own thread; sends the job to the image daemon and reports each
+        file to the results queue as the workers do. Cancelling withdraws the job.
+        """
+        def progress(done, total, filename, error):
+            self.scan.update(done, total)
+            self.submitted += 1
+            self.results.put((filename, error, False))
+
+        try:
+            image_daemon.submit(spec, progress, cancel=self.cancel_event)
+        except RuntimeError as e:
+            self.submitted += 1
+            self.results.put((spec["input_folder"], str(e), False))
+        finally:
+            self.feeding = False
+
+    @staticmethod
+    def resize_worker(filename, file_path, output_path, size, prefer, cache, cancel_event, results, memory_budget=None, encoder=None, max_pixels=None):
+        """
+        Runs on a worker thread; reports (filename, error) to the results queue.
+        """
+        if cancel_event.is_set():
+            results.put((filename, None, True))
             return
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            resize_image(file_path, output_path, size, prefer, cache, memory_budget, encoder, max_pixels)
+            results.put((filename, None, False))
+        except Exception as e:
+            results.put((filename, str(e), False))
 
-        # Process each file
-        for i, filename in enumerate(png_files):
-            file_path = os.path.join(folder_path, filename)
+    def poll_results(self):
+        while True:
             try:
-                with Image.open(file_path) as img:
-                    resized_img = img.resize((new_width, new_height))
-                    output_path = os.path.join(output_folder, filename)
-                    resized_img.save(output_path)
-                    
-                    # Update progress
-                    progress = (i + 1) / total_files * 100
-                    self.progress_var.set(progress)
-                    self.status_var.set(f"Processing: {i+1}/{total_files}")
-                    self.root.update()
-
-            except Exception as e:
-                messagebox.showerror("Error", f"Error processing {filename}: {str(e)}")
-                return
+                filename, error, cancelled = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.finished += 1
+            if error:
+                self.failed.append(f"{filename}: {error}")
+            if cancelled:
+                self.cancelled += 1
+
+        total = self.scan.total
+        if total:
+            self.progress_var.set(self.finished / total * 100)
+        if not self.cancel_event.is_set():
+            if total is None:
+                self.status_var.set(f"Processing: {self.finished}/{self.scan.count} found so far")
+            else:
+                self.status_var.set(f"Processing: {self.finished}/{total}")
+
+        # submitted is read after feeding so a just-finished feeder is not missed
+        if self.feeding or self.finished < self.submitted:
+            self.root.after(POLL_INTERVAL, self.poll_results)
+        elif self.submitted == 0 and not self.cancel_event.is_set():
+            self.resize_button.config(state=tk.NORMAL)
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_var.set("")
+            messagebox.showinfo("Info", "No image files found in the selected folder")
+        else:
+            self.finish()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_var.set("Cancelling...")
+
+    def finish(self):
+        self.resize_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        done = self.finished - self.cancelled - len(self.failed)
+
+        if self.cancel_event.is_set():
+            self.status_var.set(f"Cancelled: {done} of {self.scan.count} found resized")
+        elif self.failed:
+            self.status_var.set(f"Completed with {len(self.failed)} error(s)")
+        else:
+            self.status_var.set("Completed!")
 
-        self.status_var.set("Completed!")
-        messagebox.showinfo("Success", "All images have been resized successfully!")
+        if self.failed:
+            shown = "\n".join(self.failed[:20])
+            more = f"\n... and {len(self.failed) - 20} more" if len(self.failed) > 20 else ""
+            messagebox.showwarning("Finished with errors", f"{done} images resized, {len(self.failed)} skipped:\n\n{shown}{more}")
+        elif not self.cancel_event.is_set():
+            messagebox.showinfo("Success", "All images have been resized successfully!")
 
 if __name__ == "__main__":
     root = tk.Tk()
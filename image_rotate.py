@@ -1,60 +1,154 @@
 import os
+import argparse
 from PIL import Image
 
-# Prompt for the folder containing images
-folder = input('Enter the path to the folder containing images: ')
+import encoder_options
+import image_scanner
+import instrumentation
+import lossless_jpeg
+import result_cache
 
-# Prompt for desired format
 format_map = {'jpeg': 'JPEG', 'jpg': 'JPEG', 'png': 'PNG', 'bmp': 'BMP', 'gif': 'GIF'}
-format_input = input('Enter the desired image format (jpeg, png, bmp, gif): ').strip().lower()
-img_format = format_map.get(format_input, 'JPEG')
-
-# Prompt for rotation
-rotate_choice = input('Do you want to rotate the images? (y/n): ').strip().lower()
-if rotate_choice == 'y':
-    try:
-        rotate_degrees = float(input('Enter degrees to rotate (e.g., 90, 180): '))
-    except ValueError:
-        print('Invalid input. No rotation will be applied.')
-        rotate_degrees = None
-else:
-    rotate_degrees = None
-
-# Prompt for resizing
-resize_choice = input('Do you want to resize the images? (y/n): ').strip().lower()
-if resize_choice == 'y':
-    try:
-        new_width = int(input('Enter new width: '))
-        new_height = int(input('Enter new height: '))
-        new_size = (new_width, new_height)
-    except ValueError:
-        print('Invalid input. No resizing will be applied.')
-        new_size = None
-else:
-    new_size = None
-
-# Output folder
-output_folder = os.path.join(folder, 'output')
-os.makedirs(output_folder, exist_ok=True)
 
 # Supported image extensions
 img_exts = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
 
-for filename in os.listdir(folder):
-    if filename.lower().endswith(img_exts):
+def transform(img, rotate_degrees=None, new_size=None):
+    """
+    Returns the image rotated counter-clockwise by rotate_degrees and resized to new_size.
+    """
+    # Rotate if needed; right angles only move pixels, so transpose is exact and much faster
+    right_angle = lossless_jpeg.right_angle(rotate_degrees)
+    if right_angle:
+        img = img.transpose(lossless_jpeg.ROTATIONS[right_angle][0])
+    elif rotate_degrees is not None and right_angle is None:
+        img = img.rotate(rotate_degrees, expand=True)
+    # Resize if needed
+    if new_size is not None:
+        img = img.resize(new_size)
+    return img
+
+def process_image(img_path, out_path, img_format, rotate_degrees=None, new_size=None, lossless=True, encoder=None):
+    """
+    Rotates and/or resizes one image and saves it in the given format, with the
+    quality and compression settings of encoder (an encoder_options.EncoderOptions).
+
+    With lossless=True, JPEG to JPEG rotations by a multiple of 90 degrees without
+    resizing skip the full decode and re-encode (see lossless_jpeg.rotate), unless
+    encoder asks for specific settings. Returns the path taken.
+    """
+    if encoder is not None and not encoder.is_default():
+        lossless = False
+    if (lossless and img_format == 'JPEG' and new_size is None
+            and lossless_jpeg.right_angle(rotate_degrees) is not None and lossless_jpeg.is_jpeg(img_path)):
+        with instrumentation.stage("jpeg_rotate"):
+            path = lossless_jpeg.rotate(img_path, out_path, rotate_degrees)
+        instrumentation.count_written(out_path)
+        return path
+    with Image.open(img_path) as img:
+        with instrumentation.stage("decode"):
+            img.load()
+        with instrumentation.stage("transform"):
+            img = transform(img, rotate_degrees, new_size)
+        # Save in new format
+        with instrumentation.stage("encode"):
+            encoder_options.save_image(img, out_path, encoder, img_format)
+    instrumentation.count_written(out_path)
+    return lossless_jpeg.FULL
+
+def prompt_rotation():
+    """
+    Asks whether to rotate and by how much. Returns None for no rotation.
+    """
+    rotate_choice = input('Do you want to rotate the images? (y/n): ').strip().lower()
+    if rotate_choice == 'y':
+        try:
+            return float(input('Enter degrees to rotate (e.g., 90, 180): '))
+        except ValueError:
+            print('Invalid input. No rotation will be applied.')
+    return None
+
+def prompt_size():
+    """
+    Asks whether to resize and to what size. Returns None for no resizing.
+    """
+    resize_choice = input('Do you want to resize the images? (y/n): ').strip().lower()
+    if resize_choice == 'y':
+        try:
+            new_width = int(input('Enter new width: '))
+            new_height = int(input('Enter new height: '))
+            return (new_width, new_height)
+        except ValueError:
+            print('Invalid input. No resizing will be applied.')
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Rotate, resize and convert every image in a folder. Anything not given on the command line is asked for interactively.")
+    parser.add_argument("folder", nargs="?", help="Path to the folder containing images.")
+    parser.add_argument("--format", choices=sorted(format_map), help="Output image format.")
+    parser.add_argument("--rotate", type=float, help="Degrees to rotate counter-clockwise. Pass 0 for no rotation.")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="Resize to this size.")
+    parser.add_argument("--no_resize", action="store_true", help="Do not resize and do not ask about it.")
+    parser.add_argument("--no_lossless", action="store_true", help="Always decode and re-encode, even for JPEGs that could be rotated losslessly.")
+    result_cache.add_cache_arguments(parser)
+    image_scanner.add_scan_arguments(parser)
+    instrumentation.add_instrumentation_arguments(parser)
+    encoder_options.add_encoder_arguments(parser, include_format=False)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    # Prompt for the folder containing images
+    folder = args.folder or input('Enter the path to the folder containing images: ')
+
+    # Prompt for desired format
+    format_input = args.format or input('Enter the desired image format (jpeg, png, bmp, gif): ').strip().lower()
+    img_format = format_map.get(format_input, 'JPEG')
+
+    # Prompt for rotation
+    if args.rotate is not None:
+        rotate_degrees = args.rotate or None
+    else:
+        rotate_degrees = prompt_rotation()
+
+    # Prompt for resizing
+    if args.size:
+        new_size = tuple(args.size)
+    elif args.no_resize:
+        new_size = None
+    else:
+        new_size = prompt_size()
+
+    # Output folder
+    output_folder = os.path.join(folder, 'output')
+    os.makedirs(output_folder, exist_ok=True)
+
+    cache = result_cache.cache_from_args(args)
+    lossless = not args.no_lossless
+    encoder = encoder_options.encoder_from_args(args)
+    params = {"format": img_format, "rotate": rotate_degrees, "size": new_size, "lossless": lossless}
+    if not encoder.is_default():
+        params.update(encoder.cache_params())
+
+    for filename in image_scanner.scan_from_args(args, folder, img_exts, skip_dirs=[output_folder]):
         img_path = os.path.join(folder, filename)
+        base_name = os.path.splitext(filename)[0]
+        out_path = os.path.join(output_folder, f"{base_name}.{format_input}")
         try:
-            with Image.open(img_path) as img:
-                # Rotate if needed
-                if rotate_degrees is not None:
-                    img = img.rotate(rotate_degrees, expand=True)
-                # Resize if needed
-                if new_size is not None:
-                    img = img.resize(new_size)
-                # Save in new format
-                base_name = os.path.splitext(filename)[0]
-                out_path = os.path.join(output_folder, f"{base_name}.{format_input}")
-                img.save(out_path, img_format)
-                print(f"Processed: {filename} -> {out_path}")
+            # Recursive scans keep the subfolder layout in the output folder
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            key = cache.key(img_path, "rotate", params) if cache is not None else None
+            if key is not None and cache.fetch(key, out_path):
+                print(f"Cached: {filename} -> {out_path}")
+                continue
+            with instrumentation.file(filename, img_path):
+                path = process_image(img_path, out_path, img_format, rotate_degrees, new_size, lossless, encoder)
+            if key is not None:
+                cache.store(key, out_path)
+            print(f"Processed ({path}): {filename} -> {out_path}")
         except Exception as e:
             print(f"Failed to process {filename}: {e}")
+
+    instrumentation.finish()
+
+if __name__ == "__main__":
+    main()
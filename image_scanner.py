@@ -0,0 +1,130 @@
+import os
+from fnmatch import fnmatch
+
+def scan_images(folder, extensions=None, recursive=False, include=None, exclude=None, skip_dirs=(), skip_hidden=False,
+                skip_prefixes=()):
+    """
+    Yields the paths of matching files under folder, relative to it, as the
+    directory is read.
+
+    Nothing is listed up front, so processing can start with the first file
+    even in folders with millions of entries. extensions is a tuple of lower-case
+    suffixes (None accepts any file). include and exclude are lists of glob
+    patterns matched against the relative path with '/' separators, e.g. '*.jpg'
+    or 'raw/*'; exclude patterns also prune subfolders. skip_dirs are folders
+    (absolute or relative to the current directory) that are never entered,
+    typically the tool's own output folder. Files whose name starts with one of
+    skip_prefixes are left out; a tool writing into the folder it reads passes its
+    output prefixes, so the files it has just written are not picked up again.
+    """
+    skip = {os.path.realpath(d) for d in skip_dirs}
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(folder, rel_dir))
+        except OSError:
+            continue
+        with entries:
+            subdirs = []
+            for entry in entries:
+                if skip_hidden and entry.name.startswith('.'):
+                    continue
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_dir:
+                    if recursive and os.path.realpath(entry.path) not in skip and not _matches(rel_path, exclude):
+                        subdirs.append(rel_path)
+                    continue
+                if extensions is not None and not entry.name.lower().endswith(extensions):
+                    continue
+                if skip_prefixes and entry.name.startswith(tuple(skip_prefixes)):
+                    continue
+                if include and not _matches(rel_path, include):
+                    continue
+                if _matches(rel_path, exclude):
+                    continue
+                yield rel_path
+        # Visit subfolders in name order, depth first
+        pending.extend(sorted(subdirs, reverse=True))
+
+def same_folder(folder, output_folder):
+    """
+    Returns True if output_folder is the folder being scanned, so outputs are
+    written where the scan is still looking.
+    """
+    return os.path.realpath(output_folder) == os.path.realpath(folder)
+
+def own_output_prefixes(folder, output_folder, prefixes):
+    """
+    Returns the skip_prefixes for a tool writing outputs named <prefix><name> to
+    output_folder: prefixes when that is the folder being scanned, otherwise none.
+    """
+    return tuple(prefixes) if same_folder(folder, output_folder) else ()
+
+def _matches(rel_path, patterns):
+    return bool(patterns) and any(fnmatch(rel_path, p) or fnmatch(os.path.basename(rel_path), p) for p in patterns)
+
+class Scan:
+    """
+    Iterable wrapper around scan_images() that counts what it has found.
+
+    count is the number of files yielded so far and done becomes True once the
+    whole tree has been read, at which point count is the total. With
+    read_first=True the whole tree is listed before the first file is yielded,
+    for tools whose outputs land in the scanned folder under the same names as
+    their inputs, where skip_prefixes cannot tell them apart; total is then known
+    from the start.
+    """
+
+    def __init__(self, folder, extensions=None, read_first=False, **options):
+        self.folder = folder
+        self.extensions = extensions
+        self.read_first = read_first
+        self.options = options
+        self.count = 0
+        self.done = False
+        self.listed = None
+
+    def __iter__(self):
+        rel_paths = scan_images(self.folder, self.extensions, **self.options)
+        if self.read_first:
+            rel_paths = list(rel_paths)
+            self.listed = len(rel_paths)
+        for rel_path in rel_paths:
+            self.count += 1
+            yield rel_path
+        self.done = True
+
+    @property
+    def total(self):
+        """
+        The number of files found, or None while the scan is still running.
+        """
+        return self.count if self.done else self.listed
+
+def track_total(pbar, scan):
+    """
+    Gives a tqdm bar its total once the scan has finished; until then it shows a running count.
+    """
+    if scan.total is not None and pbar.total != scan.total:
+        pbar.total = scan.total
+        pbar.refresh()
+
+def add_scan_arguments(parser):
+    """
+    Adds the --recursive, --include and --exclude options shared by the command-line tools.
+    """
+    parser.add_argument("--recursive", action="store_true", help="Also process images in subfolders. The folder structure is kept in the output folder.")
+    parser.add_argument("--include", action="append", metavar="GLOB", help="Only process files whose name or relative path matches this pattern (e.g. '*.jpg'). Can be repeated.")
+    parser.add_argument("--exclude", action="append", metavar="GLOB", help="Skip files and folders whose name or relative path matches this pattern. Can be repeated.")
+
+def scan_from_args(args, folder, extensions, skip_dirs=(), skip_hidden=False, skip_prefixes=(), read_first=False):
+    """
+    Returns a Scan of folder configured by add_scan_arguments() options.
+    """
+    return Scan(folder, extensions, read_first=read_first, recursive=args.recursive, include=args.include,
+                exclude=args.exclude, skip_dirs=skip_dirs, skip_hidden=skip_hidden, skip_prefixes=skip_prefixes)
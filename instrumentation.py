@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Shared do-nothing context manager handed out while instrumentation is off, so an
+# instrumented call costs one global lookup and a None check
+_NULL = nullcontext()
+
+_recorder = None
+_local = threading.local()
+
+class FileTrace:
+    """
+    Stage timings and byte counts for one file.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+        self.error = None
+        # Counts handoff() calls, so a block can tell whether its file moved on to another thread
+        self.handoffs = 0
+
+    def to_dict(self):
+        return {"file": self.name, "seconds": self.seconds, "stages": self.stages,
+                "bytes_read": self.bytes_read, "bytes_written": self.bytes_written,
+                "error": self.error}
+
+class Recorder:
+    """
+    Aggregates FileTrace results and optionally writes each one as a JSON line.
+    """
+
+    def __init__(self, trace_path=None, profile_path=None):
+        self.trace_file = open(trace_path, "a") if trace_path else None
+        self.profile_path = profile_path
+        self.profiler = cProfile.Profile() if profile_path else None
+        self.files = 0
+        self.failed = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+        # stage name -> [count, total seconds, max seconds]
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, trace):
+        """
+        Adds one file's trace, given as a FileTrace.to_dict() dictionary.
+        """
+        with self.lock:
+            self.files += 1
+            self.failed += trace["error"] is not None
+            self.bytes_read += trace["bytes_read"]
+            self.bytes_written += trace["bytes_written"]
+            self.seconds += trace["seconds"]
+            for name, seconds in trace["stages"].items():
+                totals = self.stages.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+            if self.trace_file is not None:
+                self.trace_file.write(json.dumps(trace) + "\n")
+
+    def summary(self):
+        """
+        Returns a table of where the time went, one line per stage.
+        """
+        wall = time.perf_counter() - self.started
+        lines = [f"{self.files} files ({self.failed} failed) in {wall:.2f}s wall time, "
+                 f"{self.seconds:.2f}s of per-file work; "
+                 f"read {self.bytes_read / 1e6:.1f} MB, wrote {self.bytes_written / 1e6:.1f} MB"]
+        total = sum(t[1] for t in self.stages.values()) or 1
+        lines.append(f"  {'stage':16s} {'count':>6s} {'total s':>9s} {'mean ms':>9s} {'max ms':>9s} {'share':>6s}")
+        for name, (count, seconds, longest) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {name:16s} {count:6d} {seconds:9.2f} {seconds / count * 1000:9.1f} "
+                         f"{longest * 1000:9.1f} {seconds / total:6.0%}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+        if self.trace_file is not None:
+            self.trace_file.close()
+
+def enable(trace_path=None, profile_path=None):
+    """
+    Turns instrumentation on for this process.
+
+    trace_path appends one JSON line per file; profile_path writes a cProfile dump
+    of this process when finish() is called (worker processes are not profiled).
+    """
+    global _recorder
+    _recorder = Recorder(trace_path, profile_path)
+    if _recorder.profiler is not None:
+        _recorder.profiler.enable()
+    return _recorder
+
+def enabled():
+    return _recorder is not None
+
+def finish(show_summary=True):
+    """
+    Turns instrumentation off, prints the summary and closes the trace and profile files.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return
+    recorder.close()
+    if show_summary:
+        print(recorder.summary())
+    if recorder.trace_file is not None:
+        print(f"Per-file trace written to {recorder.trace_file.name}")
+    if recorder.profile_path:
+        print(f"Profile written to {recorder.profile_path} (view with: python -m pstats {recorder.profile_path})")
+
+@contextmanager
+def _file(name, input_path):
+    trace = FileTrace(name)
+    with _resume(trace):
+        if input_path is not None:
+            count_read(input_path)
+        yield trace
+
+def file(name, input_path=None):
+    """
+    Context manager collecting the stages of one file; counts input_path as read.
+    """
+    if _recorder is None:
+        return _NULL
+    return _file(name, input_path)
+
+@contextmanager
+def _stage(trace, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages[name] = trace.stages.get(name, 0.0) + time.perf_counter() - start
+
+def stage(name):
+    """
+    Context manager timing one stage (decode, enhance, encode, ...) of the current file.
+    """
+    trace = getattr(_local, "trace", None) if _recorder is not None else None
+    if trace is None:
+        return _NULL
+    return _stage(trace, name)
+
+def count_read(path):
+    """
+    Adds the size of path to the bytes read by the current file.
+    """
+    trace = getattr(_local, "trace", None) if _recorder is not None else None
+    if trace is not None:
+        try:
+            trace.bytes_read += os.path.getsize(path)
+        except OSError:
+            pass
+
+def count_written(path):
+    """
+    Adds the size of path to the bytes written by the current file.
+    """
+    trace = getattr(_local, "trace", None) if _recorder is not None else None
+    if trace is not None:
+        try:
+            trace.bytes_written += os.path.getsize(path)
+        except OSError:
+            pass
+
+def handoff():
+    """
+    Passes the current file's trace on to work that continues on another thread, such
+    as a background write. The block it was taken in then leaves recording the file
+    to resume(). Returns None while instrumentation is off.
+    """
+    trace = getattr(_local, "trace", None) if _recorder is not None else None
+    if trace is not None:
+        # The time so far is added now, as the next thread may record the file before this block ends
+        now = time.perf_counter()
+        trace.seconds += now - _local.started
+        _local.started = now
+        trace.handoffs += 1
+    return trace
+
+@contextmanager
+def _resume(trace):
+    previous = getattr(_local, "trace", None), getattr(_local, "started", None)
+    _local.trace = trace
+    _local.started = time.perf_counter()
+    handoffs = trace.handoffs
+    failed = False
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = str(e)
+        failed = True
+        raise
+    finally:
+        trace.seconds += time.perf_counter() - _local.started
+        _local.trace, _local.started = previous
+        if _recorder is not None and (failed or trace.handoffs == handoffs):
+            _recorder.add(trace.to_dict())
+
+def resume(trace):
+    """
+    Context manager continuing a trace returned by handoff() on this thread. The file
+    is recorded when the block exits, unless it is handed off again inside it.
+    """
+    if trace is None:
+        return _NULL
+    return _resume(trace)
+
+def mark_failed(error):
+    """
+    Records an error for the current file, for code that reports failures without raising.
+    """
+    trace = getattr(_local, "trace", None) if _recorder is not None else None
+    if trace is not None:
+        trace.error = str(error)
+
+def traced_call(name, input_path, function, *args):
+    """
+    Runs function(*args) in a worker process and returns (result, trace dict).
+    input_path, if given, is counted as read.
+
+    Used with process pools: instrumentation is switched on in the worker without
+    any output of its own, and the parent passes the trace to record().
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+    trace = FileTrace(name)
+    _local.trace = trace
+    if input_path is not None:
+        count_read(input_path)
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+    except Exception as e:
+        trace.error = str(e)
+        trace.seconds = time.perf_counter() - start
+        # Travels back with the exception so failed files still show up in the summary
+        e.trace = trace.to_dict()
+        raise
+    finally:
+        _local.trace = None
+    trace.seconds = time.perf_counter() - start
+    return result, trace.to_dict()
+
+def record(trace):
+    """
+    Adds a trace dict returned by traced_call() to this process's summary. None is ignored.
+    """
+    if _recorder is not None and trace is not None:
+        _recorder.add(trace)
+
+def add_instrumentation_arguments(parser):
+    """
+    Adds the --timings, --trace and --profile options shared by the command-line tools.
+    """
+    parser.add_argument("--timings", action="store_true", help="Print how long each stage (decode, processing, encode, ...) took in total.")
+    parser.add_argument("--trace", metavar="FILE", help="Append per-file stage timings and byte counts to this JSON-lines file. Implies --timings.")
+    parser.add_argument("--profile", metavar="FILE", help="Write a cProfile dump of the main process to this file. Implies --timings; use --workers 1 to profile the image work itself.")
+
+def enable_from_args(args):
+    """
+    Enables instrumentation if any of the add_instrumentation_arguments() options were given.
+    """
+    if args.timings or args.trace or args.profile:
+        enable(args.trace, args.profile)
@@ -0,0 +1,132 @@
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Images decoded ahead of the processing step, and results allowed to wait for their
+# write. Each one is a whole decoded image, so these bound the extra memory used.
+DEFAULT_DEPTH = 2
+
+def prefetch(items, load, depth=DEFAULT_DEPTH, workers=1):
+    """
+    Yields (item, result, error) for each item, in order, where result is load(item).
+
+    load runs on background threads up to depth items ahead of the consumer, so
+    reading and decoding the next images overlaps with processing the current one.
+    items is only advanced as far as that, so lazy scans stay lazy. error is the
+    exception load raised (result is then None). With depth 0 nothing is read ahead.
+    """
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+    try:
+        for item in items:
+            pending.append((item, executor.submit(load, item)))
+            if len(pending) > depth:
+                yield _outcome(*pending.popleft())
+        while pending:
+            yield _outcome(*pending.popleft())
+    finally:
+        # The consumer stopped early: drop what has not started and wait for the rest
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+def _outcome(item, future):
+    try:
+        return item, future.result(), None
+    except Exception as e:
+        return item, None, e
+
+class WriteBehind:
+    """
+    Runs write jobs (encoding and saving results) on background threads.
+
+    At most depth jobs are queued or running; submit() blocks until one finishes
+    when that many are, so a slow disk holds up processing instead of letting
+    results pile up in memory. done, if given, is called as done(tag, result, error)
+    on the writer thread when each job finishes. With depth 0 jobs run inside submit().
+    """
+
+    def __init__(self, depth=DEFAULT_DEPTH, workers=1, done=None):
+        self.depth = depth
+        self.done = done
+        self.slots = threading.BoundedSemaphore(max(1, depth))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="write-behind")
+
+    def submit(self, tag, function, *args):
+        """
+        Queues function(*args), waiting for a free slot first.
+        """
+        if self.depth == 0:
+            try:
+                result = function(*args)
+            except Exception as e:
+                self._report(tag, None, e)
+            else:
+                self._report(tag, result, None)
+            return
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self._finished(tag, f))
+
+    def _finished(self, tag, future):
+        self.slots.release()
+        error = future.exception()
+        self._report(tag, None if error else future.result(), error)
+
+    def _report(self, tag, result, error):
+        if self.done is not None:
+            self.done(tag, result, error)
+
+    def close(self):
+        """
+        Waits for every queued write to finish.
+        """
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ProcessPool:
+    """
+    A ProcessPoolExecutor that starts over when one of its worker processes dies.
+
+    A worker killed mid-job (by the OS when memory runs out, or a crash in a native
+    library) breaks the executor: the jobs in flight fail with BrokenProcessPool and
+    it takes no new ones. submit() then replaces it with a fresh executor, so only
+    those jobs fail and the rest of the batch continues.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, function, *args):
+        try:
+            return self.executor.submit(function, *args)
+        except BrokenProcessPool:
+            self.executor.shutdown(wait=False)
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor.submit(function, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def add_io_arguments(parser):
+    """
+    Adds the --io_depth option shared by the command-line tools.
+    """
+    parser.add_argument("--io_depth", type=int, default=DEFAULT_DEPTH, help="Images read and decoded ahead, and results waiting to be written in the background. Higher values hide slow disks or network shares at the cost of memory; 0 reads and writes in line.")
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+
+MANIFEST_NAME = ".job_manifest.sqlite"
+DEFAULT_MAX_RETRIES = 3
+
+# Status of a file in the manifest. A file left "running" was being processed when
+# the run stopped, and counts as an attempt.
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+@contextmanager
+def atomic_output(path):
+    """
+    Context manager yielding a temporary path next to path, which replaces path only
+    when the block succeeds. A crash never leaves a truncated file under the real name.
+
+    The temporary name does not end in an image extension, so a file left behind by a
+    crash is never picked up as an input; writers have to name the format explicitly.
+    """
+    folder, name = os.path.split(path)
+    # Unique per process and thread; created by the writer itself so it gets the usual permissions
+    tmp_path = os.path.join(folder, f".{name}.{os.getpid()}-{threading.get_ident()}.partial")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class JobManifest:
+    """
+    Records the state of every file of a batch run in an SQLite database, so an
+    interrupted run can be resumed.
+
+    Each file is recorded as running, done or failed, together with the operation
+    parameters and the source file's size and modification time. With resume=True,
+    skip() reports files finished by an earlier run with the same parameters and an
+    unchanged source whose output is still there, and files that already failed
+    max_retries times. Without it
+    every file is processed again and the manifest is rewritten as the run goes.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, path, operation, params, resume=False, max_retries=DEFAULT_MAX_RETRIES):
+        self.path = path
+        self.operation = operation
+        self.params = json.dumps(params, sort_keys=True)
+        self.resume = resume
+        self.max_retries = max_retries
+        self.skipped_done = 0
+        self.skipped_failed = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL with synchronous=NORMAL keeps a commit per file cheap while staying crash-safe
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files (operation TEXT, name TEXT, params TEXT, status TEXT,"
+            " attempts INTEGER, error TEXT, size INTEGER, mtime REAL, updated REAL,"
+            " PRIMARY KEY (operation, name))")
+
+    def _row(self, name):
+        return self._db.execute(
+            "SELECT params, status, attempts, size, mtime FROM files WHERE operation = ? AND name = ?",
+            (self.operation, name)).fetchone()
+
+    def skip(self, name, input_path, output_path=None):
+        """
+        Returns True if a resumed run can leave this file alone. A finished file is
+        processed again when its output_path, if given, no longer exists.
+        """
+        if not self.resume:
+            return False
+        with self._lock:
+            row = self._row(name)
+        if row is None:
+            return False
+        params, status, attempts, size, mtime = row
+        try:
+            stat = os.stat(input_path)
+        except OSError:
+            return False
+        if params != self.params or (size, mtime) != (stat.st_size, stat.st_mtime):
+            return False
+        if status == DONE:
+            if output_path is not None and not os.path.exists(output_path):
+                return False
+            self.skipped_done += 1
+            return True
+        if attempts >= self.max_retries:
+            self.skipped_failed += 1
+            return True
+        return False
+
+    def start(self, name, input_path):
+        """
+        Marks a file as being processed and counts the attempt.
+        """
+        try:
+            stat = os.stat(input_path)
+            size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            size, mtime = None, None
+        with self._lock:
+            row = self._row(name)
+            attempts = 1
+            if self.resume and row is not None and row[0] == self.params and row[1] != DONE:
+                attempts = row[2] + 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?)",
+                (self.operation, name, self.params, RUNNING, attempts, size, mtime, time.time()))
+
+    def _finish(self, name, status, error):
+        with self._lock:
+            self._db.execute(
+                "UPDATE files SET status = ?, error = ?, updated = ? WHERE operation = ? AND name = ?",
+                (status, error, time.time(), self.operation, name))
+
+    def done(self, name):
+        """
+        Marks a file as finished.
+        """
+        self._finish(name, DONE, None)
+
+    def failed(self, name, error=None):
+        """
+        Marks a file as failed, with the error message if there is one.
+        """
+        self._finish(name, FAILED, None if error is None else str(error))
+
+    def counts(self):
+        """
+        Returns {status: number of files} for this operation.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM files WHERE operation = ? GROUP BY status",
+                                    (self.operation,)).fetchall()
+        return dict(rows)
+
+    def resume_summary(self):
+        """
+        Returns a line describing what a resumed run skipped, or None.
+        """
+        if not self.resume:
+            return None
+        return (f"Resumed: {self.skipped_done} already done, "
+                f"{self.skipped_failed} skipped after {self.max_retries} failed attempts.")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def add_manifest_arguments(parser):
+    """
+    Adds the --record, --resume, --max_retries and --manifest options shared by the command-line tools.
+    """
+    parser.add_argument("--record", action="store_true", help=f"Record the state of every file in a job manifest ({MANIFEST_NAME} in the output folder), so an interrupted run can be continued with --resume.")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run recorded with --record (or --resume): skip files already done with the same settings and retry failed ones. Keeps recording.")
+    parser.add_argument("--max_retries", type=int, default=DEFAULT_MAX_RETRIES, help="With --resume, files that failed this many times are skipped.")
+    parser.add_argument("--manifest", metavar="FILE", help=f"Job manifest recording the state of every file (implies --record). Defaults to {MANIFEST_NAME} in the output folder.")
+
+def manifest_from_args(args, output_folder, operation, params):
+    """
+    Opens the JobManifest selected by add_manifest_arguments() options, or returns
+    None when no recording was asked for.
+    """
+    if not (args.record or args.resume or args.manifest):
+        return None
+    path = args.manifest or os.path.join(output_folder, MANIFEST_NAME)
+    return JobManifest(path, operation, params, resume=args.resume, max_retries=args.max_retries)
+
+def main():
+    """
+    Shows the state of the files recorded in a job manifest.
+    """
+    parser = argparse.ArgumentParser(description="Show the progress recorded in a job manifest.")
+    parser.add_argument("manifest", help=f"Manifest file, or the output folder containing {MANIFEST_NAME}.")
+    parser.add_argument("--failed", action="store_true", help="List the failed and unfinished files.")
+    args = parser.parse_args()
+
+    path = args.manifest
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        print(f"No manifest at {path}")
+        sys.exit(1)
+
+    db = sqlite3.connect(path)
+    for operation, status, count in db.execute(
+            "SELECT operation, status, COUNT(*) FROM files GROUP BY operation, status ORDER BY operation, status"):
+        print(f"{operation}: {count} {status}")
+    if args.failed:
+        for operation, name, status, attempts, error in db.execute(
+                "SELECT operation, name, status, attempts, error FROM files WHERE status != ? ORDER BY operation, name",
+                (DONE,)):
+            print(f"  {operation} {name}: {status} after {attempts} attempt(s){': ' + error if error else ''}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import subprocess
+from PIL import Image, JpegImagePlugin
+
+# Paths a file can take, as reported by the cropper and the rotator
+LOSSLESS = "lossless"    # DCT coefficients rearranged by jpegtran, no decoding at all
+TRANSPOSE = "transpose"  # decoded, transposed and re-encoded with the original quantization tables
+FULL = "full"            # decoded, processed and re-encoded with the default settings
+
+# Counter-clockwise degrees (as used by Image.rotate) -> transpose method and jpegtran arguments
+ROTATIONS = {
+    90: (Image.Transpose.ROTATE_90, ["-rotate", "270"]),
+    180: (Image.Transpose.ROTATE_180, ["-rotate", "180"]),
+    270: (Image.Transpose.ROTATE_270, ["-rotate", "90"]),
+}
+
+def find_jpegtran():
+    """
+    Returns the path of the jpegtran program (libjpeg/libjpeg-turbo), or None if it is not installed.
+    """
+    return shutil.which("jpegtran")
+
+def is_jpeg(path):
+    """
+    Returns True if the file is a JPEG, judged by its contents rather than its name.
+    """
+    try:
+        with Image.open(path) as img:
+            return img.format == "JPEG"
+    except OSError:
+        return False
+
+def mcu_size(img):
+    """
+    Returns the (width, height) in pixels of an open JPEG's minimum coded unit.
+
+    Lossless crops must start on a multiple of this, and lossless rotations need
+    image dimensions that are multiples of it (otherwise the partial edge blocks
+    cannot be moved).
+    """
+    layers = getattr(img, "layer", None) or [("", 1, 1, 0)]
+    return 8 * max(layer[1] for layer in layers), 8 * max(layer[2] for layer in layers)
+
+def right_angle(degrees):
+    """
+    Returns degrees normalised to 0, 90, 180 or 270, or None for other angles.
+    """
+    if degrees is None:
+        return 0
+    if float(degrees) % 90:
+        return None
+    return int(float(degrees)) % 360
+
+def _run_jpegtran(args, src, dst):
+    """
+    Runs jpegtran, writing to dst. Returns False (leaving no output behind) if it refused.
+    """
+    jpegtran = find_jpegtran()
+    if jpegtran is None:
+        return False
+    # Metadata is dropped like the re-encoding path does, so an EXIF orientation
+    # tag cannot make viewers rotate the result a second time
+    cmd = [jpegtran, "-copy", "none", "-perfect", *args, "-outfile", dst, src]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return False
+    if result.returncode != 0:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    return True
+
+def _save_like(img, source, out_path):
+    """
+    Saves img as a JPEG using the quantization tables and subsampling of source,
+    so the re-encode adds as little loss as possible.
+    """
+    img.save(out_path, "JPEG", qtables=source.quantization,
+             subsampling=JpegImagePlugin.get_sampling(source))
+
+def rotate(src, dst, degrees):
+    """
+    Rotates a JPEG counter-clockwise by a multiple of 90 degrees with as little loss as possible.
+
+    Uses jpegtran when it is installed and the image is a whole number of MCUs in
+    both directions; otherwise the image is decoded, turned with Image.transpose
+    and re-encoded with its original quantization tables. Returns the path taken
+    (LOSSLESS or TRANSPOSE), or None if degrees is not a right angle.
+    """
+    degrees = right_angle(degrees)
+    if degrees is None:
+        return None
+    if degrees == 0:
+        shutil.copyfile(src, dst)
+        return LOSSLESS
+    method, jpegtran_args = ROTATIONS[degrees]
+    with Image.open(src) as img:
+        mcu_w, mcu_h = mcu_size(img)
+        aligned = img.size[0] % mcu_w == 0 and img.size[1] % mcu_h == 0
+    if aligned and _run_jpegtran(jpegtran_args, src, dst):
+        return LOSSLESS
+    with Image.open(src) as img:
+        _save_like(img.transpose(method), img, dst)
+    return TRANSPOSE
+
+def crop(src, dst, left, top, right, bottom):
+    """
+    Crops margins off a JPEG without re-encoding, if it can be done exactly.
+
+    That needs jpegtran and left/top margins on MCU boundaries (right and bottom
+    can be anything). Returns LOSSLESS on success, or None when the caller has
+    to fall back to decoding.
+    """
+    with Image.open(src) as img:
+        width, height = img.size
+        mcu_w, mcu_h = mcu_size(img)
+    new_width = width - left - right
+    new_height = height - top - bottom
+    if min(left, top, right, bottom) < 0 or new_width <= 0 or new_height <= 0:
+        return None
+    if left % mcu_w or top % mcu_h:
+        return None
+    if _run_jpegtran(["-crop", f"{new_width}x{new_height}+{left}+{top}"], src, dst):
+        return LOSSLESS
+    return None
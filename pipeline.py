@@ -0,0 +1,286 @@
+
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import FIRST_COMPLETED, wait
+from PIL import Image
+from tqdm import tqdm
+
+import encoder_options
+import enhance_kernel
+import fast_load
+import image_scanner
+import io_pipeline
+import instrumentation
+import result_cache
+from image_cropper import crop_margins
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+
+ENHANCE_DEFAULTS = {"brightness": 1.2, "contrast": 1.5, "sharpness": 2.0, "color": 1.5}
+
+def op_crop(img, left=0, top=0, right=0, bottom=0):
+    """
+    Crops margins off the image.
+    """
+    return crop_margins(img, left, top, right, bottom)
+
+def op_rotate(img, degrees):
+    """
+    Rotates counter-clockwise, expanding the canvas to fit.
+    """
+    return img.rotate(degrees, expand=True)
+
+def op_resize(img, width, height):
+    """
+    Resizes to an exact size.
+    """
+    return img.resize((width, height))
+
+def op_enhance(img, brightness=1.2, contrast=1.5, sharpness=2.0, color=1.5):
+    """
+    Applies the enhancer's brightness/contrast/sharpness/color adjustments.
+    """
+    return enhance_kernel.enhance(img, brightness, contrast, sharpness, color)
+
+def op_convert(img, mode):
+    """
+    Converts to another color mode, e.g. RGB or L.
+    """
+    return img.convert(mode)
+
+# Stage name -> function taking the image plus the stage's parameters
+OPERATIONS = {
+    "crop": op_crop,
+    "rotate": op_rotate,
+    "resize": op_resize,
+    "enhance": op_enhance,
+    "convert": op_convert,
+}
+
+def parse_op(spec):
+    """
+    Parses a command-line stage such as crop=10,10,10,10, rotate=90, resize=800x600,
+    enhance=brightness:1.1,color:1.8 (or just enhance) or convert=RGB into
+    (name, params).
+    """
+    name, _, value = spec.partition("=")
+    name = name.strip().lower()
+    try:
+        if name == "crop":
+            left, top, right, bottom = (int(v) for v in value.split(","))
+            return name, {"left": left, "top": top, "right": right, "bottom": bottom}
+        if name == "rotate":
+            return name, {"degrees": float(value)}
+        if name == "resize":
+            width, height = (int(v) for v in value.lower().split("x"))
+            return name, {"width": width, "height": height}
+        if name == "enhance":
+            params = dict(ENHANCE_DEFAULTS)
+            for item in filter(None, value.split(",")):
+                key, _, factor = item.partition(":")
+                if key not in params:
+                    raise ValueError(f"unknown enhancement '{key}'")
+                params[key] = float(factor)
+            return name, params
+        if name == "convert":
+            if not value:
+                raise ValueError("a mode such as RGB is required")
+            return name, {"mode": value}
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"invalid stage '{spec}': {e}")
+    raise argparse.ArgumentTypeError(f"unknown stage '{name}' (choose from {', '.join(OPERATIONS)})")
+
+def load_config(path):
+    """
+    Reads a JSON pipeline file:
+
+        {"operations": [{"op": "crop", "left": 10, "top": 10, "right": 10, "bottom": 10},
+                        {"op": "rotate", "degrees": 90},
+                        {"op": "resize", "width": 800, "height": 600},
+                        {"op": "enhance", "brightness": 1.1}],
+         "format": "jpeg"}
+
+    Returns (operations, format) with operations as a list of (name, params).
+    """
+    with open(path) as f:
+        config = json.load(f)
+    operations = []
+    for stage in config.get("operations", []):
+        stage = dict(stage)
+        name = stage.pop("op")
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown stage '{name}' in {path}")
+        if name == "enhance":
+            stage = dict(ENHANCE_DEFAULTS, **stage)
+        operations.append((name, stage))
+    return operations, config.get("format")
+
+def run_pipeline(img, operations):
+    """
+    Applies each (name, params) stage to the image in order and returns the result.
+    """
+    for name, params in operations:
+        with instrumentation.stage(name):
+            img = OPERATIONS[name](img, **params)
+    return img
+
+def process_file(input_path, output_path, operations, encoder=None):
+    """
+    Decodes one image, runs every stage in memory and encodes the result once,
+    with the given encoder_options.EncoderOptions.
+    """
+    with Image.open(input_path) as img:
+        if operations and operations[0][0] == "resize":
+            # Only a smaller image is needed, so large JPEGs can be decoded at reduced scale
+            first = operations[0][1]
+            fast_load.draft_for_size(img, (first["width"], first["height"]))
+        with instrumentation.stage("decode"):
+            img.load()
+        img = run_pipeline(img, operations)
+        with instrumentation.stage("encode"):
+            (encoder or encoder_options.EncoderOptions()).save(img, output_path)
+        instrumentation.count_written(output_path)
+
+def main():
+    """
+    Runs an ordered list of stages over every image in a folder.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run crop/rotate/resize/enhance/convert stages over a folder, decoding and encoding each image once.",
+        epilog="Example: python pipeline.py photos --op crop=10,10,10,10 --op rotate=90 --op resize=800x600 --op enhance --format jpeg")
+    parser.add_argument("input_folder", help="Path to the folder containing images.")
+    parser.add_argument("--output_folder", help="Folder for the results. Defaults to a new 'pipeline' folder inside the input folder.")
+    parser.add_argument("--op", dest="operations", action="append", type=parse_op, default=[], metavar="STAGE", help="Add a stage: crop=L,T,R,B, rotate=DEGREES, resize=WxH, enhance[=brightness:F,contrast:F,sharpness:F,color:F] or convert=MODE. Stages run in the order given.")
+    parser.add_argument("--config", help="JSON file with the stages (see load_config). Stages given with --op run after them.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes. 1 processes images in this process.")
+    result_cache.add_cache_arguments(parser)
+    image_scanner.add_scan_arguments(parser)
+    instrumentation.add_instrumentation_arguments(parser)
+    encoder_options.add_encoder_arguments(parser)
+
+    args = parser.parse_args()
+
+    operations = []
+    if args.config:
+        operations, config_format = load_config(args.config)
+        args.format = args.format or config_format
+    operations += args.operations
+    if not operations:
+        parser.error("no stages given; use --op or --config")
+
+    if not os.path.isdir(args.input_folder):
+        print(f"Error: Input folder not found at {args.input_folder}")
+        sys.exit(1)
+
+    output_folder = args.output_folder or os.path.join(args.input_folder, 'pipeline')
+    os.makedirs(output_folder, exist_ok=True)
+
+    encoder = encoder_options.encoder_from_args(args)
+    cache = result_cache.cache_from_args(args)
+    params = {"operations": operations, **encoder.cache_params()}
+    workers = max(1, args.workers)
+    failed = []
+
+    print("Stages: " + " -> ".join(name for name, _ in operations))
+    instrumentation.enable_from_args(args)
+
+    # Results keep their input's name, so when they are written into the input folder
+    # it is listed in full first rather than read while they appear
+    scan = image_scanner.scan_from_args(args, args.input_folder, IMAGE_EXTENSIONS, skip_dirs=[output_folder],
+                                        read_first=image_scanner.same_folder(args.input_folder, output_folder))
+
+    def output_path_for(filename):
+        output_path = encoder.output_path(os.path.join(output_folder, filename))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        return output_path
+
+    def cache_key(input_path, output_path):
+        if cache is None:
+            return None
+        return cache.key(input_path, "pipeline", dict(params, ext=os.path.splitext(output_path)[1].lower()))
+
+    # The folder is read lazily and at most 2 * workers images are in flight, so
+    # memory stays bounded however many files there are
+    with tqdm(desc="Processing images", unit="img") as pbar:
+        if workers == 1:
+            for filename in scan:
+                input_path = os.path.join(args.input_folder, filename)
+                output_path = output_path_for(filename)
+                try:
+                    key = cache_key(input_path, output_path)
+                    if key is None or not cache.fetch(key, output_path):
+                        with instrumentation.file(filename, input_path):
+                            process_file(input_path, output_path, operations, encoder)
+                        if key is not None:
+                            cache.store(key, output_path)
+                except Exception as e:
+                    tqdm.write(f"Error processing {filename}: {e}")
+                    failed.append(filename)
+                pbar.update(1)
+                # The bar gets its total as soon as the scan knows it
+                image_scanner.track_total(pbar, scan)
+            image_scanner.track_total(pbar, scan)
+        else:
+            with io_pipeline.ProcessPool(workers) as executor:
+                in_flight = {}
+                # Workers time their own stages and send the trace back with the result
+                traced = instrumentation.enabled()
+
+                def collect(done):
+                    for future in done:
+                        filename, output_path, key = in_flight.pop(future)
+                        try:
+                            result = future.result()
+                            if traced:
+                                instrumentation.record(result[1])
+                            if key is not None:
+                                cache.store(key, output_path)
+                        except Exception as e:
+                            instrumentation.record(getattr(e, "trace", None))
+                            tqdm.write(f"Error processing {filename}: {e}")
+                            failed.append(filename)
+                        pbar.update(1)
+                        image_scanner.track_total(pbar, scan)
+
+                for filename in scan:
+                    input_path = os.path.join(args.input_folder, filename)
+                    output_path = output_path_for(filename)
+                    try:
+                        key = cache_key(input_path, output_path)
+                    except OSError as e:
+                        tqdm.write(f"Error processing {filename}: {e}")
+                        failed.append(filename)
+                        pbar.update(1)
+                        continue
+                    if key is not None and cache.fetch(key, output_path):
+                        pbar.update(1)
+                        continue
+                    job = (process_file, input_path, output_path, operations, encoder)
+                    if traced:
+                        job = (instrumentation.traced_call, filename, input_path) + job
+                    future = executor.submit(*job)
+                    in_flight[future] = (filename, output_path, key)
+                    if len(in_flight) >= 2 * workers:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                # The scan is finished, so the bar can show a total while the last images complete
+                image_scanner.track_total(pbar, scan)
+                collect(list(in_flight))
+
+    instrumentation.finish()
+
+    if scan.count == 0:
+        print(f"No images found in {args.input_folder}")
+        return
+    if failed:
+        print(f"{len(failed)} images failed:")
+        for filename in sorted(failed):
+            print(f"  {filename}")
+    if cache is not None:
+        print(f"Result cache: {cache.hits} reused, {cache.misses} processed.")
+    print(f"Results saved to the '{output_folder}' folder.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+
+import job_manifest
+
+# Bump when a change to any tool makes previously cached outputs wrong
+# (2: pipeline decodes JPEGs at reduced scale before resizing)
+CACHE_VERSION = 2
+
+# File in the cache folder holding the total size of the entries, so opening the
+# cache does not have to look at every entry
+SIZE_INDEX = "size"
+
+DEFAULT_CACHE_DIR = os.environ.get("IMAGES_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "images_scripts")
+DEFAULT_MAX_MB = int(os.environ.get("IMAGES_CACHE_MAX_MB", "2048"))
+
+class ResultCache:
+    """
+    On-disk cache of tool outputs, keyed by the input file's bytes plus the operation parameters.
+
+    Entries live in <root>/<key[:2]>/<key>. A hit copies the stored output to the
+    requested path and refreshes the entry's modification time, which is what the
+    least-recently-used eviction orders by. The total size is kept under max_bytes;
+    it is tracked in the SIZE_INDEX file, which every eviction recounts, so updates
+    lost to processes storing at the same moment are corrected there.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, input_path, operation, params):
+        """
+        Returns the cache key for running an operation with params on input_path.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([CACHE_VERSION, operation, params], sort_keys=True).encode())
+        with open(input_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, key, output_path):
+        """
+        Copies the cached output for key to output_path. Returns False on a miss.
+        """
+        entry = self._path(key)
+        try:
+            with job_manifest.atomic_output(output_path) as tmp_path:
+                shutil.copyfile(entry, tmp_path)
+            os.utime(entry)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def entry(self, key):
+        """
+        Returns the path of the entry for key, for reading it in place (for example
+        memory-mapped) instead of copying it out, or None on a miss.
+        """
+        entry = self._path(key)
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def store(self, key, output_path):
+        """
+        Adds a freshly written output to the cache, evicting old entries if needed.
+        """
+        self.store_with(key, lambda tmp_path: shutil.copyfile(output_path, tmp_path))
+
+    def store_with(self, key, write):
+        """
+        Adds an entry written by write(path), which is given a temporary path in
+        the cache, evicting old entries if needed.
+        """
+        entry = self._path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Write under a temporary name first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry), prefix=".tmp-")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            with self._lock:
+                total = self._read_size()
+                try:
+                    # Replacing an entry frees its old size
+                    total -= os.path.getsize(entry)
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp_path, entry)
+                total = max(0, total + os.path.getsize(entry))
+                self._write_size(total)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if total > self.max_bytes:
+            self.evict()
+
+    def _read_size(self):
+        """
+        Returns the total size from the index, counting the entries if there is none yet.
+        """
+        try:
+            with open(os.path.join(self.root, SIZE_INDEX)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            total = sum(size for _, size, _ in self._entries())
+            self._write_size(total)
+            return total
+
+    def _write_size(self, total):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(str(total))
+        os.replace(tmp_path, os.path.join(self.root, SIZE_INDEX))
+
+    def _entries(self):
+        """
+        Yields (path, size, mtime) for every entry in the cache.
+        """
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self, target_bytes=None):
+        """
+        Removes least-recently-used entries until the cache is at most target_bytes
+        (by default 90% of max_bytes, so eviction does not run on every store).
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * 0.9)
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= target_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._write_size(total)
+
+    def purge(self):
+        """
+        Removes every entry from the cache.
+        """
+        self.evict(target_bytes=0)
+
+    def stats(self):
+        """
+        Returns (entry count, total bytes).
+        """
+        entries = list(self._entries())
+        return len(entries), sum(size for _, size, _ in entries)
+
+def open_cache(cache_dir=None, max_mb=None):
+    """
+    Opens the result cache at cache_dir (or the default location).
+    """
+    return ResultCache(cache_dir or DEFAULT_CACHE_DIR, (max_mb or DEFAULT_MAX_MB) * 1024 * 1024)
+
+def add_cache_arguments(parser):
+    """
+    Adds the --cache, --cache_dir and --cache_max_mb options shared by the command-line tools.
+    """
+    parser.add_argument("--cache", action="store_true", help=f"Reuse results for unchanged images from the result cache ({DEFAULT_CACHE_DIR}, or $IMAGES_CACHE_DIR).")
+    parser.add_argument("--cache_dir", help="Use the result cache in this folder (implies --cache).")
+    parser.add_argument("--cache_max_mb", type=int, default=DEFAULT_MAX_MB, help="Result cache size limit in MB; least recently used entries are evicted.")
+
+def cache_from_args(args):
+    """
+    Returns the ResultCache selected by add_cache_arguments() options, or None.
+    """
+    if not (args.cache or args.cache_dir):
+        return None
+    return open_cache(args.cache_dir, args.cache_max_mb)
+
+def main():
+    """
+    Inspects or purges the result cache.
+    """
+    parser = argparse.ArgumentParser(description="Manage the result cache shared by the image tools.")
+    parser.add_argument("command", choices=("stats", "purge", "evict"), help="'stats' shows the cache size, 'purge' empties it, 'evict' trims it to --cache_max_mb.")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="Cache folder.")
+    parser.add_argument("--cache_max_mb", type=int, default=DEFAULT_MAX_MB, help="Size limit used by 'evict'.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        print(f"No cache at {args.cache_dir}")
+        sys.exit(0)
+
+    cache = ResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    if args.command == "purge":
+        cache.purge()
+    elif args.command == "evict":
+        cache.evict(target_bytes=cache.max_bytes)
+    count, total = cache.stats()
+    print(f"{args.cache_dir}: {count} entries, {total / (1024 * 1024):.1f} MB")
+
+if __name__ == "__main__":
+    main()
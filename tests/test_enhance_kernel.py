@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import batch_ops
+import enhance_kernel
+
+FACTORS = [(1.2, 1.5, 2.0, 1.5), (0.7, 0.8, 0.5, 0.3), (1.0, 1.0, 2.0, 1.0), (1.3, 1.0, 1.0, 1.0)]
+
+def random_image(mode, size=(97, 61), seed=0):
+    rng = np.random.default_rng(seed)
+    bands = len(mode)
+    shape = (size[1], size[0]) if bands == 1 else (size[1], size[0], bands)
+    return Image.fromarray(rng.integers(0, 256, shape, dtype=np.uint8), mode)
+
+def max_difference(a, b):
+    return int(np.abs(np.asarray(a, dtype=int) - np.asarray(b, dtype=int)).max())
+
+@pytest.mark.parametrize("mode", enhance_kernel.FUSED_MODES)
+@pytest.mark.parametrize("factors", FACTORS)
+def test_fused_matches_chain(mode, factors):
+    img = random_image(mode)
+    expected = enhance_kernel.enhance_chain(img, *factors)
+    assert max_difference(enhance_kernel.enhance(img, *factors), expected) <= enhance_kernel.TOLERANCE
+
+@pytest.mark.parametrize("mode", ("L", "RGB", "RGBA"))
+def test_strips_match_whole_image(mode):
+    img = random_image(mode, size=(120, 90))
+    whole = enhance_kernel.enhance(img, *FACTORS[0])
+    # A budget this small forces strips of a few rows
+    striped = enhance_kernel.enhance(img.copy(), *FACTORS[0], memory_budget=120 * 64 * 3, in_place=True)
+    assert max_difference(striped, whole) == 0
+
+@pytest.mark.parametrize("mode", enhance_kernel.FUSED_MODES)
+@pytest.mark.parametrize("factors", FACTORS)
+def test_stack_matches_each_image(mode, factors):
+    images = [random_image(mode, seed=seed) for seed in range(5)]
+    enhanced = batch_ops.unstack(enhance_kernel.enhance_stack(batch_ops.stack(images), mode, *factors))
+    for img, result in zip(images, enhanced):
+        assert result.mode == mode
+        assert max_difference(result, enhance_kernel.enhance(img, *factors)) == 0
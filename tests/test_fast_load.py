@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import fast_load
+
+def random_image(size, mode="RGB"):
+    rng = np.random.default_rng(1)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], len(mode)), dtype=np.uint8), mode)
+
+@pytest.mark.parametrize("prefer", fast_load.LOAD_MODES)
+@pytest.mark.parametrize("source, target", [((3001, 2003), (400, 300)), ((1000, 1000), (333, 250)),
+                                            ((2000, 1500), (1100, 800)), ((4097, 3001), (97, 61))])
+def test_resize_tiled_matches_resize(prefer, source, target):
+    img = random_image(source)
+    expected = np.asarray(fast_load.resize(img, target, prefer), dtype=int)
+    # Room for a few dozen output rows per band
+    tiled = fast_load.resize_tiled(img, target, prefer, memory_budget=target[0] * 4 * 40)
+    assert tiled.size == target
+    assert np.abs(np.asarray(tiled, dtype=int) - expected).max() <= 1
+
+def test_resize_tiled_without_budget_is_resize():
+    img = random_image((640, 480))
+    assert np.array_equal(np.asarray(fast_load.resize_tiled(img, (100, 75))), np.asarray(fast_load.resize(img, (100, 75))))
+
+def test_open_image_raises_limit_for_one_call(tmp_path):
+    path = tmp_path / "wide.png"
+    Image.new("L", (4000, 3000)).save(path)
+    default = Image.MAX_IMAGE_PIXELS
+    with fast_load.open_image(path, max_pixels=20000000) as img:
+        assert img.size == (4000, 3000)
+    assert Image.MAX_IMAGE_PIXELS == default
+    with pytest.raises(Image.DecompressionBombError):
+        fast_load.open_image(path, max_pixels=1000000)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+from PIL import Image
+
+import encoder_options
+import image_converter
+
+def convert(monkeypatch, capsys, input_folder, output_folder, *options):
+    monkeypatch.setattr(sys, "argv", ["image_converter.py", "--input", input_folder, "--output", output_folder, "--workers", "1", *options])
+    image_converter.main()
+    return capsys.readouterr().out
+
+def test_each_size_gets_its_own_folder():
+    encoder = encoder_options.EncoderOptions()
+    assert image_converter.icon_paths("out", "a.png", [(16, 16)], encoder) == [((16, 16), os.path.join("out", "a"))]
+    assert image_converter.icon_paths("out", "a.png", [(16, 16), (32, 24)], encoder) == [
+        ((16, 16), os.path.join("out", "16x16", "a")), ((32, 24), os.path.join("out", "32x24", "a"))]
+
+def test_all_sizes_are_written_from_one_image(tmp_path):
+    source = str(tmp_path / "a.png")
+    Image.new("RGB", (300, 200), "red").save(source)
+    icons = image_converter.icon_paths(str(tmp_path / "out"), "a.png", [(16, 16), (128, 96)], encoder_options.EncoderOptions())
+    assert image_converter.convert_image(source, icons, 0, "quality", encoder_options.EncoderOptions()) == 2
+    for size, path in icons:
+        with Image.open(path) as icon:
+            assert icon.size == size
+            assert icon.format == "JPEG"
+
+def test_up_to_date_icons_are_skipped(tmp_path, monkeypatch, capsys):
+    input_folder, output_folder = str(tmp_path / "in"), str(tmp_path / "out")
+    os.makedirs(input_folder)
+    source = os.path.join(input_folder, "a.png")
+    Image.new("RGB", (64, 64), "red").save(source)
+    assert "Converted 1 images (2 icons), 0 already up to date" in convert(monkeypatch, capsys, input_folder, output_folder, "--sizes", "16", "32")
+    assert "Converted 0 images (0 icons), 1 already up to date" in convert(monkeypatch, capsys, input_folder, output_folder, "--sizes", "16", "32")
+    # A newer source, or --force, converts it again
+    os.utime(source, (os.path.getmtime(source) + 10,) * 2)
+    assert "Converted 1 images (2 icons)" in convert(monkeypatch, capsys, input_folder, output_folder, "--sizes", "16", "32")
+    assert "Converted 1 images (2 icons)" in convert(monkeypatch, capsys, input_folder, output_folder, "--sizes", "16", "32", "--force")
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+import image_daemon
+
+# A user that owns none of the test files and is in none of their groups
+STRANGER = 54321
+
+@pytest.fixture
+def shared():
+    # pytest's own temporary folders are private to the user running the tests
+    folder = tempfile.mkdtemp()
+    os.chmod(folder, 0o755)
+    yield folder
+    shutil.rmtree(folder)
+
+def make_folder(path, mode, names=()):
+    os.makedirs(path)
+    for name in names:
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(b"png")
+        os.chmod(os.path.join(path, name), 0o644)
+    os.chmod(path, mode)
+    return path
+
+def spec(input_folder, output_folder, priority=0):
+    return {"tool": "resize", "input_folder": input_folder, "output_folder": output_folder, "priority": priority}
+
+def test_authorize_refuses_an_output_folder_the_user_cannot_write(shared):
+    input_folder = make_folder(os.path.join(shared, "in"), 0o755, ["a.png"])
+    closed = make_folder(os.path.join(shared, "closed"), 0o755)
+    open_ = make_folder(os.path.join(shared, "open"), 0o777)
+    peer = image_daemon.Peer(STRANGER, STRANGER)
+    with pytest.raises(PermissionError):
+        image_daemon.authorize(spec(input_folder, closed), peer)
+    image_daemon.authorize(spec(input_folder, open_), peer)
+
+def test_authorize_refuses_an_input_folder_the_user_cannot_read(shared):
+    input_folder = make_folder(os.path.join(shared, "in"), 0o700, ["a.png"])
+    output_folder = make_folder(os.path.join(shared, "out"), 0o777)
+    with pytest.raises(PermissionError):
+        image_daemon.authorize(spec(input_folder, output_folder), image_daemon.Peer(STRANGER, STRANGER))
+
+def test_outputs_redirected_by_a_symlink_are_refused(shared):
+    input_folder = make_folder(os.path.join(shared, "in"), 0o755)
+    make_folder(os.path.join(input_folder, "sub"), 0o755, ["a.png"])
+    output_folder = make_folder(os.path.join(shared, "out"), 0o777)
+    closed = make_folder(os.path.join(shared, "closed"), 0o755)
+    os.symlink(closed, os.path.join(output_folder, "sub"))
+    ran = []
+    run = image_daemon.Daemon().checked(ran.append, lambda name: os.path.join(output_folder, name),
+                                        input_folder, image_daemon.Peer(STRANGER, STRANGER))
+    with pytest.raises(PermissionError):
+        run(os.path.join("sub", "a.png"))
+    assert ran == []
+
+def test_only_the_daemon_user_may_raise_priority(shared):
+    input_folder = make_folder(os.path.join(shared, "in"), 0o755, ["a.png"])
+    output_folder = make_folder(os.path.join(shared, "out"), 0o777)
+    with pytest.raises(PermissionError):
+        image_daemon.authorize(spec(input_folder, output_folder, priority=1), image_daemon.Peer(STRANGER, STRANGER))
+    image_daemon.authorize(spec(input_folder, output_folder, priority=-1), image_daemon.Peer(STRANGER, STRANGER))
+    image_daemon.authorize(spec(input_folder, output_folder, priority=1), image_daemon.Peer(os.getuid(), os.getgid()))
+
+def make_job(scheduler, folder, job_id, owner, files, priority=0):
+    make_folder(folder, 0o755, [f"{i:02}.png" for i in range(files)])
+    job = image_daemon.Job(job_id, spec(folder, folder + "_out", priority), owner, (".png",), None, lambda event: None)
+    scheduler.add(job)
+    return job
+
+def dispatch(scheduler, jobs):
+    # Let every job's scan thread queue its files first, so the order only depends on the scheduler
+    deadline = time.monotonic() + 10
+    while not all(job.scanned for job in jobs) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    order = [scheduler.next_task()[0] for _ in range(sum(job.pending.qsize() for job in jobs))]
+    scheduler.stop()
+    return order
+
+def test_owners_take_turns_however_many_jobs_they_queued(tmp_path):
+    scheduler = image_daemon.Scheduler()
+    alice_1 = make_job(scheduler, str(tmp_path / "a1"), 1, "alice", 10)
+    alice_2 = make_job(scheduler, str(tmp_path / "a2"), 2, "alice", 10)
+    bob = make_job(scheduler, str(tmp_path / "b"), 3, "bob", 5)
+    order = dispatch(scheduler, [alice_1, alice_2, bob])
+    assert [job.owner for job in order[:10]] == ["alice", "bob"] * 5
+    # Alice's own jobs alternate too
+    assert [job.id for job in order if job.owner == "alice"][:4] == [1, 2, 1, 2]
+
+def test_higher_priority_goes_first_and_is_clamped(tmp_path):
+    scheduler = image_daemon.Scheduler()
+    low = make_job(scheduler, str(tmp_path / "low"), 1, "alice", 3)
+    high = make_job(scheduler, str(tmp_path / "high"), 2, "bob", 3, priority=1000)
+    assert high.priority == image_daemon.MAX_PRIORITY
+    order = dispatch(scheduler, [low, high])
+    assert [job.id for job in order] == [2, 2, 2, 1, 1, 1]
@@ -0,0 +1,80 @@
+import os
+
+import image_scanner
+
+# Far more entries than one getdents() buffer (32 KiB) holds, so the scan is still
+# reading the folder while the first outputs are written into it
+MANY_FILES = 5000
+
+def make_images(folder, count):
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(folder, f"photo_from_the_archive_{i:05}.png"), "wb") as f:
+            f.write(b"png")
+
+def write_file(path):
+    with open(path, "wb") as f:
+        f.write(b"png")
+
+def test_prefixed_outputs_in_input_folder_are_not_rescanned(tmp_path):
+    folder = str(tmp_path)
+    make_images(folder, MANY_FILES)
+    scan = image_scanner.Scan(folder, (".png",), skip_dirs=[folder],
+                              skip_prefixes=image_scanner.own_output_prefixes(folder, folder + os.sep, ("enhanced_",)))
+    found = []
+    for name in scan:
+        found.append(name)
+        write_file(os.path.join(folder, f"enhanced_{name}"))
+    assert scan.total == MANY_FILES
+    assert not any(name.startswith("enhanced_") for name in found)
+
+def test_same_named_outputs_in_input_folder_are_not_rescanned(tmp_path):
+    folder = str(tmp_path)
+    make_images(folder, MANY_FILES)
+    scan = image_scanner.Scan(folder, (".png",), skip_dirs=[folder], read_first=image_scanner.same_folder(folder, folder))
+    found = []
+    for name in scan:
+        found.append(name)
+        # Results replace their source under the same name, as pipeline.py does
+        path = os.path.join(folder, name)
+        write_file(path + ".partial")
+        os.replace(path + ".partial", path)
+        write_file(os.path.join(folder, f"new_{name}"))
+    assert scan.total == MANY_FILES
+    assert len(set(found)) == MANY_FILES
+
+def test_outputs_elsewhere_keep_prefixed_inputs(tmp_path):
+    folder = str(tmp_path / "in")
+    make_images(folder, 3)
+    write_file(os.path.join(folder, "enhanced_shot.png"))
+    output_folder = os.path.join(folder, "out")
+    os.makedirs(output_folder)
+    scan = image_scanner.Scan(folder, (".png",), skip_dirs=[output_folder],
+                              skip_prefixes=image_scanner.own_output_prefixes(folder, output_folder, ("enhanced_",)))
+    found = list(scan)
+    # Only the output folder is skipped; inputs that happen to share the prefix are kept
+    assert scan.total == 4
+    assert "enhanced_shot.png" in found
+
+def test_recursive_scan_skips_output_folder(tmp_path):
+    folder = str(tmp_path)
+    for sub in ("", "sub", "out"):
+        for i in range(2):
+            os.makedirs(os.path.join(folder, sub), exist_ok=True)
+            write_file(os.path.join(folder, sub, f"img{i}.png"))
+    found = list(image_scanner.scan_images(folder, (".png",), recursive=True, skip_dirs=[os.path.join(folder, "out")]))
+    assert sorted(found) == ["img0.png", "img1.png", "sub/img0.png", "sub/img1.png"]
+
+def test_total_known_once_scan_has_read_folder(tmp_path):
+    folder = str(tmp_path)
+    make_images(folder, 3)
+    lazy = image_scanner.Scan(folder, (".png",))
+    files = iter(lazy)
+    next(files)
+    assert lazy.total is None
+    list(files)
+    assert lazy.total == 3
+    # A full listing up front gives the total with the first file
+    listed = image_scanner.Scan(folder, (".png",), read_first=True)
+    next(iter(listed))
+    assert listed.total == 3
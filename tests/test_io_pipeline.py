@@ -0,0 +1,23 @@
+import os
+from concurrent.futures import wait
+
+import pytest
+
+import io_pipeline
+
+
+def square_or_die(n):
+    if n < 0:
+        # Like a worker killed by the OS: no exception, the process is just gone
+        os._exit(1)
+    return n * n
+
+
+def test_process_pool_continues_after_a_worker_dies():
+    with io_pipeline.ProcessPool(2) as pool:
+        doomed = pool.submit(square_or_die, -1)
+        wait([doomed])
+        with pytest.raises(Exception):
+            doomed.result()
+        futures = [pool.submit(square_or_die, n) for n in range(10)]
+        assert [future.result() for future in futures] == [n * n for n in range(10)]
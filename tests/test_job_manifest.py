@@ -0,0 +1,88 @@
+import argparse
+
+import job_manifest
+
+def manifest_args(*argv):
+    parser = argparse.ArgumentParser()
+    job_manifest.add_manifest_arguments(parser)
+    return parser.parse_args(argv)
+
+def finish_run(path, tmp_path, failing=()):
+    manifest = job_manifest.JobManifest(path, "enhance", {"brightness": 1.2})
+    for name in ("a.jpg", "b.jpg"):
+        manifest.start(name, str(tmp_path / name))
+        if name in failing:
+            manifest.failed(name, "broken")
+        else:
+            manifest.done(name)
+    manifest.close()
+
+def make_inputs(tmp_path):
+    for name in ("a.jpg", "b.jpg"):
+        (tmp_path / name).write_bytes(b"image")
+        (tmp_path / f"out_{name}").write_bytes(b"result")
+
+def test_resume_skips_finished_files(tmp_path):
+    make_inputs(tmp_path)
+    path = str(tmp_path / "manifest.sqlite")
+    finish_run(path, tmp_path, failing=("b.jpg",))
+    manifest = job_manifest.JobManifest(path, "enhance", {"brightness": 1.2}, resume=True)
+    assert manifest.skip("a.jpg", str(tmp_path / "a.jpg"), str(tmp_path / "out_a.jpg"))
+    assert not manifest.skip("b.jpg", str(tmp_path / "b.jpg"), str(tmp_path / "out_b.jpg"))
+    assert manifest.skipped_done == 1
+    manifest.close()
+
+def test_resume_redoes_files_whose_output_is_gone(tmp_path):
+    make_inputs(tmp_path)
+    path = str(tmp_path / "manifest.sqlite")
+    finish_run(path, tmp_path)
+    (tmp_path / "out_a.jpg").unlink()
+    manifest = job_manifest.JobManifest(path, "enhance", {"brightness": 1.2}, resume=True)
+    assert not manifest.skip("a.jpg", str(tmp_path / "a.jpg"), str(tmp_path / "out_a.jpg"))
+    assert manifest.skip("b.jpg", str(tmp_path / "b.jpg"), str(tmp_path / "out_b.jpg"))
+    manifest.close()
+
+def test_resume_redoes_files_with_other_settings_or_sources(tmp_path):
+    make_inputs(tmp_path)
+    path = str(tmp_path / "manifest.sqlite")
+    finish_run(path, tmp_path)
+    manifest = job_manifest.JobManifest(path, "enhance", {"brightness": 1.5}, resume=True)
+    assert not manifest.skip("a.jpg", str(tmp_path / "a.jpg"))
+    manifest.close()
+    (tmp_path / "b.jpg").write_bytes(b"a changed image")
+    manifest = job_manifest.JobManifest(path, "enhance", {"brightness": 1.2}, resume=True)
+    assert not manifest.skip("b.jpg", str(tmp_path / "b.jpg"))
+    manifest.close()
+
+def test_failed_files_are_skipped_after_max_retries(tmp_path):
+    make_inputs(tmp_path)
+    path = str(tmp_path / "manifest.sqlite")
+    for _ in range(2):
+        manifest = job_manifest.JobManifest(path, "enhance", {}, resume=True, max_retries=2)
+        assert not manifest.skip("a.jpg", str(tmp_path / "a.jpg"))
+        manifest.start("a.jpg", str(tmp_path / "a.jpg"))
+        manifest.failed("a.jpg", "broken")
+        manifest.close()
+    manifest = job_manifest.JobManifest(path, "enhance", {}, resume=True, max_retries=2)
+    assert manifest.skip("a.jpg", str(tmp_path / "a.jpg"))
+    assert manifest.skipped_failed == 1
+    manifest.close()
+
+def test_without_resume_nothing_is_skipped(tmp_path):
+    make_inputs(tmp_path)
+    path = str(tmp_path / "manifest.sqlite")
+    finish_run(path, tmp_path)
+    manifest = job_manifest.JobManifest(path, "enhance", {"brightness": 1.2})
+    assert not manifest.skip("a.jpg", str(tmp_path / "a.jpg"), str(tmp_path / "out_a.jpg"))
+    manifest.close()
+
+def test_manifest_only_created_when_asked(tmp_path):
+    assert job_manifest.manifest_from_args(manifest_args(), str(tmp_path), "enhance", {}) is None
+    assert not (tmp_path / job_manifest.MANIFEST_NAME).exists()
+    manifest = job_manifest.manifest_from_args(manifest_args("--record"), str(tmp_path), "enhance", {})
+    assert not manifest.resume
+    manifest.close()
+    assert (tmp_path / job_manifest.MANIFEST_NAME).exists()
+    manifest = job_manifest.manifest_from_args(manifest_args("--resume"), str(tmp_path), "enhance", {})
+    assert manifest.resume
+    manifest.close()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import lossless_jpeg
+
+def marked_jpeg(path):
+    """
+    Writes a 64x32 grey JPEG (whole MCUs) with a red block in its top-left corner.
+    """
+    img = Image.new("RGB", (64, 32), (128, 128, 128))
+    img.paste((255, 0, 0), (0, 0, 16, 16))
+    img.save(path, quality=95)
+
+def red_corner(path):
+    """
+    Returns which corner of the image holds the red block.
+    """
+    with Image.open(path) as img:
+        pixels = np.asarray(img.convert("RGB"), dtype=int)
+    h, w = pixels.shape[:2]
+    corners = {"top-left": pixels[:8, :8], "top-right": pixels[:8, w - 8:],
+               "bottom-left": pixels[h - 8:, :8], "bottom-right": pixels[h - 8:, w - 8:]}
+    return max(corners, key=lambda name: corners[name][..., 0].mean() - corners[name][..., 1].mean())
+
+# Counter-clockwise, as Image.rotate: the top-left corner moves to the bottom-left at 90 degrees
+EXPECTED = {90: ("bottom-left", (32, 64)), 180: ("bottom-right", (64, 32)), 270: ("top-right", (32, 64))}
+
+@pytest.mark.parametrize("degrees", sorted(EXPECTED))
+def test_rotate_transpose_direction(tmp_path, monkeypatch, degrees):
+    src, dst = tmp_path / "src.jpg", tmp_path / "dst.jpg"
+    marked_jpeg(src)
+    # Take the decode-and-transpose path even where jpegtran is installed
+    monkeypatch.setattr(lossless_jpeg, "_run_jpegtran", lambda *args: False)
+    assert lossless_jpeg.rotate(src, dst, degrees) == lossless_jpeg.TRANSPOSE
+    corner, size = EXPECTED[degrees]
+    assert red_corner(dst) == corner
+    with Image.open(dst) as img:
+        assert img.size == size
+
+@pytest.mark.skipif(lossless_jpeg.find_jpegtran() is None, reason="jpegtran is not installed")
+@pytest.mark.parametrize("degrees", sorted(EXPECTED))
+def test_rotate_jpegtran_direction(tmp_path, degrees):
+    src, dst = tmp_path / "src.jpg", tmp_path / "dst.jpg"
+    marked_jpeg(src)
+    assert lossless_jpeg.rotate(src, dst, degrees) == lossless_jpeg.LOSSLESS
+    assert red_corner(dst) == EXPECTED[degrees][0]
+
+def test_rotate_matches_image_rotate(tmp_path):
+    src, dst = tmp_path / "src.jpg", tmp_path / "dst.jpg"
+    marked_jpeg(src)
+    lossless_jpeg.rotate(src, dst, 90)
+    with Image.open(src) as img:
+        expected = np.asarray(img.rotate(90, expand=True), dtype=int)
+    with Image.open(dst) as img:
+        assert np.abs(np.asarray(img, dtype=int) - expected).mean() < 2
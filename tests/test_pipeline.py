@@ -0,0 +1,37 @@
+import argparse
+import json
+
+import pytest
+from PIL import Image
+
+import pipeline
+
+def test_parse_op_reads_each_stage():
+    assert pipeline.parse_op("crop=1,2,3,4") == ("crop", {"left": 1, "top": 2, "right": 3, "bottom": 4})
+    assert pipeline.parse_op("rotate=90") == ("rotate", {"degrees": 90.0})
+    assert pipeline.parse_op("resize=800x600") == ("resize", {"width": 800, "height": 600})
+    assert pipeline.parse_op("convert=L") == ("convert", {"mode": "L"})
+
+def test_parse_op_fills_in_enhance_defaults():
+    assert pipeline.parse_op("enhance") == ("enhance", pipeline.ENHANCE_DEFAULTS)
+    assert pipeline.parse_op("enhance=color:1.8") == ("enhance", dict(pipeline.ENHANCE_DEFAULTS, color=1.8))
+
+@pytest.mark.parametrize("spec", ["crop=1,2,3", "resize=800", "rotate=left", "enhance=glow:2", "convert=", "blur=2"])
+def test_parse_op_rejects_bad_stages(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        pipeline.parse_op(spec)
+
+def test_config_file_matches_command_line(tmp_path):
+    path = tmp_path / "pipeline.json"
+    path.write_text(json.dumps({"operations": [{"op": "resize", "width": 8, "height": 6},
+                                               {"op": "enhance", "color": 1.8}], "format": "png"}))
+    operations, format = pipeline.load_config(str(path))
+    assert operations == [pipeline.parse_op("resize=8x6"), pipeline.parse_op("enhance=color:1.8")]
+    assert format == "png"
+
+def test_stages_run_in_order():
+    img = Image.new("RGB", (40, 20))
+    result = pipeline.run_pipeline(img, [pipeline.parse_op("crop=5,0,5,0"), pipeline.parse_op("rotate=90"),
+                                         pipeline.parse_op("convert=L")])
+    assert result.size == (20, 30)
+    assert result.mode == "L"
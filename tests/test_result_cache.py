@@ -0,0 +1,53 @@
+import os
+
+import result_cache
+
+def write(path, size):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+def test_size_counts_stores_and_overwrites(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    cache.store("aa01", write(tmp_path / "a", 3000))
+    cache.store("aa02", write(tmp_path / "b", 1000))
+    assert cache._read_size() == 4000
+    # Replacing an entry frees its old size
+    cache.store("aa01", write(tmp_path / "c", 500))
+    assert cache._read_size() == 1500
+    assert cache.stats() == (2, 1500)
+
+def test_size_is_kept_between_opens(tmp_path):
+    root = str(tmp_path / "cache")
+    result_cache.ResultCache(root).store("aa01", write(tmp_path / "a", 2000))
+    assert result_cache.ResultCache(root)._read_size() == 2000
+
+def test_missing_index_is_recounted(tmp_path):
+    root = str(tmp_path / "cache")
+    cache = result_cache.ResultCache(root)
+    cache.store("aa01", write(tmp_path / "a", 2000))
+    os.remove(os.path.join(root, result_cache.SIZE_INDEX))
+    assert cache._read_size() == 2000
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "cache"), max_bytes=10000)
+    source = write(tmp_path / "a", 3000)
+    for i in range(3):
+        cache.store(f"k{i}", source)
+        os.utime(cache._path(f"k{i}"), (1000 + i, 1000 + i))
+    # Reading k0 makes it the most recently used entry
+    assert cache.fetch("k0", str(tmp_path / "out"))
+    cache.store("k3", source)
+    # 12000 bytes is over the limit, so entries go until at most 90% of it is left
+    assert cache.stats() == (3, 9000)
+    assert cache._read_size() == 9000
+    assert cache.entry("k1") is None
+    assert cache.entry("k0") is not None
+
+def test_fetch_counts_hits_and_misses(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "cache"))
+    cache.store("aa01", write(tmp_path / "a", 10))
+    assert cache.fetch("aa01", str(tmp_path / "out"))
+    assert not cache.fetch("bb01", str(tmp_path / "out"))
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert os.path.getsize(tmp_path / "out") == 10